@@ -0,0 +1,238 @@
+import asyncio
+import functools
+import io
+import logging
+import multiprocessing
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    from PIL import Image, ImageDraw, ImageFont, ImageOps
+except ImportError:  # optional: without Pillow, welcomes use the plain embed
+    Image = None
+
+logger = logging.getLogger("CROBOT.banners")
+
+BANNER_SIZE = (1024, 360)
+AVATAR_SIZE = 220
+AVATAR_CACHE_SIZE = 256     # fetched avatar images kept in the bot process
+TEMPLATE_CACHE_SIZE = 32    # decoded templates kept in each worker process
+
+# Built-in banner styles: (gradient top, gradient bottom, text colour, ring colour)
+BANNER_STYLES = {
+    "clean": ((240, 244, 250), (190, 206, 230), (34, 38, 48), (255, 255, 255)),
+    "dark": ((22, 24, 30), (58, 64, 82), (245, 245, 245), (88, 101, 242)),
+    "neon": ((18, 0, 56), (190, 0, 150), (255, 255, 255), (0, 255, 214)),
+}
+
+
+# =========================
+# RENDERING (worker processes)
+# =========================
+
+@functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _template(style: str, path: str, mtime: float):
+    """Decoded background at banner size. ``mtime`` is part of the key so edited files reload."""
+    if path:
+        with Image.open(path) as img:
+            return ImageOps.fit(img.convert("RGBA"), BANNER_SIZE)
+    top, bottom = BANNER_STYLES[style][:2]
+    gradient = Image.linear_gradient("L").resize(BANNER_SIZE)
+    return ImageOps.colorize(gradient, top, bottom).convert("RGBA")
+
+
+@functools.lru_cache(maxsize=None)
+def _avatar_mask():
+    # drawn at 4x and scaled down for an anti-aliased edge
+    big = Image.new("L", (AVATAR_SIZE * 4, AVATAR_SIZE * 4), 0)
+    ImageDraw.Draw(big).ellipse((0, 0) + big.size, fill=255)
+    return big.resize((AVATAR_SIZE, AVATAR_SIZE), Image.LANCZOS)
+
+
+@functools.lru_cache(maxsize=16)
+def _font(size: int):
+    try:
+        return ImageFont.truetype("DejaVuSans-Bold.ttf", size)
+    except OSError:
+        try:
+            return ImageFont.load_default(size=size)
+        except TypeError:  # Pillow < 10.1 has a single bitmap default font
+            return ImageFont.load_default()
+
+
+def _fit_text(draw, text: str, max_width: int, size: int, min_size: int = 28):
+    """Largest font (down to ``min_size``) that fits ``text``; truncates with an ellipsis below that."""
+    while size > min_size and draw.textlength(text, font=_font(size)) > max_width:
+        size -= 4
+    font = _font(size)
+    if draw.textlength(text, font=font) > max_width:
+        while text and draw.textlength(text + "…", font=font) > max_width:
+            text = text[:-1]
+        text += "…"
+    return text, font
+
+
+def render_banner(style: str, template_path: str, template_mtime: float, avatar: bytes,
+                  title: str, subtitle: str) -> bytes:
+    """Composite a member's avatar and name onto a template; returns PNG bytes.
+
+    Runs in a worker process. ``template_path`` is a custom template image
+    (empty for a built-in ``style``).
+    """
+    banner = _template(style, template_path, template_mtime).copy()
+    text_colour, ring_colour = BANNER_STYLES.get(style, BANNER_STYLES["clean"])[2:]
+    if template_path:
+        text_colour, ring_colour = (255, 255, 255), (255, 255, 255)
+    stroke = (0, 0, 0) if sum(text_colour) > 384 else (255, 255, 255)
+    draw = ImageDraw.Draw(banner)
+
+    left = (BANNER_SIZE[1] - AVATAR_SIZE) // 2
+    draw.ellipse((left - 6, left - 6, left + AVATAR_SIZE + 6, left + AVATAR_SIZE + 6), fill=ring_colour)
+    with Image.open(io.BytesIO(avatar)) as img:
+        face = ImageOps.fit(img.convert("RGBA"), (AVATAR_SIZE, AVATAR_SIZE))
+    banner.paste(face, (left, left), _avatar_mask())
+
+    x = left * 2 + AVATAR_SIZE
+    width = BANNER_SIZE[0] - x - left
+    draw.text((x, 90), "WELCOME", font=_font(36), fill=text_colour, stroke_width=1, stroke_fill=stroke)
+    name, font = _fit_text(draw, title, width, 72, min_size=44)
+    draw.text((x, 140), name, font=font, fill=text_colour, stroke_width=2, stroke_fill=stroke)
+    sub, font = _fit_text(draw, subtitle, width, 32, min_size=20)
+    draw.text((x, 235), sub, font=font, fill=text_colour, stroke_width=1, stroke_fill=stroke)
+
+    out = io.BytesIO()
+    banner.convert("RGB").save(out, "PNG", compress_level=3)
+    return out.getvalue()
+
+
+def _warm_up():
+    _avatar_mask()
+    _font(72)
+
+
+# =========================
+# BANNER RENDERER (bot process)
+# =========================
+
+class BannerRenderer:
+    """Welcome banners rendered off the event loop in a small process pool.
+
+    Avatars are fetched once and kept in an LRU cache here; each worker keeps
+    its own LRU of decoded templates. When ``max_pending`` renders are already
+    queued (a join raid), ``render`` returns None right away and the caller
+    sends the plain embed instead, so welcomes never back up behind the pool.
+
+    A guild's template is ``<template_dir>/<guild_id>.png`` if present, else
+    ``<template_dir>/<style>.png``, else the built-in ``style``.
+    """
+
+    def __init__(self, template_dir: str, workers: int = 2, max_pending: int = 8,
+                 avatar_cache_size: int = AVATAR_CACHE_SIZE):
+        self.template_dir = template_dir
+        self.workers = workers
+        self.max_pending = max_pending
+        self.avatar_cache_size = avatar_cache_size
+        self._pool = None
+        self._avatars = OrderedDict()   # {avatar key: image bytes}, least recently used first
+        self.pending = 0
+        self.rendered = 0
+        self.degraded = 0
+        self.failed = 0
+        self.avatar_hits = 0
+        self.avatar_misses = 0
+        self.last_render = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self._pool is not None
+
+    def start(self):
+        """Start the worker processes. Call early, before the bot starts its threads:
+        the workers are forked from this process."""
+        if Image is None:
+            logger.warning("Pillow is not installed; welcome messages will use the plain embed.")
+            return
+        if self._pool is not None or self.workers <= 0:
+            return
+        methods = multiprocessing.get_all_start_methods()
+        # fork, so workers don't re-run the bot's main module the way spawn would
+        context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        self._pool.submit(_warm_up)
+        logger.info(f"Banner renderer started ({self.workers} workers, max {self.max_pending} queued).")
+
+    def close(self):
+        """Stop the workers. Queued renders are cancelled; a running one (tens of ms) is waited for."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def template_for(self, guild_id, style: str):
+        """``(style, path, mtime)`` of the guild's template; path is empty for a built-in style."""
+        for name in (str(guild_id), style):
+            path = os.path.join(self.template_dir, f"{name}.png")
+            try:
+                return style, path, os.path.getmtime(path)
+            except OSError:
+                continue
+        return (style if style in BANNER_STYLES else "clean"), "", 0.0
+
+    async def _avatar(self, key, fetch):
+        data = self._avatars.get(key)
+        if data is not None:
+            self._avatars.move_to_end(key)
+            self.avatar_hits += 1
+            return data
+        self.avatar_misses += 1
+        data = await fetch()
+        self._avatars[key] = data
+        if len(self._avatars) > self.avatar_cache_size:
+            self._avatars.popitem(last=False)
+        return data
+
+    async def render(self, guild_id, style: str, avatar_key, fetch_avatar, title: str, subtitle: str):
+        """PNG bytes of the banner, or None if banners are off or the render queue is full.
+
+        ``fetch_avatar`` is an async callable returning image bytes; it is
+        only awaited on an avatar cache miss. Render errors propagate.
+        """
+        if self._pool is None:
+            return None
+        if self.pending >= self.max_pending:
+            self.degraded += 1
+            return None
+        self.pending += 1
+        try:
+            avatar = await self._avatar(avatar_key, fetch_avatar)
+            loop = asyncio.get_running_loop()
+            started = time.perf_counter()
+            png = await loop.run_in_executor(
+                self._pool, render_banner, *self.template_for(guild_id, style), avatar, title, subtitle
+            )
+        except BrokenProcessPool:
+            self.failed += 1
+            logger.error("Banner worker process died; banners disabled until restart.")
+            self._pool = None
+            return None
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+        self.last_render = time.perf_counter() - started
+        self.rendered += 1
+        return png
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "rendered": self.rendered,
+            "degraded": self.degraded,
+            "failed": self.failed,
+            "avatar_hits": self.avatar_hits,
+            "avatar_misses": self.avatar_misses,
+            "avatars_cached": len(self._avatars),
+        }
@@ -0,0 +1,78 @@
+"""Guild config lookups: copy-and-merge per call vs. the cached GuildConfig.
+
+Run from the repo root:
+    python -m benchmarks.bench_guild_config [--lookups 500000] [--guilds 100]
+"""
+import argparse
+import random
+import time
+
+from config_cache import GuildConfigCache
+
+DEFAULT_GUILD_CONFIG = {
+    "welcome_channel_id": None,
+    "meme_channel_id": None,
+    "twitch_channel_id": None,
+    "auto_role_id": None,
+    "banner_style": "clean",
+    "welcome_dm_message": None,
+    "meme_interval": 7200,
+    "mod_role_id": None,
+    "level_curve": "linear",
+}
+
+
+def make_raw(rng, guilds):
+    raw = {}
+    for gid in range(guilds):
+        raw[str(gid)] = {
+            "welcome_channel_id": rng.randrange(10 ** 17, 10 ** 18),
+            "mod_role_id": rng.randrange(10 ** 17, 10 ** 18),
+            "bad_words": [f"Word{i}" for i in range(rng.randrange(5, 40))],
+            "next_meme_time": time.time(),
+        }
+    return raw
+
+
+def copy_merge(raw, gid):
+    # The old get_guild_config + get_bad_words pair, as called from on_message.
+    cfg = raw.get(gid, {}).copy()
+    for k, v in DEFAULT_GUILD_CONFIG.items():
+        cfg.setdefault(k, v)
+    words = cfg.get("bad_words", [])
+    if not isinstance(words, list):
+        words = []
+    return cfg.get("mod_role_id"), [w.lower() for w in words]
+
+
+def run(label, lookup, ids):
+    start = time.perf_counter()
+    for gid in ids:
+        lookup(gid)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {len(ids) / elapsed:>14,.0f} lookups/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lookups", type=int, default=500_000)
+    parser.add_argument("--guilds", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    raw = make_raw(rng, args.guilds)
+    ids = [str(rng.randrange(args.guilds)) for _ in range(args.lookups)]
+    cache = GuildConfigCache(raw, DEFAULT_GUILD_CONFIG)
+
+    def cached(gid):
+        cfg = cache.get(gid)
+        return cfg.mod_role_id, cfg.bad_words
+
+    run("copy + merge defaults (old)", lambda gid: copy_merge(raw, gid), ids)
+    run("cached GuildConfig", cached, ids)
+    print(f"cache: {cache.hits:,} hits, {cache.misses:,} misses")
+
+
+if __name__ == "__main__":
+    main()
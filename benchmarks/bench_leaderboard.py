@@ -0,0 +1,56 @@
+"""Leaderboard queries: sort-everything-per-request vs. the incremental RankedIndex.
+
+Run from the repo root:
+    python -m benchmarks.bench_leaderboard [--sizes 10000 100000]
+"""
+import argparse
+import random
+import time
+
+from leaderboard import RankedIndex
+
+
+def rank_key(data):
+    return (-data["prestige"], -data["level"], -data["xp"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"{'users':>8} | {'full sort ms':>12} | {'update us':>9} | {'top-10 us':>9} | {'rank us':>8} | {'page us':>8}")
+    for n in args.sizes:
+        users = {
+            i: {"xp": random.randint(0, 9999), "level": random.randint(1, 100), "prestige": random.randint(0, 3)}
+            for i in range(n)
+        }
+        index = RankedIndex()
+        for uid, data in users.items():
+            index.update(uid, rank_key(data))
+
+        start = time.perf_counter()
+        sorted(users.items(), key=lambda x: (x[1]["prestige"], x[1]["level"], x[1]["xp"]), reverse=True)
+        full_sort = time.perf_counter() - start
+
+        ids = [random.randrange(n) for _ in range(args.queries)]
+        start = time.perf_counter()
+        for uid in ids:
+            users[uid]["xp"] += 5
+            index.update(uid, rank_key(users[uid]))
+        update = (time.perf_counter() - start) / len(ids)
+
+        timings = []
+        for query in (lambda uid: index.top(10), index.rank, lambda uid: index.page(uid, 10)):
+            start = time.perf_counter()
+            for uid in ids:
+                query(uid)
+            timings.append((time.perf_counter() - start) / len(ids))
+
+        print(f"{n:>8} | {full_sort * 1000:12.1f} | {update * 1e6:9.1f} | {timings[0] * 1e6:9.1f} | "
+              f"{timings[1] * 1e6:8.1f} | {timings[2] * 1e6:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
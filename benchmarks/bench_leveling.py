@@ -0,0 +1,55 @@
+"""XP grant throughput: the old while-loop vs. the precomputed LevelCurve.
+
+Run from the repo root:
+    python -m benchmarks.bench_leveling [--grants 200000]
+"""
+import argparse
+import random
+import time
+
+from leveling import build_curves, get_curve
+
+MAX_LEVEL = 100
+
+
+def loop_apply(level, xp, amount):
+    # The original add_xp level-up loop with get_level_xp = 100 * level.
+    xp += amount
+    while xp >= 100 * level and level < MAX_LEVEL:
+        xp -= 100 * level
+        level += 1
+    return level, xp
+
+
+def run(label, apply, grants):
+    level, xp = 1, 0
+    start = time.perf_counter()
+    for amount in grants:
+        level, xp = apply(level, xp, amount)
+        if level == MAX_LEVEL:
+            level, xp = 1, 0  # prestige so later grants keep doing work
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {len(grants) / elapsed:>14,.0f} grants/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--grants", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    build_curves(MAX_LEVEL)
+    rng = random.Random(args.seed)
+    workloads = {
+        "message grants (5-15 XP)": [rng.choice((5, 10, 15)) for _ in range(args.grants)],
+        "admin grants (1k-400k XP)": [rng.randint(1_000, 400_000) for _ in range(args.grants // 10)],
+    }
+    for name, grants in workloads.items():
+        print(f"-- {name}")
+        run("old while-loop", loop_apply, grants)
+        for curve in ("linear", "quadratic", "exponential"):
+            run(f"LevelCurve ({curve})", get_curve(curve).apply, grants)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,504 @@
+"""Replay synthetic Discord traffic through CROBOT's real handlers, offline.
+
+Builds fake guilds, members and channels, points CROBOT at in-process copies
+of tools/fake_twitch.py and tools/fake_meme_api.py, and drives:
+
+    on_member_join, on_message (+ xp_flush_loop), save_all, twitch_live_loop,
+    meme_posting_loop, birthday_loop and /leaderboard
+
+For each phase it reports handler latency percentiles and event loop lag, and
+at the end the outbound queue results and peak RSS. Add --tracemalloc for
+per-phase Python heap use; it slows allocation-heavy code noticeably, so the
+latencies of that run are not comparable with a run without it.
+
+The bot runs from a temporary directory, so data/ here is never touched.
+
+Run from the repo root:
+    python -m benchmarks.bench_replay [--guilds 50] [--members 2000] [--rate 500] [--seconds 20]
+"""
+import argparse
+import asyncio
+import importlib
+import logging
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+
+from aiohttp import web
+
+from tools import fake_meme_api, fake_twitch
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FILLER = ("gg", "lol", "anyone up", "for", "a", "game", "tonight", "that", "clip", "was", "wild", "nice")
+
+
+# =========================
+# FAKE DISCORD OBJECTS
+# =========================
+
+# 1x1 grey PNG standing in for every avatar download
+AVATAR_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010802000000907753de"
+    "0000000c4944415478da636868680000030401817ea8d7a20000000049454e44ae426082"
+)
+
+
+class FakeAsset:
+    def __init__(self, url, key):
+        self.url = url
+        self.key = key
+
+    def replace(self, **kwargs):
+        return self
+
+    async def read(self):
+        await asyncio.sleep(0.02)  # CDN round trip
+        return AVATAR_PNG
+
+
+class FakePermissions:
+    administrator = False
+
+
+class FakeRole:
+    def __init__(self, role_id, name):
+        self.id = role_id
+        self.name = name
+        self.mention = f"<@&{role_id}>"
+
+
+class FakeUser:
+    def __init__(self, user_id, name, bot=False):
+        self.id = user_id
+        self.name = self.display_name = name
+        self.bot = bot
+        self.mention = f"<@{user_id}>"
+        self.avatar = None
+        self.display_avatar = FakeAsset(f"https://cdn.example.invalid/avatars/{user_id}.png", str(user_id))
+        self.guild_permissions = FakePermissions()
+
+    def __str__(self):
+        return self.name
+
+    async def send(self, *args, **kwargs):
+        pass  # DMs
+
+
+class FakeMember(FakeUser):
+    def __init__(self, user_id, name, guild):
+        super().__init__(user_id, name)
+        self.guild = guild
+
+    async def add_roles(self, *roles, reason=None):
+        pass
+
+
+class FakeChannel:
+    """Text channel whose send() takes ``latency`` seconds, like a Discord API round trip."""
+
+    def __init__(self, channel_id, name, guild, latency):
+        self.id = channel_id
+        self.name = name
+        self.guild = guild
+        self.mention = f"<#{channel_id}>"
+        self.latency = latency
+        self.sent = 0
+
+    async def send(self, content=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.sent += 1
+
+
+class FakeGuild:
+    def __init__(self, guild_id, send_latency):
+        self.id = guild_id
+        self.name = f"Guild {guild_id}"
+        self._members = {}
+        self._member_list = []
+        self.owner = None
+        self.general = FakeChannel(guild_id * 10 + 1, "general", self, send_latency)
+        self.memes = FakeChannel(guild_id * 10 + 2, "memes", self, send_latency)
+        self.live = FakeChannel(guild_id * 10 + 3, "live", self, send_latency)
+        self._channels = {c.id: c for c in (self.general, self.memes, self.live)}
+        self.mod_role = FakeRole(guild_id * 10 + 4, "Mods")
+
+    @property
+    def members(self):
+        return self._member_list
+
+    @property
+    def member_count(self):
+        return len(self._members)
+
+    def add_member(self, member):
+        self._members[member.id] = member
+        self._member_list.append(member)
+        if self.owner is None:
+            self.owner = member
+
+    def get_member(self, user_id):
+        return self._members.get(user_id)
+
+    def get_channel(self, channel_id):
+        return self._channels.get(channel_id)
+
+    _resolve_channel = get_channel  # what bot.get_channel() asks each guild
+
+    def get_role(self, role_id):
+        return self.mod_role if role_id == self.mod_role.id else None
+
+
+class FakeMessage:
+    def __init__(self, message_id, content, author, channel, state):
+        self._state = state  # commands.Context reads the connection state off the message
+        self.id = message_id
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+
+
+class FakeResponse:
+    async def send_message(self, *args, **kwargs):
+        pass
+
+    async def defer(self, *args, **kwargs):
+        pass
+
+
+class FakeInteraction:
+    def __init__(self, guild, user):
+        self.guild = guild
+        self.user = user
+        self.response = FakeResponse()
+
+
+# =========================
+# MEASUREMENT
+# =========================
+
+def percentiles(samples):
+    if not samples:
+        return {"n": 0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    s = sorted(samples)
+    pick = lambda q: s[min(len(s) - 1, int(q * len(s)))]
+    return {"n": len(s), "p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": s[-1]}
+
+
+async def sample_loop_lag(samples, interval=0.01):
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - started - interval))
+
+
+class Phase:
+    """Collects handler latencies plus loop lag (and heap use with --tracemalloc) for one phase."""
+
+    def __init__(self, name, report):
+        self.name = name
+        self.report = report
+        self.latencies = []
+        self.lag = []
+        self.errors = 0
+
+    async def __aenter__(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        self._lag_task = asyncio.create_task(sample_loop_lag(self.lag))
+        self.started = time.perf_counter()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.started
+        self._lag_task.cancel()
+        self.heap = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else None
+        self.report.append(self)
+        return False
+
+    async def timed(self, coro):
+        started = time.perf_counter()
+        try:
+            await coro
+        except Exception:
+            self.errors += 1
+            if self.errors == 1:
+                logging.getLogger("CROBOT.replay").exception(f"{self.name} handler failed")
+            return
+        self.latencies.append(time.perf_counter() - started)
+
+
+def print_report(phases):
+    ms = lambda v: f"{v * 1000:>8.2f}"
+    print(f"\n{'phase':<18} {'calls':>7} {'wall s':>7} | {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} "
+          f"| {'lag p99':>8} {'lag max':>8} | {'errors':>6}" + (" | heap MB (peak)" if phases[0].heap else ""))
+    for phase in phases:
+        lat, lag = percentiles(phase.latencies), percentiles(phase.lag)
+        line = (f"{phase.name:<18} {lat['n']:>7} {phase.elapsed:>7.2f} | {ms(lat['p50'])} {ms(lat['p95'])} "
+                f"{ms(lat['p99'])} {ms(lat['max'])} | {ms(lag['p99'])} {ms(lag['max'])} | {phase.errors:>6}")
+        if phase.heap:
+            line += f" | {phase.heap[0] / 2**20:>6.1f} ({phase.heap[1] / 2**20:.1f})"
+        print(line)
+
+
+# =========================
+# REPLAY
+# =========================
+
+async def start_server(app):
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def build_world(crobot, args, rng):
+    """Fake guilds/members, per-guild config, watchwords, XP records, Twitch links and birthdays."""
+    today = date.today()
+    guilds = []
+    user_ids = iter(range(10**6, 10**9))
+    for g in range(args.guilds):
+        guild = FakeGuild(1000 + g, args.send_latency)
+        for _ in range(args.members):
+            uid = next(user_ids)
+            guild.add_member(FakeMember(uid, f"member{uid}", guild))
+        crobot.update_guild_config(
+            guild.id,
+            welcome_channel_id=guild.general.id,
+            meme_channel_id=guild.memes.id,
+            twitch_channel_id=guild.live.id,
+            mod_role_id=guild.mod_role.id,
+            bad_words=[f"badword{i}" for i in range(args.watchwords)],
+            meme_interval=3600,
+            timezone="UTC",
+            birthday_time="00:00",
+        )
+        records = crobot.user_data.guild(guild.id)
+        for member in guild.members:
+            if rng.random() < 0.5:
+                records.set(member.id, rng.randrange(100), rng.randint(1, 60), rng.randint(0, 2))
+            if rng.random() < args.birthday_share:
+                uid = str(member.id)
+                crobot.birthdays[uid] = date(1992, today.month, today.day).isoformat()  # leap year: any day works
+                crobot.birthday_index.set(uid, crobot.birthdays[uid])
+        crobot.bot._connection._guilds[guild.id] = guild
+        guilds.append(guild)
+
+    members = [m for guild in guilds for m in guild.members]
+    for i, member in enumerate(rng.sample(members, min(args.streamers, len(members)))):
+        crobot.twitch_links[str(member.id)] = f"streamer{i}"
+    crobot.rebuild_announce_index()
+    return guilds
+
+
+async def replay_joins(crobot, guilds, args, rng, report):
+    """--joins members arriving --join-burst at a time, like a raid."""
+    async with Phase("on_member_join", report) as phase:
+        for start in range(0, args.joins, args.join_burst):
+            burst = []
+            for i in range(start, min(start + args.join_burst, args.joins)):
+                guild = rng.choice(guilds)
+                member = FakeMember(2 * 10**9 + i, f"newbie{i}", guild)
+                guild.add_member(member)
+                burst.append(phase.timed(crobot.on_member_join(member)))
+            await asyncio.gather(*burst)
+
+
+async def replay_messages(crobot, guilds, args, rng, report):
+    """Messages at --rate per second for --seconds, one task per event like discord.py's dispatch."""
+    loop = asyncio.get_running_loop()
+    pending = set()
+
+    async def flush_xp():
+        while True:
+            await asyncio.sleep(crobot.XP_FLUSH_SECONDS)
+            await crobot.xp_flush_loop.coro()
+
+    async with Phase("on_message", report) as phase:
+        flusher = asyncio.create_task(flush_xp())
+        started = loop.time()
+        sent = 0
+        while (elapsed := loop.time() - started) < args.seconds:
+            due = int(elapsed * args.rate)
+            while sent < due:
+                guild = rng.choice(guilds)
+                author = rng.choice(guild.members)
+                words = rng.choices(FILLER, k=rng.randint(2, 12))
+                if args.watchwords and rng.random() < args.flagged:
+                    words.insert(rng.randrange(len(words) + 1), f"badword{rng.randrange(args.watchwords)}")
+                channel = rng.choice((guild.general, guild.memes))
+                message = FakeMessage(sent, " ".join(words), author, channel, crobot.bot._connection)
+                task = asyncio.create_task(phase.timed(crobot.on_message(message)))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                sent += 1
+            await asyncio.sleep(0.005)
+        if pending:
+            await asyncio.wait(pending)
+        flusher.cancel()
+        await crobot.xp_flush_loop.coro()
+    print(f"Replayed {sent:,} messages ({sent / phase.elapsed:,.0f}/s achieved, target {args.rate}/s).")
+
+    async with Phase("save_all", report) as phase:
+        await phase.timed(crobot.save_all())
+
+
+async def replay_twitch(crobot, fake, args, rng, report):
+    logins = list(crobot.twitch_links.values())
+    async with Phase("twitch_live_loop", report) as phase:
+        for _ in range(args.polls):
+            # flip a share of streamers each poll so go-live announcements fire
+            fake.live = {login for login in logins if rng.random() < args.live_share}
+            await phase.timed(crobot.twitch_live_loop.coro())
+
+
+async def replay_memes(crobot, guilds, report):
+    """All guilds due at once through the real meme_posting_loop; timed per post_guild_meme."""
+    post_guild_meme = crobot.post_guild_meme
+    done = asyncio.Event()
+    posted = 0
+
+    async with Phase("meme_posting_loop", report) as phase:
+        async def timed_post(guild, now):
+            nonlocal posted
+            await phase.timed(post_guild_meme(guild, now))
+            posted += 1
+            if posted == len(guilds):
+                done.set()
+
+        crobot.post_guild_meme = timed_post
+        provider = asyncio.create_task(crobot.meme_provider.run())
+        now = time.time()
+        for guild in guilds:
+            crobot.meme_schedule.schedule(guild.id, now)
+        poster = asyncio.create_task(crobot.meme_posting_loop())
+        try:
+            await asyncio.wait_for(done.wait(), 60)
+        finally:
+            poster.cancel()
+            provider.cancel()
+            crobot.post_guild_meme = post_guild_meme
+
+
+async def replay_birthdays(crobot, report):
+    async with Phase("birthday_loop", report) as phase:
+        await phase.timed(crobot.birthday_loop.coro())
+
+
+async def replay_leaderboard(crobot, guilds, args, rng, report):
+    callback = crobot.leaderboard.callback
+    async with Phase("/leaderboard", report) as phase:
+        for _ in range(args.queries):
+            guild = rng.choice(guilds)
+            interaction = FakeInteraction(guild, rng.choice(guild.members))
+            await phase.timed(callback(interaction, rng.randint(1, 5)))
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    twitch, meme_api = fake_twitch.FakeTwitch(), fake_meme_api.FakeMemeAPI(pool=500, seed=args.seed)
+    twitch_runner, twitch_url = await start_server(fake_twitch.make_app(twitch))
+    meme_runner, meme_url = await start_server(fake_meme_api.make_app(meme_api))
+    os.environ.update(
+        DISCORD_BOT_TOKEN="replay",
+        TWITCH_CLIENT_ID="replay",
+        TWITCH_CLIENT_SECRET="replay",
+        TWITCH_HELIX_URL=f"{twitch_url}/helix",
+        TWITCH_TOKEN_URL=f"{twitch_url}/oauth2/token",
+        MEME_API_URL=f"{meme_url}/gimme",
+    )
+    for name in ("TWITCH_USER_TOKEN", "METRICS_PORT", "SHARD_IDS", "SHARD_COUNT", "AUTO_SHARD"):
+        os.environ.pop(name, None)
+
+    crobot = importlib.import_module("crobot")
+    crobot.banner_renderer.start()  # forks the render workers before the persistence thread exists
+    await crobot.load_stores(guild_ids=())  # fresh database: no XP records to load
+    if not args.log:
+        logging.disable(logging.WARNING)
+    crobot.bot._connection.user = FakeUser(1, "CROBOT", bot=True)
+
+    report = []
+    try:
+        async with Phase("setup", report):
+            guilds = build_world(crobot, args, rng)
+        print(f"{args.guilds} guilds x {args.members} members, {args.watchwords} watchwords/guild, "
+              f"{len(crobot.twitch_links)} linked streamers, {len(crobot.birthdays)} birthdays")
+
+        await replay_joins(crobot, guilds, args, rng, report)
+        await replay_messages(crobot, guilds, args, rng, report)
+        await replay_twitch(crobot, twitch, args, rng, report)
+        await replay_memes(crobot, guilds, report)
+        await replay_birthdays(crobot, report)
+        await replay_leaderboard(crobot, guilds, args, rng, report)
+        print_report(report)
+
+        out = crobot.outbound.stats()
+        print(f"\nOutbound: depth {out['depth']} across {out['channels']} channels")
+        for name, p in out["by_priority"].items():
+            if p["enqueued"]:
+                print(f"  {name:<11} {p['enqueued']:>7} queued {p['sent']:>7} sent {p['dropped']:>6} dropped "
+                      f"p95 wait {p['p95'] * 1000:.0f}ms")
+        print(f"Fake backends: {twitch.requests['streams']} Helix /streams calls, {meme_api.requests} meme API calls")
+        banners = crobot.banner_renderer.stats()
+        if crobot.banner_renderer.enabled:
+            print(f"Welcome banners: {banners['rendered']} rendered, {banners['degraded']} plain embed "
+                  f"(queue full), {banners['failed']} failed")
+        print(f"Peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+    finally:
+        crobot.banner_renderer.close()
+        await crobot.outbound.drain(timeout=0.1)
+        await crobot.meme_provider.close()
+        await crobot.twitch_client.close()
+        await twitch_runner.cleanup()
+        await meme_runner.cleanup()
+        logging.disable(logging.NOTSET)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--guilds", type=int, default=50)
+    parser.add_argument("--members", type=int, default=2000, help="members per guild")
+    parser.add_argument("--watchwords", type=int, default=50, help="watchwords per guild")
+    parser.add_argument("--flagged", type=float, default=0.01, help="share of messages containing a watchword")
+    parser.add_argument("--streamers", type=int, default=500, help="linked Twitch streamers")
+    parser.add_argument("--live-share", type=float, default=0.2, help="share of streamers live on each poll")
+    parser.add_argument("--polls", type=int, default=5, help="twitch_live_loop iterations")
+    parser.add_argument("--birthday-share", type=float, default=0.003, help="share of members with a birthday today")
+    parser.add_argument("--joins", type=int, default=1000)
+    parser.add_argument("--join-burst", type=int, default=20, help="members joining at once")
+    parser.add_argument("--rate", type=int, default=500, help="messages per second")
+    parser.add_argument("--seconds", type=float, default=20.0, help="message replay length")
+    parser.add_argument("--queries", type=int, default=2000, help="/leaderboard calls")
+    parser.add_argument("--send-latency", type=float, default=0.05, help="fake channel.send() latency (s)")
+    parser.add_argument("--tracemalloc", action="store_true", help="report Python heap use per phase")
+    parser.add_argument("--log", action="store_true", help="keep CROBOT's INFO logging on")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_ROOT)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="crobot-replay-") as workdir:
+        os.chdir(workdir)  # crobot.py keeps its data/ relative to the working directory
+        try:
+            asyncio.run(run(args))
+        finally:
+            crobot = sys.modules.get("crobot")
+            if crobot:
+                crobot.persist_executor.shutdown(wait=True)
+                crobot.storage.close()
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
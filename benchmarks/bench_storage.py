@@ -0,0 +1,84 @@
+"""Write latency: whole-file JSON rewrite vs. SQLite row upsert.
+
+Run from the repo root:
+    python -m benchmarks.bench_storage [--sizes 10000 100000 1000000]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from storage import Storage
+
+GUILD_ID = "900000000000000000"  # XP rows are per guild; every benchmark member is in this one
+
+
+def make_users(n: int):
+    return {
+        str(100000000000000000 + i): {"xp": random.randint(0, 9999), "level": random.randint(1, 100), "prestige": 0}
+        for i in range(n)
+    }
+
+
+def bench_json(users, path, rounds):
+    # What every mutation used to cost: re-dump the whole dict with indent=2.
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(users, f, indent=2)
+        timings.append(time.perf_counter() - start)
+    return timings, os.path.getsize(path)
+
+
+def bench_sqlite(users, path, rounds):
+    store = Storage(path)
+    start = time.perf_counter()
+    with store.conn:
+        store.conn.executemany(
+            "INSERT INTO guild_users (guild_id, user_id, xp, level, prestige) VALUES (?, ?, ?, ?, ?)",
+            ((GUILD_ID, uid, r["xp"], r["level"], r["prestige"]) for uid, r in users.items())
+        )
+    bulk = time.perf_counter() - start
+
+    keys = random.sample(list(users), min(rounds, len(users)))
+    timings = []
+    for uid in keys:
+        record = users[uid]
+        record["xp"] += 5
+        start = time.perf_counter()
+        store.write_changes({"users": {(GUILD_ID, uid): record}})
+        timings.append(time.perf_counter() - start)
+    store.close()
+    return timings, bulk
+
+
+def fmt_ms(seconds):
+    return f"{seconds * 1000:9.3f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--json-rounds", type=int, default=3)
+    parser.add_argument("--upserts", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'users':>10} | {'json rewrite':>12} | {'json size':>10} | {'sqlite upsert p50':>17} | "
+          f"{'p99':>12} | {'initial load':>12}")
+    for n in args.sizes:
+        users = make_users(n)
+        with tempfile.TemporaryDirectory() as tmp:
+            json_times, size = bench_json(users, os.path.join(tmp, "users.json"), args.json_rounds)
+            upserts, bulk = bench_sqlite(users, os.path.join(tmp, "crobot.db"), args.upserts)
+        upserts.sort()
+        p50 = upserts[len(upserts) // 2]
+        p99 = upserts[min(len(upserts) - 1, int(len(upserts) * 0.99))]
+        print(f"{n:>10} | {fmt_ms(sum(json_times) / len(json_times))} | {size / 1e6:8.1f}MB | "
+              f"{fmt_ms(p50):>17} | {fmt_ms(p99)} | {fmt_ms(bulk)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""XP record memory: dict-of-dicts keyed by string IDs vs. the array-backed UserStore.
+
+Loads the same synthetic records into both layouts, measures the Python heap
+each one holds with tracemalloc, and times a round of XP updates, a
+"total XP" sum and a "reset all levels" for one guild.
+
+Run from the repo root:
+    python -m benchmarks.bench_user_store [--users 1000000] [--guilds 100]
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from user_store import UserStore
+
+
+def make_rows(seed, users, guilds):
+    """Fresh ``(guild_id, user_id, xp, level, prestige)`` rows with TEXT ids, as SQLite returns them."""
+    rng = random.Random(seed)
+    for i in range(users):
+        yield str(1000 + i % guilds), str(10**17 + i), rng.randrange(10_000), rng.randint(1, 100), rng.randint(0, 3)
+
+
+def load_dicts(rows):
+    data = {}
+    for gid, uid, xp, level, prestige in rows:
+        data.setdefault(gid, {})[uid] = {"xp": xp, "level": level, "prestige": prestige}
+    return data
+
+
+def measure(build, rows):
+    tracemalloc.start()
+    start = time.perf_counter()
+    store = build(rows)  # rows is a generator, so only what the layout keeps is counted
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return store, size, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--guilds", type=int, default=100)
+    parser.add_argument("--updates", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    updates = [(1000 + i % args.guilds, 10**17 + i) for i in (rng.randrange(args.users) for _ in range(args.updates))]
+    big_guild = 1000
+    print(f"{args.users:,} records across {args.guilds} guilds")
+    print(f"{'layout':<14} | {'heap MB':>8} | {'B/user':>6} | {'load s':>6} | {'updates/s':>10} | "
+          f"{'total XP ms':>11} | {'reset ms':>8}")
+
+    dicts, size, load = measure(load_dicts, make_rows(args.seed, args.users, args.guilds))
+    start = time.perf_counter()
+    for gid, uid in updates:
+        record = dicts.setdefault(str(gid), {}).setdefault(str(uid), {"xp": 0, "level": 1, "prestige": 0})
+        record["xp"] += 5
+    update_rate = len(updates) / (time.perf_counter() - start)
+    start = time.perf_counter()
+    sum(u.get("xp", 0) for u in dicts[str(big_guild)].values())
+    total_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    list(dicts.pop(str(big_guild)))
+    reset_ms = (time.perf_counter() - start) * 1000
+    print(f"{'dict of dicts':<14} | {size / 2**20:>8.1f} | {size / args.users:>6.0f} | {load:>6.2f} | "
+          f"{update_rate:>10,.0f} | {total_ms:>11.2f} | {reset_ms:>8.2f}")
+    del dicts
+
+    store, size, load = measure(UserStore.from_rows, make_rows(args.seed, args.users, args.guilds))
+    start = time.perf_counter()
+    for gid, uid in updates:
+        records = store.guild(gid)
+        records.xp[records.row(uid)] += 5
+    update_rate = len(updates) / (time.perf_counter() - start)
+    start = time.perf_counter()
+    store.get(big_guild).total_xp()
+    total_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    list(store.pop(big_guild))
+    reset_ms = (time.perf_counter() - start) * 1000
+    print(f"{'UserStore':<14} | {size / 2**20:>8.1f} | {size / args.users:>6.0f} | {load:>6.2f} | "
+          f"{update_rate:>10,.0f} | {total_ms:>11.2f} | {reset_ms:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
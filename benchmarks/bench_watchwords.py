@@ -0,0 +1,85 @@
+"""Watchword scan: per-phrase substring loop vs. compiled Aho-Corasick matcher.
+
+Run from the repo root:
+    python -m benchmarks.bench_watchwords [--phrases 10 100 1000] [--messages 20000]
+"""
+import argparse
+import random
+import string
+import time
+
+from watchwords import WatchwordMatcher
+
+WORDS = ["gg", "lol", "noob", "stream", "ranked", "queue", "clutch", "lag", "patch", "nerf", "buff", "loot"]
+
+
+def random_phrase(rng):
+    length = rng.randint(4, 12)
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(length))
+
+
+def random_message(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 25)))
+
+
+def loop_scan(bad_words, messages):
+    # The original on_message check: lowercase, then one substring search per phrase.
+    hits = 0
+    for content in messages:
+        content_lower = content.lower()
+        for bad in bad_words:
+            if bad and bad in content_lower:
+                hits += 1
+                break
+    return hits
+
+
+def matcher_scan(matcher, messages):
+    hits = 0
+    for content in messages:
+        if matcher.find_all(content):
+            hits += 1
+    return hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--phrases", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    messages = [random_message(rng) for _ in range(args.messages)]
+    print(f"{'phrases':>8} | {'loop us/msg':>11} | {'automaton us/msg':>16} | {'matcher us/msg':>14} | "
+          f"{'build ms':>8} | {'speedup':>7}")
+    for n in args.phrases:
+        phrases = [random_phrase(rng) for _ in range(n)]
+        # ~1% of messages contain a watched phrase
+        msgs = [m + " " + rng.choice(phrases) if rng.random() < 0.01 else m for m in messages]
+
+        start = time.perf_counter()
+        matcher = WatchwordMatcher(phrases)
+        build = time.perf_counter() - start
+        automaton = WatchwordMatcher(phrases, small_list_threshold=0)
+
+        start = time.perf_counter()
+        automaton_hits = matcher_scan(automaton, msgs)
+        automaton_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        loop_hits = loop_scan(phrases, msgs)
+        loop_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        matcher_hits = matcher_scan(matcher, msgs)
+        matcher_time = time.perf_counter() - start
+
+        assert loop_hits == matcher_hits == automaton_hits, (loop_hits, matcher_hits, automaton_hits)
+        print(f"{n:>8} | {loop_time / len(msgs) * 1e6:11.2f} | {automaton_time / len(msgs) * 1e6:16.2f} | "
+              f"{matcher_time / len(msgs) * 1e6:14.2f} | "
+              f"{build * 1000:8.2f} | {loop_time / matcher_time:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Spam-burst message XP: one add_xp per message vs. cooldown + batched XPBuffer.
+
+Simulates a burst of messages from a small pool of chatters across a few
+channels, and counts record updates and level-up messages sent.
+
+Run from the repo root:
+    python -m benchmarks.bench_xp_pipeline [--messages 200000] [--users 500]
+"""
+import argparse
+import random
+import time
+
+from leveling import build_curves, get_curve
+from xp_pipeline import XPBuffer, coalesce_level_ups
+
+MAX_LEVEL = 100
+XP_PER_MESSAGE = 5
+
+
+def make_burst(rng, messages, users, channels, seconds):
+    step = seconds / messages
+    return [
+        (i * step, rng.randrange(users), rng.randrange(channels))
+        for i in range(messages)
+    ]
+
+
+def run_inline(burst, curve):
+    records = {}
+    updates = sends = 0
+    start = time.perf_counter()
+    for _, user_id, _ in burst:
+        level, xp = records.get(user_id, (1, 0))
+        new_level, xp = curve.apply(level, xp, XP_PER_MESSAGE)
+        records[user_id] = (new_level, xp)
+        updates += 1
+        if new_level > level:
+            sends += 1
+    return time.perf_counter() - start, updates, sends
+
+
+def run_buffered(burst, curve, cooldown, tick):
+    records = {}
+    buffer = XPBuffer(cooldown=cooldown)
+    updates = sends = 0
+    next_tick = tick
+
+    def flush():
+        nonlocal updates, sends
+        level_ups = []
+        for _, user_id, channel_id, amount in buffer.drain():
+            level, xp = records.get(user_id, (1, 0))
+            new_level, xp = curve.apply(level, xp, amount)
+            records[user_id] = (new_level, xp)
+            updates += 1
+            if new_level > level:
+                level_ups.append((channel_id, user_id, new_level))
+        sends += len(coalesce_level_ups(level_ups))
+
+    start = time.perf_counter()
+    for now, user_id, channel_id in burst:
+        if now >= next_tick:
+            flush()
+            next_tick += tick
+        buffer.offer(0, user_id, channel_id, XP_PER_MESSAGE, now=now)
+    flush()
+    return time.perf_counter() - start, updates, sends, buffer.max_depth
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--channels", type=int, default=5)
+    parser.add_argument("--seconds", type=float, default=600.0, help="simulated burst length")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    build_curves(MAX_LEVEL)
+    curve = get_curve()
+    burst = make_burst(random.Random(args.seed), args.messages, args.users, args.channels, args.seconds)
+    print(f"{args.messages:,} messages from {args.users} users over {args.seconds:.0f}s (simulated)")
+
+    elapsed, updates, sends = run_inline(burst, curve)
+    print(f"{'inline add_xp':<28} {args.messages / elapsed:>12,.0f} msgs/s  "
+          f"{updates:>8,} updates  {sends:>6,} level-up sends")
+    for cooldown in (0, 60):
+        elapsed, updates, sends, depth = run_buffered(burst, curve, cooldown, tick=2.0)
+        print(f"{f'XPBuffer (cooldown {cooldown}s)':<28} {args.messages / elapsed:>12,.0f} msgs/s  "
+              f"{updates:>8,} updates  {sends:>6,} level-up sends  max depth {depth}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import calendar
+import logging
+from datetime import datetime, time as dtime, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+logger = logging.getLogger("CROBOT.birthdays")
+
+
+# =========================
+# BIRTHDAY INDEX
+# =========================
+
+class BirthdayIndex:
+    """Month-day -> user IDs, so the daily check reads one bucket instead of every member.
+
+    Kept in step with the ``{user_id: "YYYY-MM-DD"}`` birthdays store by
+    calling ``set()`` / ``discard()`` whenever it changes.
+    """
+
+    def __init__(self, birthdays: dict = None):
+        self._buckets = {}   # {"MM-DD": {user_id, ...}}
+        self._by_user = {}   # {user_id: "MM-DD"}
+        for user_id, date in (birthdays or {}).items():
+            self.set(user_id, date)
+
+    def __len__(self):
+        return len(self._by_user)
+
+    def set(self, user_id: str, date: str):
+        """Index ``user_id`` under the month-day of a ``YYYY-MM-DD`` date; bad dates are skipped."""
+        self.discard(user_id)
+        try:
+            _, month, day = date.split("-")
+        except (AttributeError, ValueError):
+            return
+        month_day = f"{month}-{day}"
+        self._buckets.setdefault(month_day, set()).add(user_id)
+        self._by_user[user_id] = month_day
+
+    def discard(self, user_id: str):
+        month_day = self._by_user.pop(user_id, None)
+        if month_day is None:
+            return
+        bucket = self._buckets.get(month_day)
+        if bucket is not None:
+            bucket.discard(user_id)
+            if not bucket:
+                del self._buckets[month_day]
+
+    def on(self, day) -> set:
+        """User IDs whose birthday falls on ``day`` (a date).
+
+        Feb 29 birthdays are celebrated on Feb 28 in non-leap years.
+        """
+        users = set(self._buckets.get(day.strftime("%m-%d"), ()))
+        if day.month == 2 and day.day == 28 and not calendar.isleap(day.year):
+            users |= self._buckets.get("02-29", set())
+        return users
+
+
+# =========================
+# LOCAL TIME HELPERS
+# =========================
+
+def get_zone(name: str):
+    """ZoneInfo for an IANA name like "Europe/Berlin"; falls back to UTC if unknown."""
+    if not name or name.upper() == "UTC":
+        return timezone.utc
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning(f"Unknown timezone '{name}', using UTC.")
+        return timezone.utc
+
+
+def is_valid_zone(name: str) -> bool:
+    if name.upper() == "UTC":
+        return True
+    try:
+        ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+    return True
+
+
+def parse_time(value: str):
+    """Parse "HH:MM" (24h) into a time, or return None."""
+    try:
+        return datetime.strptime(value.strip(), "%H:%M").time()
+    except (AttributeError, ValueError):
+        return None
+
+
+def local_now(zone_name: str, now: datetime = None) -> datetime:
+    now = now or datetime.now(timezone.utc)
+    return now.astimezone(get_zone(zone_name))
+
+
+def is_due(local: datetime, at: str, last_run: str) -> bool:
+    """True once ``local`` has passed today's ``at`` time and today hasn't run yet."""
+    run_at = parse_time(at) or dtime(9, 0)
+    return local.time() >= run_at and last_run != local.date().isoformat()
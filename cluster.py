@@ -0,0 +1,117 @@
+"""Run CROBOT as several shard clusters, one process per cluster.
+
+Shards are split evenly across clusters; each child runs crobot.py with
+SHARD_COUNT, SHARD_IDS and CLUSTER_ID set, and all of them share data/crobot.db.
+Children that exit are restarted with backoff; Ctrl+C / SIGTERM stops them all.
+
+    python cluster.py --shards 8 --clusters 2
+"""
+import argparse
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='[%(asctime)s] %(levelname)s:%(name)s: %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger("CROBOT.cluster")
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "crobot.py")
+MAX_BACKOFF = 300
+
+
+def split_shards(shard_count: int, clusters: int):
+    """[[0, 2, ...], [1, 3, ...]]-style round-robin split, so clusters get similar guild counts."""
+    return [list(range(i, shard_count, clusters)) for i in range(clusters)]
+
+
+class Cluster:
+    def __init__(self, cluster_id: int, shard_ids, shard_count: int):
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.process = None
+        self.backoff = 5
+        self.restart_at = 0.0
+        self.started_at = 0.0
+
+    def start(self):
+        env = dict(os.environ)
+        env.update(
+            SHARD_COUNT=str(self.shard_count),
+            SHARD_IDS=",".join(map(str, self.shard_ids)),
+            CLUSTER_ID=str(self.cluster_id),
+        )
+        self.process = subprocess.Popen([sys.executable, BOT_SCRIPT], env=env)
+        self.started_at = time.monotonic()
+        logger.info(f"Cluster {self.cluster_id} started (pid {self.process.pid}, shards {self.shard_ids}).")
+
+    def poll(self):
+        """Restart the child if it exited; back off if it keeps crashing."""
+        now = time.monotonic()
+        if self.process is None:
+            if now >= self.restart_at:
+                self.start()
+            return
+        code = self.process.poll()
+        if code is None:
+            return
+        if now - self.started_at > 10 * 60:
+            self.backoff = 5  # it ran for a while; treat this as a fresh failure
+        logger.warning(f"Cluster {self.cluster_id} exited with code {code}; restarting in {self.backoff}s.")
+        self.process = None
+        self.restart_at = now + self.backoff
+        self.backoff = min(self.backoff * 2, MAX_BACKOFF)
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.send_signal(signal.SIGINT)  # crobot.py flushes its data on KeyboardInterrupt
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, required=True, help="total shard count")
+    parser.add_argument("--clusters", type=int, default=1, help="number of processes")
+    args = parser.parse_args()
+    if not 1 <= args.clusters <= args.shards:
+        parser.error("--clusters must be between 1 and --shards")
+
+    clusters = [Cluster(i, ids, args.shards) for i, ids in enumerate(split_shards(args.shards, args.clusters))]
+    stopping = False
+
+    def request_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    for cluster in clusters:
+        cluster.start()
+        time.sleep(5)  # stagger logins; Discord limits concurrent identifies
+
+    while not stopping:
+        for cluster in clusters:
+            cluster.poll()
+        time.sleep(1)
+
+    logger.info("Stopping clusters...")
+    for cluster in clusters:
+        cluster.stop()
+    deadline = time.monotonic() + 30
+    for cluster in clusters:
+        if cluster.process:
+            try:
+                cluster.process.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                logger.warning(f"Cluster {cluster.cluster_id} did not stop in time; killing it.")
+                cluster.process.kill()
+
+
+if __name__ == "__main__":
+    main()
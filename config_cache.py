@@ -0,0 +1,98 @@
+# =========================
+# PER-GUILD CONFIG OBJECTS
+# =========================
+
+class GuildConfig:
+    """Read-only view of one guild's settings with defaults already applied.
+
+    Built once from the raw stored dict and shared by every reader until the
+    guild's config is written again; attributes can't be reassigned.
+    """
+
+    __slots__ = (
+        "guild_id",
+        "welcome_channel_id",
+        "meme_channel_id",
+        "twitch_channel_id",
+        "auto_role_id",
+        "mod_role_id",
+        "banner_style",
+        "welcome_dm_message",
+        "meme_interval",
+        "next_meme_time",
+        "level_curve",
+        "timezone",
+        "birthday_time",
+        "last_birthday_date",
+        "bad_words",
+        "legacy_xp_imported",
+    )
+
+    def __init__(self, guild_id: str, raw: dict, defaults: dict):
+        def value(key, fallback=None):
+            return raw[key] if key in raw else defaults.get(key, fallback)
+
+        words = raw.get("bad_words", [])
+        if not isinstance(words, list):
+            words = []
+        init = object.__setattr__
+        init(self, "guild_id", guild_id)
+        init(self, "welcome_channel_id", value("welcome_channel_id"))
+        init(self, "meme_channel_id", value("meme_channel_id"))
+        init(self, "twitch_channel_id", value("twitch_channel_id"))
+        init(self, "auto_role_id", value("auto_role_id"))
+        init(self, "mod_role_id", value("mod_role_id"))
+        init(self, "banner_style", value("banner_style"))
+        init(self, "welcome_dm_message", value("welcome_dm_message"))
+        init(self, "meme_interval", value("meme_interval"))
+        init(self, "next_meme_time", value("next_meme_time", 0))
+        init(self, "level_curve", value("level_curve"))
+        init(self, "timezone", value("timezone"))
+        init(self, "birthday_time", value("birthday_time"))
+        init(self, "last_birthday_date", value("last_birthday_date"))
+        init(self, "bad_words", tuple(w.lower() for w in words))
+        init(self, "legacy_xp_imported", bool(raw.get("legacy_xp_imported")))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"GuildConfig is read-only; use set_guild_value() to change '{name}'")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"GuildConfig is read-only; can't delete '{name}'")
+
+    def __repr__(self):
+        return f"<GuildConfig guild_id={self.guild_id}>"
+
+
+class GuildConfigCache:
+    """Caches one GuildConfig per guild over the raw ``{guild_id: dict}`` store.
+
+    Writers must call ``invalidate()`` after changing a guild's raw dict; the
+    next lookup rebuilds the object.
+    """
+
+    def __init__(self, raw_store: dict, defaults: dict):
+        self.raw_store = raw_store
+        self.defaults = defaults
+        self._configs = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, guild_id) -> GuildConfig:
+        gid = str(guild_id)
+        cfg = self._configs.get(gid)
+        if cfg is not None:
+            self.hits += 1
+            return cfg
+        self.misses += 1
+        cfg = GuildConfig(gid, self.raw_store.get(gid, {}), self.defaults)
+        self._configs[gid] = cfg
+        return cfg
+
+    def invalidate(self, guild_id):
+        self._configs.pop(str(guild_id), None)
+
+    def clear(self):
+        self._configs.clear()
+
+    def __len__(self):
+        return len(self._configs)
@@ -1,15 +1,36 @@
 import discord
 from discord import app_commands
 from discord.ext import commands, tasks
-import aiohttp
 import os
 import logging
 import time
 import random
 import asyncio
+import hashlib
+import io
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from banners import BANNER_STYLES, BannerRenderer
+from birthday_index import BirthdayIndex, is_due, is_valid_zone, local_now, parse_time
+from config_cache import GuildConfigCache
+from journal import Journal, replay_journal
+from leaderboard import LeaderboardIndex
+from leveling import DEFAULT_CURVE, EmojiTable, build_curves, get_curve
+from memes import MEME_API_URL, MemeProvider
+from metrics import Registry, measure_loop_lag, serve_metrics
+from outbound import BIRTHDAY, LEVEL_UP, LIVE_ALERT, MEME, MODERATION, OutboundDispatcher
+from scheduler import DueScheduler
+from storage import CorruptDataError, StoreGates, WriteBehind, open_storage
+from twitch import (
+    EVENTSUB_WS_URL, HELIX_URL, TOKEN_URL, AnnouncementIndex, EventSubListener, TwitchClient
+)
+from user_store import UserStore
+from watchdog import LoopWatchdog, SlowPathProfiler
+from watchwords import WatchwordMatcher
+from xp_pipeline import XPBuffer, coalesce_level_ups
+
 # =========================
 # CONFIG
 # =========================
@@ -31,6 +52,9 @@ LEVEL_EMOJIS = {
     90: "💥", 100: "💫"
 }
 MAX_LEVEL = 100
+XP_PER_MESSAGE = 5
+XP_COOLDOWN_SECONDS = 60   # one message grant per member per guild per window
+XP_FLUSH_SECONDS = 2       # buffered message XP is applied on this tick
 
 # Trivia questions
 TRIVIA_QUESTIONS = [
@@ -54,6 +78,11 @@ TRIVIA_QUESTIONS = [
 
 # Meme posting interval (2 hours)
 MEME_POST_INTERVAL = 7200
+# A guild won't get the same meme link again within this window
+MEME_DEDUPE_HOURS = 7 * 24
+MEME_JITTER_SECONDS = 300      # max random offset added to each guild's next post
+MEME_CATCHUP_SECONDS = 300     # overdue guilds at startup are spread over this window
+MEME_RETRY_SECONDS = 300       # retry delay when no meme could be fetched
 
 # Preset radio stations for /playradio
 RADIO_STATIONS = {
@@ -87,17 +116,44 @@ TWITCH_FILE = os.path.join(DATA_DIR, "twitch_links.json")
 GUILD_FILE = os.path.join(DATA_DIR, "guild_config.json")
 BIRTHDAYS_FILE = os.path.join(DATA_DIR, "birthdays.json")
 WARNINGS_FILE = os.path.join(DATA_DIR, "warnings.json")
+DB_FILE = os.path.join(DATA_DIR, "crobot.db")  # legacy *.json files above are imported once
+BACKUP_FILE = os.path.join(DATA_DIR, "crobot.db.bak")  # refreshed on every durable save
 
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# Sharding (optional). AUTO_SHARD=1 lets Discord pick the shard count for one process;
+# SHARD_COUNT + SHARD_IDS run this process as one cluster of a larger deployment
+# (see cluster.py). Without either, CROBOT runs a single unsharded connection.
+AUTO_SHARD = os.getenv("AUTO_SHARD", "").lower() in ("1", "true", "yes")
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0")) or None
+SHARD_IDS = [int(i) for i in os.getenv("SHARD_IDS", "").split(",") if i.strip()] or None
+CLUSTER_ID = os.getenv("CLUSTER_ID")
+# Several processes share crobot.db; re-read cross-guild stores (Twitch links, birthdays) this often
+SHARED_REFRESH_SECONDS = int(os.getenv("SHARED_REFRESH_SECONDS", "60"))
+
+# Changed records are appended to a journal and fsynced every JOURNAL_FLUSH_MS, then replayed
+# on boot after a crash; each save_all is the compacted snapshot that retires it. 0 disables.
+JOURNAL_FLUSH_MS = int(os.getenv("JOURNAL_FLUSH_MS", "500"))
+JOURNAL_DIR = os.path.join(DATA_DIR, "journal" if CLUSTER_ID is None else f"journal-{CLUSTER_ID}")
+
 # Logging setup
 logging.basicConfig(
     level=logging.INFO,
-    format='[%(asctime)s] %(levelname)s:%(name)s: %(message)s',
+    format=('[%(asctime)s] %(levelname)s:%(name)s: %(message)s' if CLUSTER_ID is None
+            else f'[%(asctime)s] [cluster {CLUSTER_ID}] %(levelname)s:%(name)s: %(message)s'),
     datefmt='%Y-%m-%d %H:%M:%S'
 )
 logger = logging.getLogger("CROBOT")
 
+# Boot timing: each startup phase logs its own duration and the time since launch.
+BOOT_STARTED = time.perf_counter()
+
+
+def log_startup_phase(phase: str, started: float) -> float:
+    now = time.perf_counter()
+    logger.info(f"Startup: {phase} took {(now - started) * 1000:.1f}ms ({now - BOOT_STARTED:.2f}s since launch)")
+    return now
+
 # =========================
 # STATUS MESSAGES (ROTATING)
 # =========================
@@ -127,55 +183,364 @@ status_index = 0
 # BOT & INTENTS
 # =========================
 
+# Data stores each slash command reads; it is held until they are loaded.
+# Commands not listed here wait for every store.
+COMMAND_STORES = {
+    "ping": (), "synccommands": (), "profile": (), "findplayers": (),
+    "playradio": (), "stopradio": (), "askcrobot": (), "love": (),
+    "addtwitch": ("twitch_links", "guild_config"), "mytwitch": ("twitch_links",),
+    "rank": ("users", "guild_config"), "xp": ("users", "guild_config"), "leaderboard": ("users", "guild_config"),
+    "prestige": ("users", "guild_config"), "resetuserdata": ("users",),
+    "coinflip": ("users", "guild_config"), "trivia": ("users", "guild_config"),
+    "setbirthday": ("birthdays",), "mybirthday": ("birthdays",),
+    "resetwarnings": ("warnings",),
+    "setwelcomedm": ("guild_config",), "setwelcome": ("guild_config",), "setbanner": ("guild_config",),
+    "setmemes": ("guild_config",),
+    "setmemeinterval": ("guild_config",), "setlevelcurve": ("guild_config",), "setbirthdaytime": ("guild_config",),
+    "settwitch": ("guild_config",), "setautorole": ("guild_config",), "setmodrole": ("guild_config",),
+    "addwatchword": ("guild_config",), "removewatchword": ("guild_config",), "listwatchwords": ("guild_config",),
+}
+
+
+class StoreGatedTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        command = interaction.command
+        stores = COMMAND_STORES.get(command.qualified_name if command else "", ())
+        await store_ready.wait(*stores)
+        if "users" in stores and interaction.guild_id is not None:
+            await wait_guild_xp(interaction.guild_id)
+        return True
+
+
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 
-bot = commands.Bot(command_prefix="!", intents=intents)
+if SHARD_COUNT or AUTO_SHARD:
+    # Each process only sees the guilds on its own shards, so every loop that walks
+    # bot.guilds (memes, birthdays, Twitch announcements) is partitioned for free.
+    bot = commands.AutoShardedBot(
+        command_prefix="!", intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS,
+        tree_cls=StoreGatedTree
+    )
+else:
+    bot = commands.Bot(command_prefix="!", intents=intents, tree_cls=StoreGatedTree)
 tree = bot.tree
 
+# =========================
+# METRICS
+# =========================
+
+# Served as Prometheus text on http://METRICS_HOST:METRICS_PORT/metrics when METRICS_PORT is set.
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0")) or None
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+if not METRICS_PORT:
+    logger.info("METRICS_PORT not set; metrics endpoint disabled.")
+
+metrics = Registry(prefix="crobot_")
+m_loop_lag = metrics.gauge("event_loop_lag_seconds", "Most recent event loop wake-up delay.")
+m_loop_lag_hist = metrics.histogram("event_loop_lag_observed_seconds", "Event loop wake-up delays.")
+m_on_message = metrics.histogram("on_message_seconds", "Time spent handling one on_message event.")
+m_watchword_matches = metrics.counter("watchword_matches_total", "Watchwords matched in messages.")
+m_twitch_poll = metrics.histogram("twitch_poll_seconds", "Duration of one Twitch live status poll.")
+m_meme_fetch = metrics.histogram("meme_fetch_seconds", "Time to get a meme for a due guild.")
+m_save = metrics.histogram("save_seconds", "Duration of one save_all flush (database write).")
+m_save_bytes = metrics.counter("save_bytes_total", "Payload bytes written by save_all.")
+m_save_records = metrics.counter("save_records_total", "Rows written by save_all.")
+m_save_failures = metrics.counter("save_failures_total", "Failed save_all flushes.")
+m_journal_records = metrics.counter("journal_records_total", "Records appended to the crash journal.")
+m_journal_fsync = metrics.histogram("journal_fsync_seconds", "Duration of one journal write + fsync.")
+m_journal_failures = metrics.counter("journal_failures_total", "Failed journal appends.")
+metrics.gauge("gateway_latency_seconds", "Discord gateway heartbeat latency.", callback=lambda: bot.latency)
+metrics.gauge("guilds", "Guilds handled by this process.", callback=lambda: len(bot.guilds))
+metrics.counter("xp_messages_total", "Guild messages offered to the XP pipeline.", callback=lambda: xp_buffer.offered)
+metrics.counter("xp_grants_total", "Message XP grants accepted (after cooldown).", callback=lambda: xp_buffer.accepted)
+metrics.gauge("xp_grants_per_second", "Accepted XP grants per second over the last heartbeat.",
+              callback=lambda: xp_buffer.grants_per_sec)
+metrics.gauge("xp_buffer_depth", "Members with XP waiting to be applied.", callback=lambda: len(xp_buffer))
+metrics.counter("twitch_api_calls_total", "Helix API requests made.",
+                callback=lambda: twitch_client.api_calls if twitch_client else 0)
+metrics.counter("twitch_eventsub_notifications_total", "EventSub notifications received.",
+                callback=lambda: eventsub.notifications if eventsub else 0)
+metrics.counter("meme_api_calls_total", "Meme API requests made.", callback=lambda: meme_provider.api_calls)
+metrics.gauge("meme_buffer", "Prefetched memes waiting to be posted.", callback=lambda: len(meme_provider))
+metrics.gauge("send_queue_depth", "Outbound messages waiting in channel queues.", callback=lambda: outbound.depth())
+metrics.counter(
+    "outbound_messages_total", "Outbound messages by priority and result.", labels=("priority", "result"),
+    callback=lambda: {
+        (name, result): stats[result]
+        for name, stats in outbound.stats()["by_priority"].items()
+        for result in ("sent", "dropped", "failed")
+    }
+)
+metrics.gauge(
+    "outbound_wait_p95_seconds", "95th percentile queue wait over recent sends.", labels=("priority",),
+    callback=lambda: {name: stats["p95"] for name, stats in outbound.stats()["by_priority"].items()}
+)
+metrics_runner = None
+loop_lag_task = None
 
 # =========================
-# LOAD / SAVE HELPERS
+# WATCHDOG / PROFILER
 # =========================
 
-def load_json(path, default):
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return default
+# A watchdog thread logs the loop thread's stack whenever the event loop goes
+# LOOP_STALL_MS without running its heartbeat (0 disables it). ASYNCIO_DEBUG=1
+# additionally turns on asyncio debug mode, which names every callback/task step
+# slower than the same threshold (useful, but it slows the whole bot down).
+LOOP_STALL_MS = int(os.getenv("LOOP_STALL_MS", "250"))
+ASYNCIO_DEBUG = os.getenv("ASYNCIO_DEBUG", "").lower() in ("1", "true", "yes")
+PROFILE_DIR = os.path.join(DATA_DIR, "profiles")
+PROFILE_TARGETS = ("on_message", "save_all", "twitch_live_loop")
 
+watchdog = LoopWatchdog(threshold=LOOP_STALL_MS / 1000) if LOOP_STALL_MS > 0 else None
+profiler = SlowPathProfiler(PROFILE_DIR, PROFILE_TARGETS)  # armed with /profile
+metrics.counter("event_loop_stalls_total", "Times the event loop was blocked longer than LOOP_STALL_MS.",
+                callback=lambda: watchdog.stalls if watchdog else 0)
+metrics.gauge("event_loop_longest_stall_seconds", "Longest event loop stall seen by the watchdog.",
+              callback=lambda: watchdog.longest_stall if watchdog else 0)
+
+
+# =========================
+# WELCOME BANNERS
+# =========================
+
+# Welcome banners (Pillow) render in BANNER_WORKERS processes. With more than
+# BANNER_MAX_PENDING renders queued, new joins get the plain embed instead.
+# Custom templates: data/banners/<guild_id>.png, or <style>.png for /setbanner styles.
+BANNER_WORKERS = int(os.getenv("BANNER_WORKERS", "2"))
+BANNER_MAX_PENDING = int(os.getenv("BANNER_MAX_PENDING", "8"))
+BANNER_DIR = os.path.join(DATA_DIR, "banners")
+
+banner_renderer = BannerRenderer(BANNER_DIR, workers=BANNER_WORKERS, max_pending=BANNER_MAX_PENDING)
+metrics.counter(
+    "welcome_banners_total", "Welcome banners by result.", labels=("result",),
+    callback=lambda: {"rendered": banner_renderer.rendered, "degraded": banner_renderer.degraded,
+                      "failed": banner_renderer.failed}
+)
+metrics.gauge("welcome_banner_queue_depth", "Welcome banner renders in flight.",
+              callback=lambda: banner_renderer.pending)
 
-def save_json(path, data):
-    try:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
-    except Exception as e:
-        logger.error(f"Failed to save {path}: {e}")
 
+# Multi-process cluster: Twitch links / birthdays are shared through SQLite,
+# and only the process that owns shard 0 syncs slash commands.
+MULTI_PROCESS = SHARD_IDS is not None
+OWNS_COMMAND_SYNC = not MULTI_PROCESS or 0 in SHARD_IDS
 
-def save_all():
-    save_json(USERS_FILE, user_data)
-    save_json(TWITCH_FILE, twitch_links)
-    save_json(GUILD_FILE, guild_config)
-    save_json(BIRTHDAYS_FILE, birthdays)
-    save_json(WARNINGS_FILE, warnings_data)
-    logger.info("Data saved to disk.")
+# Bot-initiated announcements go through per-channel priority queues
+# (moderation > live alerts > birthdays > level-ups > memes).
+outbound = OutboundDispatcher()
+
+
+# =========================
+# STORAGE (SQLite, WAL mode)
+# =========================
+
+_phase = time.perf_counter()
+try:
+    # PRAGMA quick_check first; a corrupt database is swapped for the last backup snapshot
+    storage = open_storage(DB_FILE, BACKUP_FILE)
+    storage.migrate_from_json(USERS_FILE, TWITCH_FILE, GUILD_FILE, BIRTHDAYS_FILE, WARNINGS_FILE)
+    # changes journaled after the last save of a run that crashed
+    replay_journal(storage, JOURNAL_DIR)
+except CorruptDataError as e:
+    logger.error(f"Corrupt data: {e}")
+    raise SystemExit("Restore or remove the corrupt data file, then restart CROBOT.")
+_phase = log_startup_phase("open database + integrity check + journal replay", _phase)
 
 
 # =========================
 # DATA STORES (persistent)
 # =========================
 
-user_data = load_json(USERS_FILE, {})        # {user_id: {"xp": int, "level": int, "prestige": int}}
-twitch_links = load_json(TWITCH_FILE, {})    # {discord_id: twitch_username}
-guild_config = load_json(GUILD_FILE, {})     # {guild_id: {...}}
-twitch_live_status = {}                      # {twitch_username: bool}
-birthdays = load_json(BIRTHDAYS_FILE, {})   # {user_id: "YYYY-MM-DD"}
+# The stores start empty and are filled by load_stores() while the bot logs in.
+# Handlers wait on store_ready for just the stores they use.
+user_data = UserStore()                          # {guild_id: GuildUsers} (xp/level/prestige columns)
+legacy_users = {}                                # pre-per-guild global records, used once to seed each guild
+twitch_links = {}                                # {discord_id: twitch_username}
+guild_config = {}                                # {guild_id: {...}}
+twitch_live_status = {}                          # {twitch_username: bool}
+birthdays = {}                                   # {user_id: "YYYY-MM-DD"}
+birthday_index = BirthdayIndex(birthdays)        # {"MM-DD": {user_id}}, kept in step by /setbirthday
+warnings_data = {}                               # {guild_id: {user_id: int}}
+
+# Loaded in this order on the persistence thread: small stores first, so most handlers unblock early.
+STORE_LOADERS = {
+    "guild_config": storage.load_guild_config,
+    "twitch_links": storage.load_twitch_links,
+    "birthdays": storage.load_birthdays,
+    "warnings": storage.load_warnings,
+    "legacy_users": storage.load_legacy_users,
+}
+# XP records are loaded per guild, and only for guilds this process serves (see load_guild_xp);
+# the "users" gate opens once every guild the gateway reported at login is loaded.
+store_ready = StoreGates((*STORE_LOADERS, "users"))
+xp_loaded_guilds = set()
+xp_loading = {}  # {guild_id: future set when that guild's load finishes}
+stores_task = None
+
+# Write-behind: mutations mark keys dirty, save_all() flushes only those rows.
+PERSISTENT_STORES = {
+    "users": user_data,            # keyed by (guild_id, user_id)
+    "twitch_links": twitch_links,
+    "guild_config": guild_config,
+    "birthdays": birthdays,
+    "warnings": warnings_data,     # keyed by (guild_id, user_id)
+}
+journal = Journal(JOURNAL_DIR, PERSISTENT_STORES) if JOURNAL_FLUSH_MS > 0 else None
+persistence = WriteBehind(storage, PERSISTENT_STORES, journal=journal)
+
 
-# Prevent double-starting the meme loop
-meme_loop_started = False
+# All database access after startup happens on this single writer thread, so
+# saves never block the event loop and writes are applied in order.
+persist_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="crobot-persist")
+
+
+# Serializes flushes with shared-store refreshes, so a refresh never reads a row
+# that has been snapshotted but not yet written.
+save_lock = asyncio.Lock()
+
+
+def install_store(name: str, data):
+    """Fill a live store in place; the write-behind and the indexes hold references to it."""
+    if name == "birthdays":
+        birthdays.update(data)
+        for uid, date in data.items():
+            birthday_index.set(uid, date)
+    elif name == "guild_config":
+        guild_config.update(data)
+        guild_configs.clear()
+    else:
+        {"twitch_links": twitch_links, "warnings": warnings_data, "legacy_users": legacy_users}[name].update(data)
+
+
+async def load_stores(guild_ids=None):
+    """Load each store off the event loop and open its ready gate. Started by main() before login.
+
+    XP records are loaded last, for ``guild_ids`` or, by default, for the
+    guilds the gateway reports once the bot is ready.
+    """
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    for name, loader in STORE_LOADERS.items():
+        phase = time.perf_counter()
+        try:
+            data = await loop.run_in_executor(persist_executor, loader)
+        except Exception as e:
+            logger.error(f"Failed to load {name}: {e}. Shutting down.")
+            await bot.close()
+            return
+        install_store(name, data)
+        store_ready.set(name)
+        log_startup_phase(f"load {name}", phase)
+
+    if guild_ids is None:
+        await bot.wait_until_ready()
+        guild_ids = [guild.id for guild in bot.guilds]
+    phase = time.perf_counter()
+    try:
+        await load_guild_xp(*guild_ids)
+    except Exception as e:
+        logger.error(f"Failed to load XP records: {e}. Shutting down.")
+        await bot.close()
+        return
+    store_ready.set("users")
+    log_startup_phase(f"load users ({len(guild_ids)} guilds)", phase)
+    log_startup_phase("load data stores", started)
+
+
+async def load_guild_xp(*guild_ids):
+    """Load the XP records of these guilds on the persistence thread; already loaded guilds are skipped.
+
+    While a guild is loading, buffered message XP for it is held back and XP
+    commands in it wait (see wait_guild_xp), so nothing writes a fresh record
+    over one that is still on its way from the database.
+    """
+    in_flight = {xp_loading[gid] for gid in guild_ids if gid in xp_loading}
+    wanted = [gid for gid in guild_ids if gid not in xp_loaded_guilds and gid not in xp_loading]
+    if wanted:
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        xp_loading.update(dict.fromkeys(wanted, done))
+        try:
+            loaded = await loop.run_in_executor(
+                persist_executor,
+                lambda: UserStore.from_rows(row for gid in wanted for row in storage.iter_guild_users(gid))
+            )
+            user_data.merge(loaded)
+            xp_loaded_guilds.update(wanted)
+        finally:
+            for gid in wanted:
+                del xp_loading[gid]
+            done.set_result(None)
+    if in_flight:
+        await asyncio.wait(in_flight)
+
+
+async def wait_guild_xp(guild_id):
+    """Wait for the guild's XP records if they are still loading."""
+    done = xp_loading.get(guild_id)
+    if done is not None:
+        await asyncio.wait({done})
+
+
+async def save_all(durable: bool = False):
+    """Flush dirty records off the event loop; does nothing when no store changed.
+
+    With ``durable=True`` this also waits for a full WAL checkpoint and refreshes
+    the backup snapshot, so the data is on disk when the coroutine returns.
+    """
+    async with save_lock, profiler.profile("save_all"):
+        return await _save_all(durable)
+
+
+async def _save_all(durable: bool):
+    loop = asyncio.get_running_loop()
+    snap = persistence.snapshot()
+    batch = retired = None
+    if journal is not None and snap is not None:
+        # journal what the snapshot holds into the segment it retires, so replaying
+        # that segment after a crash can never roll a saved record back
+        batch = journal.collect(persistence.current)
+        retired = journal.rotate()
+    try:
+        if snap is not None:
+            if batch is not None:
+                await loop.run_in_executor(persist_executor, journal.append, batch)
+            # with a journal, every flush is synced (FULL checkpoint) before its segments are deleted
+            stats = await loop.run_in_executor(
+                persist_executor, persistence.write, snap, durable or journal is not None
+            )
+            if retired is not None:
+                await loop.run_in_executor(persist_executor, journal.discard_through, retired)
+            m_save.observe(stats["duration"])
+            m_save_bytes.inc(stats["bytes"])
+            m_save_records.inc(stats["records"])
+            logger.info(
+                f"Data saved to disk: {stats['records']} records, {stats['bytes']} bytes "
+                f"in {stats['duration'] * 1000:.1f}ms (totals: {persistence.total_records} records, "
+                f"{persistence.total_bytes} bytes over {persistence.flushes} flushes, {persistence.skipped} skipped)"
+            )
+        elif durable:
+            await loop.run_in_executor(persist_executor, storage.checkpoint, "FULL")
+        else:
+            logger.debug("Autosave skipped: no changes.")
+        if durable:
+            await loop.run_in_executor(persist_executor, storage.backup_to, BACKUP_FILE)
+            logger.info(f"Durable save complete; snapshot written to {BACKUP_FILE}.")
+    except Exception as e:
+        if snap is not None:
+            persistence.restore(snap)
+        m_save_failures.inc()
+        logger.error(f"Failed to save data: {e}")
+        return False
+    return True
+
+
+# Per-guild meme due times (min-heap); meme_posting_loop sleeps until the earliest one
+meme_schedule = DueScheduler()
+meme_loop_task = None
 
 
 
@@ -195,47 +560,191 @@ if not DISCORD_BOT_TOKEN:
     logger.error("Missing DISCORD_BOT_TOKEN in environment variables.")
     raise SystemExit("Set DISCORD_BOT_TOKEN before running CROBOT.")
 
-# Twitch OAuth caching
-twitch_oauth_token = None
-twitch_oauth_expiry = 0  # unix time
+# Optional EventSub websocket mode (needs a user access token); polling stays as fallback
+TWITCH_USER_TOKEN = os.getenv("TWITCH_USER_TOKEN")
+TWITCH_EVENTSUB_ENABLED = bool(TWITCH_ENABLED and TWITCH_USER_TOKEN)
+
+# Endpoint overrides, e.g. to point CROBOT at tools/fake_twitch.py
+TWITCH_HELIX_URL = os.getenv("TWITCH_HELIX_URL", HELIX_URL)
+TWITCH_TOKEN_URL = os.getenv("TWITCH_TOKEN_URL", TOKEN_URL)
+TWITCH_EVENTSUB_WS_URL = os.getenv("TWITCH_EVENTSUB_WS_URL", EVENTSUB_WS_URL)
+
+# Meme API endpoint override, e.g. to point CROBOT at tools/fake_meme_api.py
+MEME_API = os.getenv("MEME_API_URL", MEME_API_URL)
+
+# Prefetching meme source shared by all guilds (one pooled session)
+meme_provider = MemeProvider(MEME_API, dedupe_window=MEME_DEDUPE_HOURS * 3600)
+meme_task = None
+
+# One pooled Helix client (session + OAuth token cache) for the bot's lifetime
+twitch_client = TwitchClient(
+    TWITCH_CLIENT_ID, TWITCH_CLIENT_SECRET, helix_url=TWITCH_HELIX_URL, token_url=TWITCH_TOKEN_URL
+) if TWITCH_ENABLED else None
 
 
 # =========================
 # LEVELING HELPERS
 # =========================
 
-def get_level_xp(level: int) -> int:
-    return 100 * level
+# Level curves and the emoji table are precomputed once at startup.
+build_curves(MAX_LEVEL)
+_level_emojis = EmojiTable(LEVEL_EMOJIS, MAX_LEVEL)
+
+
+def get_level_curve(guild):
+    """The guild's configured XP curve (linear 100 * level unless changed with /setlevelcurve)."""
+    if guild is None:
+        return get_curve()
+    return get_curve(get_guild_config(guild).level_curve)
+
+
+def get_level_xp(level: int, curve=None) -> int:
+    return (curve or get_curve()).xp_for_level(level)
+
+
+def new_user_record():
+    return {"xp": 0, "level": 1, "prestige": 0}
+
 
+def peek_user_record(guild_id: int, user_id: int):
+    """A copy of the member's record in this guild, or a blank one (not stored)."""
+    records = user_data.get(guild_id)
+    return (records.get(user_id) if records is not None else None) or new_user_record()
 
-def get_user_record(user_id: int):
-    return user_data.setdefault(str(user_id), {"xp": 0, "level": 1, "prestige": 0})
 
+def add_xp(guild_id: int, user_id: int, amount: int, curve=None):
+    records = user_data.guild(guild_id)
+    row = records.row(user_id)
+    old_level = records.level[row]
+    level, xp = (curve or get_curve()).apply(old_level, records.xp[row], amount)
+    records.level[row], records.xp[row] = level, xp
+    persistence.mark("users", (str(guild_id), str(user_id)))
+    leaderboards.update(guild_id, user_id, row_rank_key(records, row))
+    return level > old_level, level
 
-def add_xp(user_id: int, amount: int):
-    data = get_user_record(user_id)
-    data["xp"] += amount
-    leveled_up = False
-    while data["xp"] >= get_level_xp(data["level"]) and data["level"] < MAX_LEVEL:
-        data["xp"] -= get_level_xp(data["level"])
-        data["level"] += 1
-        leveled_up = True
-    return leveled_up, data["level"]
 
+def add_prestige(guild_id: int, user_id: int):
+    records = user_data.guild(guild_id)
+    row = records.row(user_id)
+    records.prestige[row] += 1
+    records.xp[row] = 0
+    records.level[row] = 1
+    persistence.mark("users", (str(guild_id), str(user_id)))
+    leaderboards.update(guild_id, user_id, row_rank_key(records, row))
 
-def add_prestige(user_id: int):
-    data = get_user_record(user_id)
-    data["prestige"] += 1
-    data["xp"] = 0
-    data["level"] = 1
+
+def remove_user_record(guild_id: int, user_id: int):
+    records = user_data.get(guild_id)
+    if records is not None and records.pop(user_id) is not None:
+        persistence.mark("users", (str(guild_id), str(user_id)))
+    leaderboards.remove(guild_id, user_id)
+
+
+def reset_guild_levels(guild_id: int):
+    # Dropping the guild's columns is O(1), and the next flush deletes its rows in one statement.
+    user_data.pop(guild_id, None)
+    persistence.mark_cleared("users", str(guild_id))
+    leaderboards.clear_guild(guild_id)
+
+
+def import_legacy_xp(guild: discord.Guild, joined: bool = False):
+    """Seed a guild's records from the old global XP table, once per guild.
+
+    Before XP was per guild every member shared one record across servers;
+    each guild the bot was in at startup starts from that record for its
+    current members. A guild joined while running (``joined``) never shared
+    it: it is only marked as imported and starts fresh, as do members who
+    arrive later.
+    """
+    if not legacy_users:
+        return
+    if get_guild_config(guild).legacy_xp_imported:
+        return
+    if joined:
+        set_guild_value(guild, "legacy_xp_imported", True)
+        return
+    records = user_data.guild(guild.id)
+    imported = 0
+    for member in guild.members:
+        legacy = legacy_users.get(str(member.id))
+        if legacy and member.id not in records:
+            records.set(member.id, legacy["xp"], legacy["level"], legacy["prestige"])
+            persistence.mark("users", (str(guild.id), str(member.id)))
+            imported += 1
+    set_guild_value(guild, "legacy_xp_imported", True)
+    leaderboards.drop_guild(guild.id)
+    logger.info(f"Imported {imported} legacy XP records into guild {guild.id}.")
 
 
 def get_emoji_for_level(level: int) -> str:
-    emoji = ""
-    for lvl in sorted(LEVEL_EMOJIS):
-        if level >= lvl:
-            emoji = LEVEL_EMOJIS[lvl]
-    return emoji
+    return _level_emojis(level)
+
+
+# =========================
+# LEADERBOARD INDEX
+# =========================
+
+# Per-guild ranked index, built on first /leaderboard and kept current by add_xp/add_prestige.
+leaderboards = LeaderboardIndex()
+LEADERBOARD_PAGE_SIZE = 10
+
+
+def rank_key(data) -> tuple:
+    # ascending key == (prestige, level, xp) descending
+    return (-data.get("prestige", 0), -data.get("level", 0), -data.get("xp", 0))
+
+
+def row_rank_key(records, row: int) -> tuple:
+    """rank_key straight from a GuildUsers row, without building a record dict."""
+    return (-records.prestige[row], -records.level[row], -records.xp[row])
+
+
+def ensure_leaderboard(guild: discord.Guild):
+    if not leaderboards.is_built(guild.id):
+        records = user_data.get(guild.id)  # read-only: no empty record set for a guild without XP
+        if records is None:
+            leaderboards.build_guild(guild.id, ())
+            return
+        rows = ((member.id, records.find(member.id)) for member in guild.members)
+        leaderboards.build_guild(guild.id, (
+            (user_id, row_rank_key(records, row)) for user_id, row in rows if row is not None
+        ))
+
+
+# =========================
+# MESSAGE XP PIPELINE
+# =========================
+
+# on_message only queues XP here; xp_flush_loop applies it in batches.
+xp_buffer = XPBuffer(cooldown=XP_COOLDOWN_SECONDS)
+
+
+def apply_xp_grants():
+    """Apply buffered message XP. Returns level-ups as ``{channel_id: [(user_id, level)]}``."""
+    level_ups = []
+    curves = {}
+    for guild_id, user_id, channel_id, amount in xp_buffer.drain(hold=xp_loading.__contains__):
+        curve = curves.get(guild_id)
+        if curve is None:
+            curve = curves[guild_id] = get_level_curve(bot.get_guild(guild_id))
+        leveled_up, new_level = add_xp(guild_id, user_id, amount, curve)
+        if leveled_up:
+            level_ups.append((channel_id, user_id, new_level))
+    return coalesce_level_ups(level_ups)
+
+
+def announce_level_ups(channel_id: int, entries):
+    """One level-up message per channel per tick, however many members leveled."""
+    channel = bot.get_channel(channel_id)
+    if channel is None:
+        return
+    if len(entries) == 1:
+        user_id, level = entries[0]
+        text = f"🎉 <@{user_id}> leveled up to **Level {level}**! {get_emoji_for_level(level)}"
+    else:
+        lines = [f"<@{user_id}> → **Level {level}** {get_emoji_for_level(level)}" for user_id, level in entries]
+        text = "🎉 Level ups!\n" + "\n".join(lines)
+    outbound.send(channel, LEVEL_UP, content=text, delete_after=15)
 
 
 # =========================
@@ -247,36 +756,71 @@ DEFAULT_GUILD_CONFIG = {
     "meme_channel_id": None,      # falls back to MEME_CHANNEL_ID
     "twitch_channel_id": None,    # falls back to TWITCH_LIVE_CHANNEL_ID
     "auto_role_id": None,         # falls back to AUTO_ROLE_ID
-    "banner_style": "clean",      # reserved for future banner styles
+    "banner_style": "clean",      # welcome banner style (see banners.BANNER_STYLES), or "none"
     "welcome_dm_message": None,   # optional DM welcome template
     "meme_interval": MEME_POST_INTERVAL,  # per-guild meme interval in seconds
     "mod_role_id": None,          # role to ping on moderation escalation
+    "level_curve": DEFAULT_CURVE,  # XP curve: linear / quadratic / exponential
+    "timezone": "UTC",            # IANA timezone for scheduled posts (birthdays)
+    "birthday_time": "09:00",     # local time the birthday check runs
 }
 
 
+# Immutable GuildConfig objects, rebuilt only after a write to that guild's config
+guild_configs = GuildConfigCache(guild_config, DEFAULT_GUILD_CONFIG)
+
+
 def get_guild_config(guild: discord.Guild):
-    gid = str(guild.id)
-    cfg = guild_config.get(gid, {}).copy()
-    for k, v in DEFAULT_GUILD_CONFIG.items():
-        cfg.setdefault(k, v)
-    return cfg
+    return guild_configs.get(guild.id)
 
 
-def set_guild_value(guild: discord.Guild, key: str, value):
-    gid = str(guild.id)
+def update_guild_config(guild_id: int, **values):
+    """Write raw config keys for a guild, mark them for saving and drop the cached object."""
+    gid = str(guild_id)
     cfg = guild_config.get(gid, {})
-    cfg[key] = value
+    cfg.update(values)
     guild_config[gid] = cfg
-    save_json(GUILD_FILE, guild_config)
-    logger.info(f"Updated config for guild {gid}: {key}={value}")
+    persistence.mark("guild_config", gid)
+    guild_configs.invalidate(gid)
+
+
+def set_guild_value(guild: discord.Guild, key: str, value):
+    update_guild_config(guild.id, **{key: value})
+    logger.info(f"Updated config for guild {guild.id}: {key}={value}")
 
 def get_bad_words(guild: discord.Guild):
-    cfg = get_guild_config(guild)
-    words = cfg.get("bad_words", [])
-    if not isinstance(words, list):
-        words = []
-    # normalize to lowercase
-    return [w.lower() for w in words]
+    # normalized to lowercase when the config object is built
+    return list(get_guild_config(guild).bad_words)
+
+
+# Compiled watchword matchers, built on first use and dropped when the list changes
+_watchword_matchers = {}  # {guild_id: WatchwordMatcher}
+
+
+def get_watchword_matcher(guild: discord.Guild) -> WatchwordMatcher:
+    matcher = _watchword_matchers.get(guild.id)
+    if matcher is None:
+        matcher = WatchwordMatcher(get_bad_words(guild))
+        _watchword_matchers[guild.id] = matcher
+    return matcher
+
+
+def format_triggered_phrases(matches, limit: int = 1024) -> str:
+    """Matched watchwords for the alert embed, cut to fit a field value (Discord rejects longer ones)."""
+    shown = []
+    used = 0
+    for i, match in enumerate(matches):
+        if len(match) > 100:
+            match = match[:99] + "…"
+        item = f"`{match}`"
+        rest = len(matches) - i - 1
+        # leave room for the ", … and N more" tail unless this is the last phrase
+        tail = len(f", … and {rest} more") if rest else 0
+        if used + len(item) + 2 + tail > limit:
+            return ", ".join(shown) + f", … and {len(matches) - i} more"
+        shown.append(item)
+        used += len(item) + 2
+    return ", ".join(shown)
 
 
 def add_bad_word(guild: discord.Guild, word: str):
@@ -288,9 +832,8 @@ def add_bad_word(guild: discord.Guild, word: str):
     word = word.lower().strip()
     if word and word not in words:
         words.append(word)
-    cfg["bad_words"] = words
-    guild_config[gid] = cfg
-    save_json(GUILD_FILE, guild_config)
+    update_guild_config(guild.id, bad_words=words)
+    _watchword_matchers.pop(guild.id, None)
     logger.info(f"Added bad word '{word}' for guild {gid}")
 
 
@@ -303,9 +846,8 @@ def remove_bad_word(guild: discord.Guild, word: str):
     word = word.lower().strip()
     if word in words:
         words.remove(word)
-    cfg["bad_words"] = words
-    guild_config[gid] = cfg
-    save_json(GUILD_FILE, guild_config)
+    update_guild_config(guild.id, bad_words=words)
+    _watchword_matchers.pop(guild.id, None)
     logger.info(f"Removed bad word '{word}' for guild {gid}")
 
 # =========================
@@ -325,7 +867,7 @@ def increment_warning(guild_id: int, user_id: int) -> int:
     current = guild_warnings.get(uid, 0) + 1
     guild_warnings[uid] = current
     warnings_data[gid] = guild_warnings
-    save_json(WARNINGS_FILE, warnings_data)
+    persistence.mark("warnings", (gid, uid))
     return current
 
 
@@ -336,64 +878,108 @@ def reset_warnings(guild_id: int, user_id: int):
     if uid in guild_warnings:
         guild_warnings.pop(uid)
         warnings_data[gid] = guild_warnings
-        save_json(WARNINGS_FILE, warnings_data)
+        persistence.mark("warnings", (gid, uid))
 
 
 # =========================
-# TWITCH HELPERS
+# TWITCH ANNOUNCEMENT INDEX
 # =========================
 
-async def get_twitch_oauth_token():
-    """Get or refresh Twitch OAuth token. Uses simple in-memory cache."""
-    global twitch_oauth_token, twitch_oauth_expiry
+# discord_id -> {guild_id: channel_id}, only for users with a linked Twitch account
+announce_index = AnnouncementIndex()
 
-    if not TWITCH_ENABLED:
-        return None
 
-    if twitch_oauth_token and time.time() < twitch_oauth_expiry:
-        return twitch_oauth_token
+def get_twitch_channel_id(guild: discord.Guild):
+    return get_guild_config(guild).twitch_channel_id or TWITCH_LIVE_CHANNEL_ID
+
+
+def index_guild(guild: discord.Guild):
+    """Index every linked streamer who is a member of this guild."""
+    channel_id = get_twitch_channel_id(guild)
+    if len(twitch_links) <= (guild.member_count or 0):
+        for discord_id in twitch_links:
+            if guild.get_member(int(discord_id)):
+                announce_index.add(int(discord_id), guild.id, channel_id)
+    else:
+        for member in guild.members:
+            if str(member.id) in twitch_links:
+                announce_index.add(member.id, guild.id, channel_id)
+
+
+def index_linked_user(user_id: int):
+    """(Re)index one user across all guilds, e.g. right after /addtwitch."""
+    announce_index.discard_user(user_id)
+    for guild in bot.guilds:
+        if guild.get_member(user_id):
+            announce_index.add(user_id, guild.id, get_twitch_channel_id(guild))
+
+
+def rebuild_announce_index():
+    announce_index.clear()
+    for guild in bot.guilds:
+        index_guild(guild)
+    logger.info(f"Indexed {len(announce_index)} linked streamers across {len(bot.guilds)} guilds.")
+
 
-    url = (
-        "https://id.twitch.tv/oauth2/token"
-        f"?client_id={TWITCH_CLIENT_ID}&client_secret={TWITCH_CLIENT_SECRET}"
-        "&grant_type=client_credentials"
+def send_live_announcement(channel, discord_id, twitch_username: str):
+    outbound.send(
+        channel, LIVE_ALERT,
+        content=f"@everyone 🔥 <@{discord_id}> is now **LIVE** on Twitch!\nhttps://twitch.tv/{twitch_username}"
     )
+    logger.info(f"Queued live announcement: {twitch_username} in guild {channel.guild.id}")
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url) as resp:
-            data = await resp.json()
-            twitch_oauth_token = data.get("access_token")
-            if not twitch_oauth_token:
-                logger.error(f"Failed to fetch Twitch OAuth token: {data}")
-                return None
-            expires_in = data.get("expires_in", 3600)
-            twitch_oauth_expiry = time.time() + expires_in - 60
-            logger.info("Fetched new Twitch OAuth token")
-            return twitch_oauth_token
-
-
-async def twitch_check_live(username: str) -> bool:
-    """Return True if the Twitch user is live."""
-    if not TWITCH_ENABLED:
-        return False
 
-    token = await get_twitch_oauth_token()
-    if not token:
-        return False
+def live_announcements(discord_id, twitch_username: str) -> int:
+    """Queue the announcements for one go-live, touching only the guilds the user is in."""
+    queued = 0
+    for guild_id, channel_id in announce_index.targets(int(discord_id)).items():
+        guild = bot.get_guild(guild_id)
+        channel = guild.get_channel(channel_id) if guild else None
+        if not channel:
+            # No valid Twitch channel in this guild; skip to the next guild
+            continue
+        send_live_announcement(channel, discord_id, twitch_username)
+        queued += 1
+    return queued
+
+
+def get_linked_logins():
+    """{twitch_login: [discord_id, ...]}; several Discord users may link the same channel.
+
+    Only streamers who are in one of this process's guilds are included, so each
+    shard cluster polls / subscribes for its own guilds only.
+    """
+    linked = {}
+    for discord_id, twitch_username in twitch_links.items():
+        if announce_index.targets(int(discord_id)):
+            linked.setdefault(twitch_username.lower(), []).append(discord_id)
+    return linked
 
-    headers = {
-        "Client-ID": TWITCH_CLIENT_ID,
-        "Authorization": f"Bearer {token}"
-    }
-    url = f"https://api.twitch.tv/helix/streams?user_login={username}"
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, headers=headers) as resp:
-            if resp.status != 200:
-                logger.warning(f"Twitch API returned status {resp.status} for user {username}")
-                return False
-            data = await resp.json()
-            return len(data.get("data", [])) > 0
+def apply_live_status(twitch_username: str, is_live: bool, linked) -> int:
+    """Record a live/offline observation; returns how many announcements were queued."""
+    prev_status = twitch_live_status.get(twitch_username, False)
+    queued = 0
+    if is_live and not prev_status:
+        twitch_live_status[twitch_username] = True
+        for discord_id in linked.get(twitch_username, []):
+            queued += live_announcements(discord_id, twitch_username)
+    elif not is_live and prev_status:
+        twitch_live_status[twitch_username] = False
+        logger.info(f"{twitch_username} went offline.")
+    return queued
+
+
+async def on_twitch_status_change(twitch_username: str, is_live: bool):
+    """EventSub push path; shares state and announcements with polling."""
+    await store_ready.wait("twitch_links")
+    apply_live_status(twitch_username, is_live, get_linked_logins())
+
+
+eventsub = EventSubListener(
+    twitch_client, TWITCH_USER_TOKEN, on_twitch_status_change, ws_url=TWITCH_EVENTSUB_WS_URL
+) if TWITCH_EVENTSUB_ENABLED else None
+eventsub_task = None
 
 
 # =========================
@@ -402,121 +988,222 @@ async def twitch_check_live(username: str) -> bool:
 
 @tasks.loop(seconds=30)
 async def twitch_live_loop():
-    """Check Twitch live status for linked users."""
+    async with profiler.profile("twitch_live_loop"):
+        await check_twitch_live()
+
+
+async def check_twitch_live():
+    """Check Twitch live status for linked users not covered by EventSub."""
     if not TWITCH_ENABLED:
         return  # Twitch disabled
 
+    await store_ready.wait("twitch_links", "guild_config")
     if not twitch_links:
         logger.info("No Twitch users linked, skipping live check.")
         return
 
-    logger.info("Checking Twitch live statuses...")
+    linked = get_linked_logins()
+    covered = set(eventsub.covered) if eventsub else set()
+    to_poll = [login for login in linked if login not in covered]
 
-    for discord_id, twitch_username in twitch_links.items():
+    if to_poll:
+        logger.info("Checking Twitch live statuses...")
         try:
-            is_live = await twitch_check_live(twitch_username)
+            with m_twitch_poll.time():
+                live, checked = await twitch_client.get_live_streams(to_poll)
         except Exception as e:
-            logger.error(f"Error checking live status for {twitch_username}: {e}")
-            continue
+            logger.error(f"Error checking Twitch live statuses: {e}")
+            live, checked = {}, set()
 
-        prev_status = twitch_live_status.get(twitch_username, False)
+        # Announcements are queued; the dispatcher sends them across channels concurrently.
+        for twitch_username in checked:
+            apply_live_status(twitch_username, twitch_username in live, linked)
 
-        if is_live and not prev_status:
-            twitch_live_status[twitch_username] = True
-            # Announce in each guild where this user exists and has a configured twitch channel
-            for guild in bot.guilds:
-                member = guild.get_member(int(discord_id))
-                if not member:
-                    continue
-                cfg = get_guild_config(guild)
-                channel_id = cfg.get("twitch_channel_id") or TWITCH_LIVE_CHANNEL_ID
-                channel = guild.get_channel(channel_id)
-                if not channel:
-                    # No valid Twitch channel in this guild; skip to the next guild
-                    continue
-                await channel.send(
-                    f"@everyone 🔥 {member.mention} is now **LIVE** on Twitch!\n"
-                    f"https://twitch.tv/{twitch_username}"
-                )
-                logger.info(f"Announced live: {twitch_username} in guild {guild.id}")
-        elif not is_live and prev_status:
-            twitch_live_status[twitch_username] = False
-            logger.info(f"{twitch_username} went offline.")
+    # Newly linked streamers were just polled, so their state is current before push takes over.
+    if eventsub:
+        eventsub.update(linked)
 
-    logger.info("Finished Twitch live status check.")
+    logger.info(f"Finished Twitch live status check ({len(to_poll)} polled, {len(covered)} via EventSub).")
 
 
-@tasks.loop(minutes=5)
-async def meme_posting_loop():
-    """Post memes to configured meme channels using per-guild intervals."""
-    now = time.time()
-    updated_any = False
-
-    personality_msgs = [
-        "CROBOT found a banger meme 🔥",
-        "Check this out, kings 👑",
-        "Here's a gem for you all!",
-        "Time for some laughs 😂",
-        "Fresh meme, just for you!"
-    ]
+MEME_PERSONALITY_MSGS = [
+    "CROBOT found a banger meme 🔥",
+    "Check this out, kings 👑",
+    "Here's a gem for you all!",
+    "Time for some laughs 😂",
+    "Fresh meme, just for you!"
+]
 
-    for guild in bot.guilds:
-        try:
-            cfg = get_guild_config(guild)
-            channel_id = cfg.get("meme_channel_id") or MEME_CHANNEL_ID
-            if not channel_id:
-                continue
-            channel = guild.get_channel(channel_id)
-            if not channel:
-                continue
-
-            interval = cfg.get("meme_interval") or MEME_POST_INTERVAL
-            next_time = cfg.get("next_meme_time", 0)
-
-            if now < next_time:
-                continue
-
-            meme = await fetch_random_meme()
-            if not meme:
-                logger.warning("Failed to fetch a meme.")
-                continue
-
-            personality = random.choice(personality_msgs)
-            embed = discord.Embed(
-                title=meme["title"],
-                url=meme["post_link"],
-                color=discord.Color.blue()
-            )
-            embed.set_image(url=meme["image_url"])
-            embed.set_footer(text=f"From r/{meme['subreddit']} by u/{meme['author']}")
-
-            await channel.send(content=personality, embed=embed)
-            logger.info(f"Posted a meme in guild {guild.id}: {meme['title']}")
-
-            # update next meme time for this guild
-            gid = str(guild.id)
-            raw_cfg = guild_config.get(gid, {})
-            raw_cfg["next_meme_time"] = now + interval
-            raw_cfg["meme_interval"] = interval
-            guild_config[gid] = raw_cfg
-            updated_any = True
-        except Exception as e:
-            logger.warning(f"Failed to send meme in guild {getattr(guild, 'id', '?')}: {e}")
 
-    if updated_any:
-        save_json(GUILD_FILE, guild_config)
+def meme_jitter(interval: float) -> float:
+    """Random offset (±5% of the interval, at most ±5 min) so guilds on the same interval drift apart."""
+    spread = min(interval * 0.05, MEME_JITTER_SECONDS)
+    return random.uniform(-spread, spread)
+
+
+def schedule_guild_memes(guild: discord.Guild, now: float = None):
+    """Put a guild on the meme schedule at its persisted next_meme_time.
+
+    Overdue guilds are spread over the next few minutes instead of all firing at once.
+    """
+    now = time.time() if now is None else now
+    due = get_guild_config(guild).next_meme_time
+    if due <= now:
+        due = now + random.uniform(0, MEME_CATCHUP_SECONDS)
+    meme_schedule.schedule(guild.id, due)
+
+
+async def post_guild_meme(guild: discord.Guild, now: float):
+    cfg = get_guild_config(guild)
+    interval = cfg.meme_interval or MEME_POST_INTERVAL
+    channel_id = cfg.meme_channel_id or MEME_CHANNEL_ID
+    channel = guild.get_channel(channel_id) if channel_id else None
+    if not channel:
+        # No meme channel here; look again after one interval (nothing to persist)
+        meme_schedule.schedule(guild.id, now + interval)
+        return
+
+    with m_meme_fetch.time():
+        meme = await meme_provider.get(guild.id)
+    if not meme:
+        logger.warning(f"No fresh meme available for guild {guild.id}; retrying in {MEME_RETRY_SECONDS}s.")
+        meme_schedule.schedule(guild.id, now + MEME_RETRY_SECONDS)
+        return
+
+    embed = discord.Embed(
+        title=meme["title"],
+        url=meme["post_link"],
+        color=discord.Color.blue()
+    )
+    embed.set_image(url=meme["image_url"])
+    embed.set_footer(text=f"From r/{meme['subreddit']} by u/{meme['author']}")
+
+    outbound.send(channel, MEME, content=random.choice(MEME_PERSONALITY_MSGS), embed=embed)
+    logger.info(f"Queued a meme for guild {guild.id}: {meme['title']}")
+
+    # persist the next slot so a restart resumes the same schedule
+    next_time = now + interval + meme_jitter(interval)
+    update_guild_config(guild.id, next_meme_time=next_time, meme_interval=interval)
+    meme_schedule.schedule(guild.id, next_time)
+
+
+async def meme_posting_loop():
+    """Post memes to each guild at its own interval, sleeping until the next guild is due."""
+    while True:
+        due = []
+        try:
+            await meme_schedule.wait()
+            now = time.time()
+            due = meme_schedule.pop_due(now)
+            guilds = [g for g in map(bot.get_guild, due) if g is not None]
+            results = await asyncio.gather(*(post_guild_meme(guild, now) for guild in guilds), return_exceptions=True)
+            for guild, result in zip(guilds, results):
+                if isinstance(result, Exception):
+                    logger.warning(f"Failed to send meme in guild {guild.id}: {result}")
+                    meme_schedule.schedule(guild.id, now + MEME_RETRY_SECONDS)
+        except Exception:
+            # keep the loop alive; guilds popped this round and not rescheduled are retried later
+            logger.exception("meme_posting_loop iteration failed")
+            for guild_id in due:
+                if guild_id not in meme_schedule:
+                    meme_schedule.schedule(guild_id, time.time() + MEME_RETRY_SECONDS)
+            await asyncio.sleep(5)  # don't spin if the failure repeats
 
 
 @tasks.loop(minutes=5)
 async def heartbeat_loop():
     """Simple keep-alive heartbeat so you can see CROBOT is still running."""
     logger.info("Heartbeat: CROBOT is alive and running.")
+    xp_buffer.sample_rate()
+    xp_buffer.prune()
+    stats = xp_buffer.stats()
+    logger.info(
+        f"XP pipeline: {stats['grants_per_sec']:.2f} grants/sec, buffer depth {stats['depth']} "
+        f"(max {stats['max_depth']}), {stats['accepted']}/{stats['offered']} messages granted, "
+        f"{stats['cooldowns']} members cooling down"
+    )
+    out = outbound.stats()
+    summary = ", ".join(
+        f"{name} {p['sent']} sent/{p['dropped']} dropped p95 {p['p95'] * 1000:.0f}ms"
+        for name, p in out["by_priority"].items() if p["enqueued"]
+    )
+    logger.info(f"Outbound: depth {out['depth']} across {out['channels']} channels; {summary or 'idle'}")
+
+
+@tasks.loop(seconds=XP_FLUSH_SECONDS)
+async def xp_flush_loop():
+    """Apply buffered message XP and send coalesced level-up messages."""
+    if not len(xp_buffer) or not store_ready.is_ready("users", "guild_config"):
+        return  # nothing queued, or XP records still loading (the buffer keeps the grants)
+    for channel_id, entries in apply_xp_grants().items():
+        announce_level_ups(channel_id, entries)
 
 
 @tasks.loop(minutes=2)
 async def autosave_loop():
     """Periodically save data to disk."""
-    save_all()
+    await save_all()
+
+
+@tasks.loop(seconds=JOURNAL_FLUSH_MS / 1000)
+async def journal_flush_loop():
+    """Append records changed since the last tick to the journal and fsync them."""
+    loop = asyncio.get_running_loop()
+    try:
+        batch = journal.collect(persistence.current)
+        if batch is None:
+            return
+        await loop.run_in_executor(persist_executor, journal.append, batch)
+    except Exception as e:
+        # the records are still dirty, so the next save_all covers them
+        m_journal_failures.inc()
+        logger.error(f"Journal append failed: {e}")
+        return
+    m_journal_records.inc(batch[1].count("\n"))
+    m_journal_fsync.observe(journal.last_fsync)
+
+
+def merge_shared_store(store: str, local: dict, fresh: dict):
+    """Bring a cross-guild store in line with the database, keeping keys changed locally
+    since the last flush. Returns ``(changed_keys, removed_keys)``."""
+    dirty = persistence.dirty[store]
+    changed, removed = [], []
+    for key, value in fresh.items():
+        if key not in dirty and local.get(key) != value:
+            local[key] = value
+            changed.append(key)
+    for key in [k for k in local if k not in fresh and k not in dirty]:
+        del local[key]
+        removed.append(key)
+    return changed, removed
+
+
+@tasks.loop(seconds=SHARED_REFRESH_SECONDS)
+async def shared_refresh_loop():
+    """Pick up Twitch links and birthdays written by other shard clusters."""
+    await store_ready.wait("twitch_links", "birthdays")
+    loop = asyncio.get_running_loop()
+    async with save_lock:
+        # flush our own changes first so the reload can't resurrect older values
+        await _save_all(False)
+        fresh_links, fresh_birthdays = await loop.run_in_executor(
+            persist_executor, lambda: (storage.load_twitch_links(), storage.load_birthdays())
+        )
+    changed, removed = merge_shared_store("twitch_links", twitch_links, fresh_links)
+    for discord_id in changed:
+        index_linked_user(int(discord_id))
+    for discord_id in removed:
+        announce_index.discard_user(int(discord_id))
+    b_changed, b_removed = merge_shared_store("birthdays", birthdays, fresh_birthdays)
+    for uid in b_changed:
+        birthday_index.set(uid, birthdays[uid])
+    for uid in b_removed:
+        birthday_index.discard(uid)
+    if changed or removed or b_changed or b_removed:
+        logger.info(
+            f"Shared refresh: {len(changed)}/{len(removed)} Twitch links and "
+            f"{len(b_changed)}/{len(b_removed)} birthdays updated/removed by other clusters."
+        )
 
 
 @tasks.loop(hours=24)
@@ -535,47 +1222,82 @@ async def status_rotation_loop():
         logger.warning(f"Failed to update status: {e}")
     status_index += 1
 
-    """Periodically save data to disk."""
-    save_all()
 
-
-@tasks.loop(hours=24)
+@tasks.loop(minutes=1)
 async def birthday_loop():
-    """Check and announce birthdays once a day."""
-    if not bot.guilds:
-        return
-    today = datetime.utcnow().strftime("%m-%d")
-    logger.info("Running daily birthday check...")
+    """Announce birthdays once a day per guild, at the guild's configured local time."""
+    await store_ready.wait("birthdays", "guild_config")
     for guild in bot.guilds:
         cfg = get_guild_config(guild)
-        channel_id = cfg.get("welcome_channel_id") or WELCOME_CHANNEL_ID
-        channel = guild.get_channel(channel_id) or bot.get_channel(channel_id)
-        if not channel:
+        local = local_now(cfg.timezone)
+        if not is_due(local, cfg.birthday_time, cfg.last_birthday_date):
             continue
-        for member in guild.members:
-            uid = str(member.id)
-            bday = birthdays.get(uid)
-            if not bday:
-                continue
-            # stored as YYYY-MM-DD
-            try:
-                _, month, day = bday.split("-")
-                if f"{month}-{day}" == today:
-                    try:
-                        await channel.send(
-                            f"🎂 Happy birthday {member.mention}! Wishing you an amazing day! 🎉"
-                        )
-                        logger.info(f"Wished happy birthday to {member} in guild {guild.id}")
-                    except Exception as e:
-                        logger.warning(f"Failed to send birthday message for {member}: {e}")
-            except Exception:
-                continue
+        update_guild_config(guild.id, last_birthday_date=local.date().isoformat())
+        await announce_birthdays(guild, cfg, local.date())
+
+
+async def announce_birthdays(guild: discord.Guild, cfg, day):
+    user_ids = birthday_index.on(day)
+    logger.info(f"Birthday check for guild {guild.id} ({day}, {cfg.timezone}): {len(user_ids)} candidate(s)")
+    if not user_ids:
+        return
+    channel_id = cfg.welcome_channel_id or WELCOME_CHANNEL_ID
+    channel = guild.get_channel(channel_id) or bot.get_channel(channel_id)
+    if not channel:
+        return
+    for uid in user_ids:
+        member = guild.get_member(int(uid))
+        if member is None:
+            continue
+        outbound.send(channel, BIRTHDAY, content=f"🎂 Happy birthday {member.mention}! Wishing you an amazing day! 🎉")
+        logger.info(f"Queued birthday wish for {member} in guild {guild.id}")
+
+
+# =========================
+# COMMAND SYNC
+# =========================
+
+def command_tree_hash(guild=None) -> str:
+    """Stable hash of the command payloads Discord would receive for a sync of this scope."""
+    payload = sorted(
+        (cmd.to_dict(tree) for cmd in tree.get_commands(guild=guild)),
+        key=lambda c: (c.get("type", 1), c["name"])
+    )
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+async def sync_commands(force: bool = False):
+    """Sync each command scope only when its hash differs from the last successful sync.
+
+    Returns the list of scopes that were synced. Hashes live in the meta table.
+    """
+    loop = asyncio.get_running_loop()
+    scopes = [("global", None)]
+    if GUILD_ID:
+        # primary guild first: it shows up immediately, global may take up to an hour
+        scopes.insert(0, (f"guild:{GUILD_ID}", discord.Object(id=GUILD_ID)))
+    synced = []
+    for scope, guild_obj in scopes:
+        key = f"command_hash:{scope}"
+        digest = command_tree_hash(guild_obj)
+        stored = await loop.run_in_executor(persist_executor, storage.get_meta, key)
+        if not force and stored == digest:
+            logger.info(f"Commands unchanged for {scope} ({digest[:12]}); skipping sync.")
+            continue
+        await tree.sync(guild=guild_obj)
+        await loop.run_in_executor(persist_executor, storage.set_meta, key, digest)
+        synced.append(scope)
+        logger.info(f"Synced commands for {scope} ({digest[:12]}).")
+    return synced
 
 
 # =========================
 # EVENTS
 # =========================
 
+startup_complete = False
+connect_started = None  # set by main() just before logging in
+
 WELCOME_TEXTS = [
     "You're officially part of the crew now. Make yourself at home and say hi 👋",
     "Glad you pulled up! Check the channels, link with the homies, and have fun 😈",
@@ -586,7 +1308,11 @@ WELCOME_TEXTS = [
 
 @bot.event
 async def on_ready():
+    global startup_complete
     logger.info(f"Logged in as {bot.user} (ID: {bot.user.id})")
+    phase = time.perf_counter()
+    if not startup_complete and connect_started is not None:
+        log_startup_phase("login + gateway ready", connect_started)
 
     # Set initial bot activity status and let the rotation loop handle the rest
     if STATUS_MESSAGES:
@@ -595,51 +1321,98 @@ async def on_ready():
         except Exception as e:
             logger.warning(f"Failed to set initial status: {e}")
 
-    # Sync slash commands (hybrid: primary guild + global)
-    try:
-        if GUILD_ID:
-            guild_obj = discord.Object(id=GUILD_ID)
-            await tree.sync(guild=guild_obj)
-            logger.info(f"Synced commands to primary guild {GUILD_ID}.")
-        # Global sync (may take up to 1 hour to appear)
-        await tree.sync()
-        logger.info("Synced GLOBAL commands.")
-    except Exception as e:
-        logger.error(f"Error syncing commands: {e}")
+    # Sync slash commands (hybrid: primary guild + global), only when they changed
+    if OWNS_COMMAND_SYNC:
+        try:
+            await sync_commands()
+        except Exception as e:
+            logger.error(f"Error syncing commands: {e}")
+        phase = log_startup_phase("command sync", phase)
+
+    if not store_ready.is_ready():
+        await store_ready.wait()
+        phase = log_startup_phase("wait for data stores", phase)
+
+    rebuild_announce_index()
+    for guild in bot.guilds:
+        import_legacy_xp(guild)
+
+    for guild in bot.guilds:
+        if guild.id not in meme_schedule:
+            schedule_guild_memes(guild)
+    phase = log_startup_phase(f"guild indexes ({len(bot.guilds)} guilds)", phase)
 
     # Start background loops (only if not running)
-    global meme_loop_started
 
     if not twitch_live_loop.is_running():
         twitch_live_loop.start()
 
-    if not meme_loop_started and not meme_posting_loop.is_running():
+    global eventsub_task
+    if eventsub and eventsub_task is None:
+        eventsub_task = asyncio.create_task(eventsub.run())
+        logger.info("EventSub websocket mode enabled.")
+
+    global metrics_runner, loop_lag_task
+    if loop_lag_task is None:
+        loop_lag_task = asyncio.create_task(measure_loop_lag(m_loop_lag, m_loop_lag_hist))
+        if watchdog:
+            watchdog.start()
+    if METRICS_PORT and metrics_runner is None:
         try:
-            meme_posting_loop.start()
-            meme_loop_started = True
-            logger.info("meme_posting_loop started.")
-        except RuntimeError:
-            logger.warning("meme_posting_loop already running; skipped.")
+            metrics_runner = await serve_metrics(metrics, METRICS_HOST, METRICS_PORT)
+        except OSError as e:
+            logger.error(f"Could not start metrics endpoint on port {METRICS_PORT}: {e}")
+
+    global meme_task
+    if meme_task is None:
+        meme_task = asyncio.create_task(meme_provider.run())
+
+    global meme_loop_task
+    if meme_loop_task is None:
+        meme_loop_task = asyncio.create_task(meme_posting_loop())
+        logger.info(f"meme_posting_loop started ({len(meme_schedule)} guilds scheduled).")
 
     if not heartbeat_loop.is_running():
         heartbeat_loop.start()
 
+    if not xp_flush_loop.is_running():
+        xp_flush_loop.start()
+
     if not autosave_loop.is_running():
         autosave_loop.start()
 
+    if journal is not None and not journal_flush_loop.is_running():
+        journal_flush_loop.start()
+
     if not birthday_loop.is_running():
         birthday_loop.start()
 
     if not status_rotation_loop.is_running():
         status_rotation_loop.start()
 
+    if MULTI_PROCESS and not shared_refresh_loop.is_running():
+        shared_refresh_loop.start()
+    log_startup_phase("start background loops", phase)
+
+    if not startup_complete:
+        startup_complete = True
+        logger.info(f"Startup complete in {time.perf_counter() - BOOT_STARTED:.2f}s.")
+
 
 @bot.event
 async def on_member_join(member: discord.Member):
+    await store_ready.wait("twitch_links", "users", "guild_config")
+    if str(member.id) in twitch_links:
+        announce_index.add(member.id, member.guild.id, get_twitch_channel_id(member.guild))
+    records = user_data.get(member.guild.id)
+    record = records.get(member.id) if records is not None else None
+    if record:
+        leaderboards.update(member.guild.id, member.id, rank_key(record))
+
     cfg = get_guild_config(member.guild)
 
     # Welcome DM
-    dm_template = cfg.get("welcome_dm_message")
+    dm_template = cfg.welcome_dm_message
     if dm_template:
         try:
             dm_text = dm_template.replace("{user}", member.mention).replace("{server}", member.guild.name)
@@ -648,7 +1421,7 @@ async def on_member_join(member: discord.Member):
             logger.warning(f"Failed to send welcome DM to {member}: {e}")
 
     # Auto-role
-    role_id = cfg.get("auto_role_id") or AUTO_ROLE_ID
+    role_id = cfg.auto_role_id or AUTO_ROLE_ID
     if role_id:
         try:
             role = member.guild.get_role(role_id)
@@ -659,7 +1432,7 @@ async def on_member_join(member: discord.Member):
             logger.error(f"Failed to assign auto-role to {member}: {e}")
 
     # Welcome embed
-    welcome_channel_id = cfg.get("welcome_channel_id") or WELCOME_CHANNEL_ID
+    welcome_channel_id = cfg.welcome_channel_id or WELCOME_CHANNEL_ID
     channel = member.guild.get_channel(welcome_channel_id)
     if not channel:
         # No valid welcome channel configured for this guild
@@ -671,27 +1444,75 @@ async def on_member_join(member: discord.Member):
         description=text,
         color=discord.Color.green()
     )
-    embed.set_thumbnail(url=avatar_url)
     embed.set_footer(text=f"Member #{member.guild.member_count}")
-    await channel.send(embed=embed)
+    banner = await render_welcome_banner(member, cfg.banner_style)
+    if banner:
+        embed.set_image(url="attachment://welcome.png")
+        await channel.send(embed=embed, file=discord.File(io.BytesIO(banner), filename="welcome.png"))
+    else:
+        embed.set_thumbnail(url=avatar_url)
+        await channel.send(embed=embed)
     logger.info(f"Welcomed new member {member} in guild {member.guild.id}")
 
 
+async def render_welcome_banner(member: discord.Member, style: str):
+    """PNG bytes of the member's welcome banner, or None for the plain embed
+    (banners off for the guild, Pillow missing, render queue full, or an error)."""
+    if style == "none" or not banner_renderer.enabled:
+        return None
+    avatar = member.display_avatar.replace(size=256, static_format="png")
+    try:
+        return await banner_renderer.render(
+            member.guild.id, style, avatar.key, avatar.read,
+            member.display_name, f"Member #{member.guild.member_count} · {member.guild.name}"
+        )
+    except Exception as e:
+        logger.warning(f"Failed to render welcome banner for {member}: {e}")
+        return None
+
+
+@bot.event
+async def on_member_remove(member: discord.Member):
+    announce_index.discard(member.id, member.guild.id)
+    leaderboards.remove(member.guild.id, member.id)
+
+
+@bot.event
+async def on_guild_join(guild: discord.Guild):
+    await store_ready.wait()
+    await load_guild_xp(guild.id)  # records kept from an earlier stay in this guild
+    index_guild(guild)
+    import_legacy_xp(guild, joined=True)
+    schedule_guild_memes(guild)
+
+
+@bot.event
+async def on_guild_remove(guild: discord.Guild):
+    announce_index.discard_guild(guild.id)
+    leaderboards.drop_guild(guild.id)
+    meme_schedule.cancel(guild.id)
+
+
 @bot.event
 async def on_message(message: discord.Message):
+    with m_on_message.time():
+        async with profiler.profile("on_message"):
+            await handle_message(message)
+
+
+async def handle_message(message: discord.Message):
     if message.author.bot:
         return
 
     # Auto-mod: watchwords + warning system
     if message.guild:
-        bad_words = get_bad_words(message.guild)
-        if bad_words:
-            content_lower = message.content.lower()
-            triggered = None
-            for bad in bad_words:
-                if bad and bad in content_lower:
-                    triggered = bad
-                    break
+        await store_ready.wait("guild_config", "warnings")
+        matcher = get_watchword_matcher(message.guild)
+        if matcher:
+            matches = matcher.find_all(message.content)
+            if matches:
+                m_watchword_matches.inc(len(matches))
+            triggered = matches[0] if matches else None
 
             if triggered:
                 guild = message.guild
@@ -721,8 +1542,8 @@ async def on_message(message: discord.Message):
                     inline=True
                 )
                 embed.add_field(
-                    name="Triggered phrase",
-                    value=f"`{triggered}`",
+                    name="Triggered phrase" if len(matches) == 1 else "Triggered phrases",
+                    value=format_triggered_phrases(matches),
                     inline=True
                 )
                 embed.add_field(
@@ -741,7 +1562,7 @@ async def on_message(message: discord.Message):
                 # Escalation ping on 3rd+ warning
                 content = None
                 cfg = get_guild_config(guild)
-                mod_role_id = cfg.get("mod_role_id")
+                mod_role_id = cfg.mod_role_id
                 if count >= 3:
                     role_to_ping = None
                     if mod_role_id:
@@ -751,26 +1572,15 @@ async def on_message(message: discord.Message):
                     elif guild.owner:
                         content = f"{guild.owner.mention}"
 
-                try:
-                    await message.channel.send(content=content, embed=embed)
-                except Exception as e:
-                    logger.warning(f"Failed to send moderation warning: {e}")
+                outbound.send(message.channel, MODERATION, content=content, embed=embed)
 
                 # Do not grant XP on moderated messages
                 return
 
-    # XP from text messages
-    leveled_up, new_level = add_xp(message.author.id, 5)
-    if leveled_up:
-        emoji = get_emoji_for_level(new_level)
-        try:
-            await message.channel.send(
-                f"🎉 {message.author.mention} leveled up to **Level {new_level}**! {emoji}",
-                delete_after=15
-            )
-            logger.info(f"{message.author} leveled up to {new_level}")
-        except Exception as e:
-            logger.warning(f"Failed to send level up message: {e}")
+    # XP from text messages (per guild; DMs don't earn XP). Queued here,
+    # applied by xp_flush_loop subject to the per-member cooldown.
+    if message.guild:
+        xp_buffer.offer(message.guild.id, message.author.id, message.channel.id, XP_PER_MESSAGE)
 
     await bot.process_commands(message)
 
@@ -808,7 +1618,8 @@ class AdminPanel(discord.ui.View):
     async def server_stats(self, interaction: discord.Interaction, button: discord.ui.Button):
         guild = interaction.guild
         online_members = len([m for m in guild.members if m.status != discord.Status.offline])
-        total_xp = sum(u.get("xp", 0) for u in user_data.values())
+        records = user_data.get(guild.id)
+        total_xp = records.total_xp() if records is not None else 0
         twitch_count = len(twitch_links)
 
         embed = discord.Embed(
@@ -828,16 +1639,18 @@ class AdminPanel(discord.ui.View):
         if not interaction.user.guild_permissions.administrator:
             return await interaction.response.send_message("❌ Admins only.", ephemeral=True)
 
-        user_data.clear()
-        save_all()
-        await interaction.response.send_message("⚠️ All XP & Levels have been reset!", ephemeral=True)
+        reset_guild_levels(interaction.guild.id)
+        await interaction.response.send_message("⚠️ All XP & Levels in this server have been reset!", ephemeral=True)
 
     @discord.ui.button(label="Force Save", style=discord.ButtonStyle.gray)
     async def force_save(self, interaction: discord.Interaction, button: discord.ui.Button):
         if not interaction.user.guild_permissions.administrator:
             return await interaction.response.send_message("❌ Admins only.", ephemeral=True)
-        save_all()
-        await interaction.response.send_message("💾 Data force-saved to disk.", ephemeral=True)
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        if await save_all(durable=True):
+            await interaction.followup.send("💾 Data force-saved to disk.", ephemeral=True)
+        else:
+            await interaction.followup.send("❌ Save failed. Check the logs.", ephemeral=True)
 
 
 # =========================
@@ -857,7 +1670,8 @@ async def ping(interaction: discord.Interaction):
 async def addtwitch(interaction: discord.Interaction, twitch_username: str):
     # Always save the Twitch username locally, even if live checks are not yet configured
     twitch_links[str(interaction.user.id)] = twitch_username.lower()
-    save_json(TWITCH_FILE, twitch_links)
+    persistence.mark("twitch_links", str(interaction.user.id))
+    index_linked_user(interaction.user.id)
 
     if TWITCH_ENABLED:
         message = f"✅ Twitch username `{twitch_username}` linked to your account!"
@@ -895,10 +1709,10 @@ async def mytwitch(interaction: discord.Interaction):
 
 @tree.command(name="prestige", description="Reset your level and start prestige")
 @app_commands.describe(confirm="Set to true to confirm prestige")
+@app_commands.guild_only()
 async def prestige(interaction: discord.Interaction, confirm: bool = False):
-    user_id = str(interaction.user.id)
-    data = user_data.get(user_id)
-    if not data or data.get("level", 1) < MAX_LEVEL:
+    data = peek_user_record(interaction.guild.id, interaction.user.id)
+    if data.get("level", 1) < MAX_LEVEL:
         await interaction.response.send_message(
             "❌ You need to be at max level (100) to prestige.",
             ephemeral=True
@@ -913,8 +1727,7 @@ async def prestige(interaction: discord.Interaction, confirm: bool = False):
         )
         return
 
-    add_prestige(interaction.user.id)
-    save_json(USERS_FILE, user_data)
+    add_prestige(interaction.guild.id, interaction.user.id)
     await interaction.response.send_message(
         f"🎉 {interaction.user.mention} has **prestiged**! Your level and XP have been reset.",
         ephemeral=True
@@ -931,8 +1744,7 @@ async def resetuserdata(interaction: discord.Interaction, member: discord.Member
             ephemeral=True
         )
         return
-    user_data.pop(str(member.id), None)
-    save_json(USERS_FILE, user_data)
+    remove_user_record(interaction.guild.id, member.id)
     await interaction.response.send_message(
         f"✅ Reset XP and level data for {member.display_name}.",
         ephemeral=True
@@ -954,7 +1766,8 @@ async def setbirthday(interaction: discord.Interaction, date: str):
         )
     uid = str(interaction.user.id)
     birthdays[uid] = date
-    save_json(BIRTHDAYS_FILE, birthdays)
+    birthday_index.set(uid, date)
+    persistence.mark("birthdays", uid)
     await interaction.response.send_message(
         f"✅ Your birthday has been set to **{date}**.",
         ephemeral=True
@@ -977,49 +1790,59 @@ async def mybirthday(interaction: discord.Interaction):
 
 
 @tree.command(name="rank", description="Show your current level and prestige")
+@app_commands.guild_only()
 async def rank(interaction: discord.Interaction):
-    data = user_data.get(str(interaction.user.id), {"xp": 0, "level": 1, "prestige": 0})
+    data = peek_user_record(interaction.guild.id, interaction.user.id)
     emoji = get_emoji_for_level(data["level"])
     embed = discord.Embed(
         title=f"{interaction.user.display_name}'s Rank",
         color=discord.Color.gold()
     )
     embed.add_field(name="Level", value=f"{data['level']} {emoji}")
-    embed.add_field(name="XP", value=f"{data['xp']} / {get_level_xp(data['level'])}")
+    curve = get_level_curve(interaction.guild)
+    embed.add_field(name="XP", value=f"{data['xp']} / {get_level_xp(data['level'], curve)}")
     embed.add_field(name="Prestige", value=str(data["prestige"]))
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
 
-@tree.command(name="leaderboard", description="Show top 10 ranked members")
-async def leaderboard(interaction: discord.Interaction):
-    sorted_users = sorted(
-        user_data.items(),
-        key=lambda x: (x[1].get("prestige", 0), x[1].get("level", 0), x[1].get("xp", 0)),
-        reverse=True
-    )
-    embed = discord.Embed(title="🏆 Top 10 Players", color=discord.Color.purple())
+@tree.command(name="leaderboard", description="Show the server's top ranked members")
+@app_commands.guild_only()
+@app_commands.describe(page="Page number (10 players per page)")
+async def leaderboard(interaction: discord.Interaction, page: app_commands.Range[int, 1] = 1):
+    guild = interaction.guild
+    ensure_leaderboard(guild)
+    total = leaderboards.size(guild.id)
+    pages = max(1, -(-total // LEADERBOARD_PAGE_SIZE))
+    page = min(page, pages)
+    start = (page - 1) * LEADERBOARD_PAGE_SIZE
+
+    title = "🏆 Top 10 Players" if page == 1 else f"🏆 Leaderboard (page {page}/{pages})"
+    embed = discord.Embed(title=title, color=discord.Color.purple())
+    records = user_data.get(guild.id) or {}
     count = 0
-    for user_id, data in sorted_users:
-        if count >= 10:
-            break
-        member = interaction.guild.get_member(int(user_id))
-        if member:
+    for position, user_id in enumerate(leaderboards.page(guild.id, start, LEADERBOARD_PAGE_SIZE), start + 1):
+        member = guild.get_member(user_id)
+        data = records.get(user_id)
+        if member and data:
             emoji = get_emoji_for_level(data["level"])
             embed.add_field(
-                name=f"{count+1}. {member.display_name}",
+                name=f"{position}. {member.display_name}",
                 value=f"Level {data['level']} {emoji} | Prestige {data['prestige']}",
                 inline=False
             )
             count += 1
     if count == 0:
         embed.description = "No data available."
+    own_rank = leaderboards.rank(guild.id, interaction.user.id)
+    if own_rank is not None:
+        embed.set_footer(text=f"Your rank: #{own_rank + 1} of {total} | Page {page}/{pages}")
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
 
-
 @tree.command(name="xp", description="Show your XP stats")
+@app_commands.guild_only()
 async def xp_command(interaction: discord.Interaction):
-    data = get_user_record(interaction.user.id)
+    data = peek_user_record(interaction.guild.id, interaction.user.id)
     emoji = get_emoji_for_level(data["level"])
     await interaction.response.send_message(
         f"XP: **{data['xp']}** | Level: **{data['level']}** {emoji} | Prestige: **{data['prestige']}**",
@@ -1047,23 +1870,65 @@ async def synccommands(interaction: discord.Interaction):
             "❌ You need admin permissions for this.", ephemeral=True
         )
 
+    await interaction.response.defer(ephemeral=True, thinking=True)
     try:
-        if GUILD_ID:
-            guild_obj = discord.Object(id=GUILD_ID)
-            await tree.sync(guild=guild_obj)
-
-        await tree.sync()
+        # Explicit override: sync even if the stored command hashes match
+        await sync_commands(force=True)
 
-        await interaction.response.send_message(
+        await interaction.followup.send(
             "✅ Slash commands synced. Global commands may take up to 1 hour to appear.",
             ephemeral=True
         )
         logger.info(f"Slash commands manually synced by {interaction.user}.")
     except Exception as e:
-        await interaction.response.send_message("❌ Failed to sync commands.", ephemeral=True)
+        await interaction.followup.send("❌ Failed to sync commands.", ephemeral=True)
         logger.error(f"Manual command sync error: {e}")
 
 
+@tree.command(name="profile", description="Capture a cProfile of the next slow handler run (admin only).")
+@app_commands.describe(
+    target="Handler to profile (or 'status' to list armed targets and recent captures)",
+    threshold_ms="Only keep a run slower than this many milliseconds",
+    attempts="Give up after this many runs without a slow one"
+)
+@app_commands.choices(target=[
+    app_commands.Choice(name=name, value=name) for name in PROFILE_TARGETS + ("status", "off")
+])
+async def profile(interaction: discord.Interaction, target: app_commands.Choice[str],
+                  threshold_ms: app_commands.Range[int, 0, 60000] = 200,
+                  attempts: app_commands.Range[int, 1, 10000] = 100):
+    if not interaction.user.guild_permissions.administrator:
+        return await interaction.response.send_message(
+            "❌ You need admin permissions for this.", ephemeral=True
+        )
+
+    if target.value == "off":
+        profiler.disarm()
+        return await interaction.response.send_message("✅ Profiler disarmed.", ephemeral=True)
+
+    if target.value == "status":
+        armed = ", ".join(
+            f"{name} (>{spec['threshold'] * 1000:.0f}ms, {spec['attempts']} left)"
+            for name, spec in profiler.armed.items()
+        ) or "nothing"
+        captures = "\n".join(
+            f"• {name}: {duration * 1000:.0f}ms → `{path}`" for name, duration, path in profiler.captures[-5:]
+        ) or "none yet"
+        stalls = (
+            f"{watchdog.stalls} stalls, longest {watchdog.longest_stall * 1000:.0f}ms" if watchdog else "watchdog off"
+        )
+        return await interaction.response.send_message(
+            f"Armed: {armed}\nEvent loop: {stalls}\nRecent captures:\n{captures}", ephemeral=True
+        )
+
+    profiler.arm(target.value, threshold_ms / 1000, attempts)
+    await interaction.response.send_message(
+        f"✅ Profiling the next `{target.value}` run slower than {threshold_ms}ms. "
+        f"The capture is written to `{PROFILE_DIR}` and summarized in the log.",
+        ephemeral=True
+    )
+
+
 # =========================
 # ADMIN CONFIG COMMANDS (per-server channels & roles)
 # =========================
@@ -1092,12 +1957,26 @@ async def setwelcome(interaction: discord.Interaction, channel: discord.TextChan
     )
 
 
+@tree.command(name="setbanner", description="Set this server's welcome banner style (admin only)")
+@app_commands.describe(style="Banner style, or none for a plain welcome embed")
+@app_commands.choices(style=[app_commands.Choice(name=s, value=s) for s in (*BANNER_STYLES, "none")])
+async def setbanner(interaction: discord.Interaction, style: app_commands.Choice[str]):
+    if not interaction.user.guild_permissions.administrator:
+        return await interaction.response.send_message("❌ Admins only.", ephemeral=True)
+    set_guild_value(interaction.guild, "banner_style", style.value)
+    await interaction.response.send_message(
+        f"✅ Welcome banner style set to **{style.value}** for this server.",
+        ephemeral=True
+    )
+
+
 @tree.command(name="setmemes", description="Set this server's meme channel (admin only)")
 @app_commands.describe(channel="Channel to auto-post memes in")
 async def setmemes(interaction: discord.Interaction, channel: discord.TextChannel):
     if not interaction.user.guild_permissions.administrator:
         return await interaction.response.send_message("❌ Admins only.", ephemeral=True)
     set_guild_value(interaction.guild, "meme_channel_id", channel.id)
+    schedule_guild_memes(interaction.guild)
     await interaction.response.send_message(
         f"✅ Meme channel set to {channel.mention} for this server.",
         ephemeral=True
@@ -1127,13 +2006,9 @@ async def setmemeinterval(interaction: discord.Interaction, interval: app_comman
     }
     seconds = mapping.get(interval.value, MEME_POST_INTERVAL)
 
-    gid = str(interaction.guild.id)
-    raw_cfg = guild_config.get(gid, {})
-    raw_cfg["meme_interval"] = seconds
     # force next meme to be scheduled from now
-    raw_cfg["next_meme_time"] = 0
-    guild_config[gid] = raw_cfg
-    save_json(GUILD_FILE, guild_config)
+    update_guild_config(interaction.guild.id, meme_interval=seconds, next_meme_time=0)
+    schedule_guild_memes(interaction.guild)
 
     await interaction.response.send_message(
         f"✅ Meme interval set to **{interval.name}** for this server.",
@@ -1143,12 +2018,54 @@ async def setmemeinterval(interaction: discord.Interaction, interval: app_comman
 
 
 
+@tree.command(name="setlevelcurve", description="Set how much XP each level needs in this server (admin only)")
+@app_commands.describe(curve="XP curve for leveling")
+@app_commands.choices(curve=[
+    app_commands.Choice(name="Linear (100 XP x level)", value="linear"),
+    app_commands.Choice(name="Quadratic (50 XP x level²)", value="quadratic"),
+    app_commands.Choice(name="Exponential (+10% per level)", value="exponential"),
+])
+async def setlevelcurve(interaction: discord.Interaction, curve: app_commands.Choice[str]):
+    if not interaction.user.guild_permissions.administrator:
+        return await interaction.response.send_message("❌ Admins only.", ephemeral=True)
+    set_guild_value(interaction.guild, "level_curve", curve.value)
+    await interaction.response.send_message(
+        f"✅ Level curve set to **{curve.name}** for this server. Existing levels are kept.",
+        ephemeral=True
+    )
+
+
+@tree.command(name="setbirthdaytime", description="Set when birthdays are announced in this server (admin only)")
+@app_commands.describe(
+    time="Local time in 24h HH:MM format, e.g. 09:00",
+    timezone="IANA timezone, e.g. Europe/Berlin or America/New_York (default UTC)"
+)
+async def setbirthdaytime(interaction: discord.Interaction, time: str, timezone: str = "UTC"):
+    if not interaction.user.guild_permissions.administrator:
+        return await interaction.response.send_message("❌ Admins only.", ephemeral=True)
+    at = parse_time(time)
+    if at is None:
+        return await interaction.response.send_message("❌ Invalid time. Use HH:MM (24h).", ephemeral=True)
+    if not is_valid_zone(timezone):
+        return await interaction.response.send_message(
+            f"❌ Unknown timezone `{timezone}`. Use an IANA name like `Europe/Berlin`.",
+            ephemeral=True
+        )
+    set_guild_value(interaction.guild, "birthday_time", at.strftime("%H:%M"))
+    set_guild_value(interaction.guild, "timezone", timezone)
+    await interaction.response.send_message(
+        f"✅ Birthdays will be announced at **{at.strftime('%H:%M')}** ({timezone}).",
+        ephemeral=True
+    )
+
+
 @tree.command(name="settwitch", description="Set this server's Twitch announcement channel (admin only)")
 @app_commands.describe(channel="Channel to announce Twitch go-lives in")
 async def settwitch(interaction: discord.Interaction, channel: discord.TextChannel):
     if not interaction.user.guild_permissions.administrator:
         return await interaction.response.send_message("❌ Admins only.", ephemeral=True)
     set_guild_value(interaction.guild, "twitch_channel_id", channel.id)
+    announce_index.set_guild_channel(interaction.guild.id, channel.id)
     await interaction.response.send_message(
         f"✅ Twitch live announcements will go to {channel.mention} for this server.",
         ephemeral=True
@@ -1282,6 +2199,7 @@ async def findplayers(interaction: discord.Interaction, game: str):
 
 @tree.command(name="coinflip", description="Flip a coin, win XP if you guess right!")
 @app_commands.describe(guess="Heads or tails?")
+@app_commands.guild_only()
 async def coinflip(interaction: discord.Interaction, guess: str):
     guess = guess.lower()
     if guess not in ["heads", "tails"]:
@@ -1292,8 +2210,7 @@ async def coinflip(interaction: discord.Interaction, guess: str):
         return
     result = random.choice(["heads", "tails"])
     if guess == result:
-        leveled_up, new_level = add_xp(interaction.user.id, 10)
-        save_json(USERS_FILE, user_data)
+        leveled_up, new_level = add_xp(interaction.guild.id, interaction.user.id, 10, get_level_curve(interaction.guild))
         msg = f"🎉 You guessed correctly! It was **{result}**. You earned 10 XP!"
         if leveled_up:
             emoji = get_emoji_for_level(new_level)
@@ -1304,6 +2221,7 @@ async def coinflip(interaction: discord.Interaction, guess: str):
 
 
 @tree.command(name="trivia", description="Answer a trivia question and earn XP!")
+@app_commands.guild_only()
 async def trivia(interaction: discord.Interaction):
     question = random.choice(TRIVIA_QUESTIONS)
 
@@ -1323,8 +2241,7 @@ async def trivia(interaction: discord.Interaction):
         return
 
     if question['a'].lower() in msg.content.lower():
-        leveled_up, new_level = add_xp(interaction.user.id, 15)
-        save_json(USERS_FILE, user_data)
+        leveled_up, new_level = add_xp(interaction.guild.id, interaction.user.id, 15, get_level_curve(interaction.guild))
         reply = f"🎉 {interaction.user.mention} Correct! You earned **15 XP**."
         if leveled_up:
             emoji = get_emoji_for_level(new_level)
@@ -1449,5 +2366,50 @@ async def love(interaction: discord.Interaction):
 # RUN THE BOT
 # =========================
 
+async def main():
+    global connect_started, stores_task
+    async with bot:
+        try:
+            if ASYNCIO_DEBUG:
+                loop = asyncio.get_running_loop()
+                loop.set_debug(True)
+                loop.slow_callback_duration = (LOOP_STALL_MS or 100) / 1000
+            # forks the render workers, so it goes before anything starts a thread
+            banner_renderer.start()
+            # data stores load on the persistence thread while the gateway connects
+            stores_task = asyncio.create_task(load_stores())
+            connect_started = time.perf_counter()
+            await bot.start(DISCORD_BOT_TOKEN)
+        finally:
+            if stores_task:
+                stores_task.cancel()
+            if eventsub_task:
+                await eventsub.close()
+                eventsub_task.cancel()
+            if twitch_client:
+                await twitch_client.close()
+            if meme_task:
+                meme_task.cancel()
+            if meme_loop_task:
+                meme_loop_task.cancel()
+            if loop_lag_task:
+                loop_lag_task.cancel()
+            if watchdog:
+                watchdog.stop()
+            banner_renderer.close()
+            if metrics_runner:
+                await metrics_runner.cleanup()
+            await meme_provider.close()
+            # Apply any buffered message XP, then flush whatever changed since the last autosave.
+            if store_ready.is_ready("users", "guild_config"):
+                apply_xp_grants()  # never onto a half-loaded store: the flush would overwrite stored XP
+            await outbound.drain()
+            await save_all(durable=True)
+
+
 if __name__ == "__main__":
-    bot.run(DISCORD_BOT_TOKEN)
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    persist_executor.shutdown(wait=True)
@@ -0,0 +1,167 @@
+import json
+import logging
+import os
+import re
+import time
+
+from storage import drop_scope
+
+logger = logging.getLogger("CROBOT.journal")
+
+_SEGMENT_RE = re.compile(r"^journal-(\d+)\.jsonl$")
+
+
+# =========================
+# APPEND-ONLY JOURNAL
+# =========================
+
+def _segments(directory: str):
+    """[(number, path)] of the journal segments in ``directory``, oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    found = []
+    for name in os.listdir(directory):
+        match = _SEGMENT_RE.match(name)
+        if match:
+            found.append((int(match.group(1)), os.path.join(directory, name)))
+    return sorted(found)
+
+
+class Journal:
+    """JSONL redo log of changed records between database snapshots.
+
+    Mutations are recorded through ``WriteBehind.mark`` into ``pending``;
+    ``collect`` (event loop) turns the keys changed since the last call into
+    one line per record holding its current value, and ``append``
+    (persistence thread) writes and fsyncs that batch. So a crash loses at
+    most one batch interval, and the cost follows the change volume.
+
+    Each save rotates to a new segment; once the save is in the database
+    and synced, ``discard_through`` deletes the segments it covers.
+    """
+
+    def __init__(self, directory: str, stores):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        existing = _segments(directory)
+        self.segment = existing[-1][0] + 1 if existing else 1
+        self.pending = {name: set() for name in stores}
+        self.cleared = set()
+        self._file = None
+        self._file_segment = None
+        self._torn = False
+        self.records = 0
+        self.bytes = 0
+        self.fsyncs = 0
+        self.last_fsync = 0.0
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"journal-{segment:06d}.jsonl")
+
+    def mark(self, store: str, key):
+        self.pending[store].add(key)
+
+    def mark_cleared(self, store: str, guild_id: str = None):
+        self.cleared.add((store, guild_id))
+        drop_scope(self.pending[store], guild_id)
+
+    def collect(self, current):
+        """Serialize the pending changes as ``(segment, text)``, or None if nothing changed.
+
+        ``current(store, key)`` returns a record's value (None if deleted).
+        """
+        lines = [json.dumps({"s": store, "clear": True, "g": guild_id}) for store, guild_id in self.cleared]
+        self.cleared.clear()
+        for store, keys in self.pending.items():
+            for key in keys:
+                lines.append(json.dumps(
+                    {"s": store, "k": list(key) if isinstance(key, tuple) else key, "v": current(store, key)},
+                    separators=(",", ":")
+                ))
+            keys.clear()
+        if not lines:
+            return None
+        return self.segment, "\n".join(lines) + "\n"
+
+    def rotate(self) -> int:
+        """Start a new segment for later batches; returns the one just closed."""
+        self.segment += 1
+        return self.segment - 1
+
+    def append(self, batch):
+        """Write and fsync one collected batch. Blocking; run it on the persistence thread."""
+        segment, text = batch
+        if self._file_segment != segment:
+            self.close()
+            self._file = open(self._path(segment), "a", encoding="utf-8")
+            self._file_segment = segment
+            self._torn = False
+        records = text.count("\n")
+        start = time.perf_counter()
+        if self._torn:
+            text = "\n" + text  # don't glue this batch onto a partly written line
+        try:
+            self._file.write(text)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except Exception:
+            self._torn = True
+            raise
+        self._torn = False
+        self.last_fsync = time.perf_counter() - start
+        self.records += records
+        self.bytes += len(text)
+        self.fsyncs += 1
+
+    def discard_through(self, segment: int):
+        """Delete the segments a synced database snapshot now covers. Persistence thread."""
+        if self._file_segment is not None and self._file_segment <= segment:
+            self.close()
+        for number, path in _segments(self.directory):
+            if number <= segment:
+                os.remove(path)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._file_segment = None
+
+
+def replay_journal(storage, directory: str) -> int:
+    """Apply leftover journal segments (from a crash) to the database, then delete them.
+
+    Later lines win, a ``clear`` line drops the earlier changes it covers (the
+    store, or one guild of it), and a torn line (a crash mid-write) is skipped.
+    Returns the number of records replayed.
+    """
+    segments = _segments(directory)
+    if not segments:
+        return 0
+    changes, cleared = {}, set()
+    replayed = skipped = 0
+    for _, path in segments:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    skipped += 1
+                    continue
+                store = entry["s"]
+                if entry.get("clear"):
+                    cleared.add((store, entry.get("g")))
+                    drop_scope(changes.get(store, {}), entry.get("g"))
+                    continue
+                key = entry["k"]
+                changes.setdefault(store, {})[tuple(key) if isinstance(key, list) else key] = entry["v"]
+                replayed += 1
+    storage.write_changes(changes, tuple(cleared))
+    storage.checkpoint("FULL")
+    for _, path in segments:
+        os.remove(path)
+    logger.warning(
+        f"Replayed {replayed} journal records from {len(segments)} segment(s) left by an unclean shutdown"
+        + (f" ({skipped} torn line(s) skipped)." if skipped else ".")
+    )
+    return replayed
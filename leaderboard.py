@@ -0,0 +1,202 @@
+import random
+
+
+# =========================
+# INDEXABLE SKIP LIST
+# =========================
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key, levels: int):
+        self.key = key
+        self.next = [None] * levels
+        self.width = [1] * levels
+
+
+class RankedIndex:
+    """Members ordered by rank key, with O(log N) insert/remove/rank.
+
+    Backed by an indexable skip list (each link stores how many positions it
+    skips), so "rank of member", "top K" and "page N" never sort anything.
+    Lower keys rank higher; ties are broken by member ID.
+    """
+
+    MAX_LEVELS = 32
+
+    def __init__(self):
+        self._head = _Node(None, self.MAX_LEVELS)
+        self._height = 1  # levels currently in use; searches start here
+        self._size = 0
+        self._keys = {}   # {member_id: full key}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, member_id):
+        return member_id in self._keys
+
+    def members(self):
+        return list(self._keys)
+
+    def _random_levels(self) -> int:
+        levels = 1
+        while levels < self.MAX_LEVELS and random.random() < 0.5:
+            levels += 1
+        return levels
+
+    def _insert(self, key):
+        levels = self._random_levels()
+        head = self._head
+        while self._height < levels:
+            # a fresh head link spans every element to the end of the list
+            head.width[self._height] = self._size + 1
+            self._height += 1
+
+        chain = [None] * self._height
+        steps_at_level = [0] * self._height
+        node = head
+        for level in reversed(range(self._height)):
+            while node.next[level] is not None and node.next[level].key < key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        new = _Node(key, levels)
+        steps = 0
+        for level in range(levels):
+            prev = chain[level]
+            new.next[level] = prev.next[level]
+            prev.next[level] = new
+            new.width[level] = prev.width[level] - steps
+            prev.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(levels, self._height):
+            chain[level].width[level] += 1
+        self._size += 1
+
+    def _remove(self, key):
+        chain = [None] * self._height
+        node = self._head
+        for level in reversed(range(self._height)):
+            while node.next[level] is not None and node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+        target = chain[0].next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+        for level in range(len(target.next)):
+            prev = chain[level]
+            prev.width[level] += target.width[level] - 1
+            prev.next[level] = target.next[level]
+        for level in range(len(target.next), self._height):
+            chain[level].width[level] -= 1
+        self._size -= 1
+
+    def update(self, member_id, rank_key: tuple):
+        key = rank_key + (member_id,)
+        old = self._keys.get(member_id)
+        if old == key:
+            return
+        if old is not None:
+            self._remove(old)
+        self._insert(key)
+        self._keys[member_id] = key
+
+    def discard(self, member_id):
+        old = self._keys.pop(member_id, None)
+        if old is not None:
+            self._remove(old)
+
+    def clear(self):
+        self._head = _Node(None, self.MAX_LEVELS)
+        self._height = 1
+        self._size = 0
+        self._keys.clear()
+
+    def rank(self, member_id):
+        """0-based position of ``member_id``, or None if it isn't indexed."""
+        key = self._keys.get(member_id)
+        if key is None:
+            return None
+        node = self._head
+        position = 0
+        for level in reversed(range(self._height)):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        return position
+
+    def page(self, start: int, count: int):
+        """Return up to ``count`` member IDs starting at 0-based position ``start``."""
+        if start < 0 or start >= len(self._keys) or count <= 0:
+            return []
+        node = self._head
+        remaining = start + 1
+        for level in reversed(range(self._height)):
+            while node.next[level] is not None and node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        members = []
+        while node is not None and len(members) < count:
+            members.append(node.key[-1])
+            node = node.next[0]
+        return members
+
+    def top(self, count: int):
+        return self.page(0, count)
+
+
+# =========================
+# PER-GUILD LEADERBOARDS
+# =========================
+
+class LeaderboardIndex:
+    """One RankedIndex per guild, updated in place as XP changes.
+
+    A guild's index is built lazily the first time its leaderboard is
+    requested; until then updates for that guild are ignored.
+    """
+
+    def __init__(self):
+        self._guilds = {}  # {guild_id: RankedIndex}
+
+    def is_built(self, guild_id) -> bool:
+        return guild_id in self._guilds
+
+    def build_guild(self, guild_id, members):
+        """Index a guild from ``(user_id, rank_key)`` pairs."""
+        index = RankedIndex()
+        for user_id, rank_key in members:
+            index.update(user_id, rank_key)
+        self._guilds[guild_id] = index
+
+    def drop_guild(self, guild_id):
+        self._guilds.pop(guild_id, None)
+
+    def update(self, guild_id, user_id, rank_key):
+        index = self._guilds.get(guild_id)
+        if index is not None:
+            index.update(user_id, rank_key)
+
+    def remove(self, guild_id, user_id):
+        index = self._guilds.get(guild_id)
+        if index is not None:
+            index.discard(user_id)
+
+    def clear_guild(self, guild_id):
+        index = self._guilds.get(guild_id)
+        if index is not None:
+            index.clear()
+
+    def size(self, guild_id) -> int:
+        index = self._guilds.get(guild_id)
+        return len(index) if index is not None else 0
+
+    def rank(self, guild_id, user_id):
+        index = self._guilds.get(guild_id)
+        return index.rank(user_id) if index is not None else None
+
+    def page(self, guild_id, start: int, count: int):
+        index = self._guilds.get(guild_id)
+        return index.page(start, count) if index is not None else []
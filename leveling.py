@@ -0,0 +1,101 @@
+from bisect import bisect_right
+
+
+# =========================
+# LEVEL CURVES
+# =========================
+
+class LevelCurve:
+    """Precomputed XP curve.
+
+    ``need(level)`` is the XP required to go from ``level`` to ``level + 1``.
+    Cumulative thresholds are built once, so converting any XP grant (even a
+    huge admin grant) to a level is a single bisect instead of a loop.
+    Records keep the bot's existing shape: ``level`` plus XP into that level.
+    """
+
+    __slots__ = ("name", "max_level", "_need", "_cumulative")
+
+    def __init__(self, name: str, need, max_level: int):
+        self.name = name
+        self.max_level = max_level
+        # index by level; [0] is unused padding so level numbers line up
+        self._need = [0] + [int(need(level)) for level in range(1, max_level + 1)]
+        cumulative = [0, 0]  # total XP needed to reach level 1 is 0
+        for level in range(1, max_level):
+            cumulative.append(cumulative[-1] + self._need[level])
+        self._cumulative = cumulative
+
+    def xp_for_level(self, level: int) -> int:
+        """XP needed to clear ``level`` (what get_level_xp used to return)."""
+        return self._need[min(max(level, 1), self.max_level)]
+
+    def total_xp(self, level: int, xp: int) -> int:
+        return self._cumulative[min(max(level, 1), self.max_level)] + xp
+
+    def apply(self, level: int, xp: int, amount: int):
+        """Return ``(new_level, new_xp)`` after granting ``amount`` XP.
+
+        Same rules as the old loop: levels stop at ``max_level`` and any extra
+        XP stays on the record.
+        """
+        if 0 < level < self.max_level and 0 <= xp + amount < self._need[level]:
+            return level, xp + amount  # common case: a message grant that doesn't level up
+        total = self.total_xp(level, xp) + amount
+        cumulative = self._cumulative
+        if total >= cumulative[self.max_level]:
+            return self.max_level, total - cumulative[self.max_level]
+        new_level = max(bisect_right(cumulative, total) - 1, 1)
+        return new_level, total - cumulative[new_level]
+
+
+# Registry of curves selectable per guild; add more with register_curve().
+CURVE_FUNCTIONS = {
+    "linear": lambda level: 100 * level,                     # original CROBOT curve
+    "quadratic": lambda level: 50 * level * level,
+    "exponential": lambda level: 100 * 1.1 ** (level - 1),
+}
+DEFAULT_CURVE = "linear"
+
+_curves = {}
+
+
+def register_curve(name: str, need, max_level: int):
+    _curves[name] = LevelCurve(name, need, max_level)
+    return _curves[name]
+
+
+def build_curves(max_level: int):
+    for name, need in CURVE_FUNCTIONS.items():
+        register_curve(name, need, max_level)
+
+
+def get_curve(name: str = DEFAULT_CURVE) -> LevelCurve:
+    return _curves.get(name) or _curves[DEFAULT_CURVE]
+
+
+def curve_names():
+    return list(_curves)
+
+
+# =========================
+# LEVEL EMOJIS
+# =========================
+
+class EmojiTable:
+    """Level -> emoji lookup built once from the ``{threshold: emoji}`` mapping."""
+
+    __slots__ = ("_table",)
+
+    def __init__(self, thresholds: dict, max_level: int):
+        table = [""] * (max_level + 1)
+        current = ""
+        for level in range(max_level + 1):
+            current = thresholds.get(level, current)
+            table[level] = current
+        self._table = table
+
+    def __call__(self, level: int) -> str:
+        if level < 0:
+            return ""
+        return self._table[min(level, len(self._table) - 1)]
@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+
+import aiohttp
+
+logger = logging.getLogger("CROBOT.memes")
+
+MEME_API_URL = "https://meme-api.com/gimme"
+MEME_BATCH_SIZE = 20        # memes requested per API call (the API caps this at 50)
+MEME_BUFFER_SIZE = 40       # refill when the buffer drops below half of this
+MEME_DEDUPE_WINDOW = 7 * 24 * 3600  # don't repost a link in the same guild within a week
+
+
+# =========================
+# MEME PROVIDER
+# =========================
+
+def _normalize(raw: dict):
+    """API item -> the dict meme_posting_loop uses, or None if unusable (NSFW, spoiler, no image)."""
+    if raw.get("nsfw") or raw.get("spoiler"):
+        return None
+    link, image = raw.get("postLink"), raw.get("url")
+    if not link or not image:
+        return None
+    return {
+        "title": raw.get("title", "")[:256],
+        "post_link": link,
+        "image_url": image,
+        "subreddit": raw.get("subreddit", "?"),
+        "author": raw.get("author", "?"),
+    }
+
+
+class MemeProvider:
+    """Prefetching meme source shared by every guild.
+
+    A background task keeps a buffer of memes filled from the meme API over
+    one pooled session, so a due guild gets a meme without waiting on HTTP.
+    Each guild remembers the post links it was given for ``dedupe_window``
+    seconds and is never handed the same link twice inside that window.
+    """
+
+    def __init__(self, api_url: str = MEME_API_URL, buffer_size: int = MEME_BUFFER_SIZE,
+                 batch_size: int = MEME_BATCH_SIZE, dedupe_window: float = MEME_DEDUPE_WINDOW):
+        self.api_url = api_url.rstrip("/")
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self.dedupe_window = dedupe_window
+        self._session = None
+        self._buffer = deque()
+        self._buffered_links = set()
+        self._history = {}              # {guild_id: OrderedDict(post_link -> time given)}
+        self._wanted = asyncio.Event()  # set when the buffer runs low
+        self._starved = False           # a guild has seen everything buffered: fetch past buffer_size
+        self.max_buffer = buffer_size * 4  # past this, refills drop the oldest buffered memes
+        self._refilled = asyncio.Event()
+        self._closed = False
+        self.api_calls = 0
+        self.fetched = 0
+        self.served = 0
+        self.duplicates = 0
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=15),
+                connector=aiohttp.TCPConnector(limit=4),
+            )
+        return self._session
+
+    async def close(self):
+        self._closed = True
+        self._wanted.set()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def __len__(self):
+        return len(self._buffer)
+
+    async def _fetch_batch(self):
+        self.api_calls += 1
+        async with self.session.get(f"{self.api_url}/{self.batch_size}") as resp:
+            if resp.status != 200:
+                raise RuntimeError(f"meme API returned {resp.status}")
+            data = await resp.json(content_type=None)
+        # /gimme/{n} returns {"memes": [...]}; plain /gimme returns a single meme
+        return data.get("memes", [data]) if isinstance(data, dict) else []
+
+    async def refill(self) -> int:
+        """Fetch one batch into the buffer; returns how many new memes were added."""
+        added = 0
+        for raw in await self._fetch_batch():
+            meme = _normalize(raw)
+            if meme is None or meme["post_link"] in self._buffered_links:
+                continue
+            self._buffer.append(meme)
+            self._buffered_links.add(meme["post_link"])
+            added += 1
+        while len(self._buffer) > self.max_buffer:
+            self._buffered_links.discard(self._buffer.popleft()["post_link"])
+        self.fetched += added
+        self._refilled.set()
+        self._refilled.clear()
+        return added
+
+    async def run(self):
+        """Background prefetch loop; keeps the buffer at least half full."""
+        backoff = 5
+        self._wanted.set()
+        while not self._closed:
+            await self._wanted.wait()
+            if self._closed:
+                break
+            try:
+                while len(self._buffer) < self.buffer_size or self._starved:
+                    self._starved = False
+                    if not await self.refill():
+                        break  # API returned nothing usable; wait for the next request
+                backoff = 5
+                self._wanted.clear()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Meme prefetch failed: {e}; retrying in {backoff}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 300)
+
+    def _recent(self, guild_id, now: float):
+        history = self._history.setdefault(guild_id, OrderedDict())
+        cutoff = now - self.dedupe_window
+        while history:
+            link, given = next(iter(history.items()))
+            if given >= cutoff:
+                break
+            history.popitem(last=False)
+        return history
+
+    def take(self, guild_id):
+        """Hand out a buffered meme not recently given to this guild, or None without waiting."""
+        now = time.time()
+        recent = self._recent(guild_id, now)
+        meme = None
+        for _ in range(len(self._buffer)):
+            candidate = self._buffer.popleft()
+            if candidate["post_link"] in recent:
+                self.duplicates += 1
+                self._buffer.append(candidate)  # may still suit another guild
+                continue
+            meme = candidate
+            break
+        if meme is None:
+            # Everything buffered was already given to this guild, but other guilds (including
+            # ones that haven't taken a meme yet) may still use it: keep it and fetch a batch
+            # anyway. refill() bounds the buffer at max_buffer by dropping the oldest memes.
+            self._starved = True
+            self._wanted.set()
+            return None
+        if len(self._buffer) < self.buffer_size // 2:
+            self._wanted.set()
+        self._buffered_links.discard(meme["post_link"])
+        recent[meme["post_link"]] = now
+        self.served += 1
+        return meme
+
+    async def get(self, guild_id, timeout: float = 10.0):
+        """Like take(), but waits up to ``timeout`` for a refill if the buffer has nothing suitable."""
+        meme = self.take(guild_id)
+        if meme is not None:
+            return meme
+        self._wanted.set()
+        try:
+            await asyncio.wait_for(self._refilled.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        return self.take(guild_id)
+
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self._buffer),
+            "fetched": self.fetched,
+            "served": self.served,
+            "duplicates": self.duplicates,
+            "api_calls": self.api_calls,
+        }
@@ -0,0 +1,212 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger("CROBOT.outbound")
+
+# Lower value = sent first.
+MODERATION = 0
+LIVE_ALERT = 1
+BIRTHDAY = 2
+LEVEL_UP = 3
+MEME = 4
+
+PRIORITY_NAMES = {
+    MODERATION: "moderation",
+    LIVE_ALERT: "live_alert",
+    BIRTHDAY: "birthday",
+    LEVEL_UP: "level_up",
+    MEME: "meme",
+}
+
+# Only these priorities may be dropped, and only after waiting this long (seconds)
+# or when their channel's queue is full.
+DROP_AFTER = {
+    LEVEL_UP: 30.0,   # the message deletes itself after 15s anyway
+    MEME: 300.0,
+}
+
+# Discord allows roughly 5 messages per 5 seconds per channel.
+CHANNEL_BURST = 5
+CHANNEL_PERIOD = 5.0
+MAX_CONCURRENT_SENDS = 10
+MAX_CHANNEL_QUEUE = 25
+LATENCY_SAMPLES = 1000
+
+
+# =========================
+# OUTBOUND DISPATCHER
+# =========================
+
+class _ChannelQueue:
+    __slots__ = ("channel", "heap", "task", "tokens", "refilled")
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.heap = []      # [(priority, seq, enqueued_at, kwargs, future)]
+        self.task = None
+        self.tokens = float(CHANNEL_BURST)
+        self.refilled = time.monotonic()
+
+    def take_token(self) -> float:
+        """Consume a send token; returns how long to wait first (0 if one is ready)."""
+        now = time.monotonic()
+        rate = CHANNEL_BURST / CHANNEL_PERIOD
+        self.tokens = min(CHANNEL_BURST, self.tokens + (now - self.refilled) * rate)
+        self.refilled = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / rate
+
+    def full_in(self) -> float:
+        """Seconds until the bucket has refilled to a full burst (0 if it already has)."""
+        elapsed = time.monotonic() - self.refilled
+        return max(0.0, (CHANNEL_BURST - self.tokens) * CHANNEL_PERIOD / CHANNEL_BURST - elapsed)
+
+
+class OutboundDispatcher:
+    """Per-channel priority queues for bot-initiated messages.
+
+    Each channel with pending messages gets one worker task, so channels send
+    concurrently (bounded by ``max_concurrency``) while each channel is paced
+    to stay inside its message bucket. Within a channel the most important
+    message goes first. Level-ups and memes are dropped when they go stale or
+    when the channel's queue is full; moderation, live alerts and birthdays
+    are never dropped.
+    """
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENT_SENDS, max_queue: int = MAX_CHANNEL_QUEUE):
+        self.max_queue = max_queue
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._queues = {}   # {channel_id: _ChannelQueue}
+        self._seq = itertools.count()
+        self.enqueued = dict.fromkeys(PRIORITY_NAMES, 0)
+        self.sent = dict.fromkeys(PRIORITY_NAMES, 0)
+        self.dropped = dict.fromkeys(PRIORITY_NAMES, 0)
+        self.failed = dict.fromkeys(PRIORITY_NAMES, 0)
+        self._latency = {p: deque(maxlen=LATENCY_SAMPLES) for p in PRIORITY_NAMES}
+
+    def depth(self) -> int:
+        return sum(len(q.heap) for q in self._queues.values())
+
+    def send(self, channel, priority: int, **kwargs) -> asyncio.Future:
+        """Queue ``channel.send(**kwargs)``. The returned future resolves to the
+        sent message, or None if the message was dropped or failed."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        queue = self._queues.get(channel.id)
+        if queue is None:
+            queue = self._queues[channel.id] = _ChannelQueue(channel)
+
+        self.enqueued[priority] += 1
+        item = (priority, next(self._seq), time.monotonic(), kwargs, future)
+        if len(queue.heap) >= self.max_queue and not self._make_room(queue, priority):
+            self._drop(item, "queue full")
+        else:
+            heapq.heappush(queue.heap, item)
+
+        if queue.task is None or queue.task.done():
+            queue.task = asyncio.create_task(self._run(channel.id, queue))
+        return future
+
+    def _make_room(self, queue, priority: int) -> bool:
+        """Evict the least important droppable message not more important than ``priority``."""
+        victim = max(queue.heap, key=lambda item: (item[0], item[1]))
+        if victim[0] in DROP_AFTER and victim[0] >= priority:
+            queue.heap.remove(victim)
+            heapq.heapify(queue.heap)
+            self._drop(victim, "queue full")
+            return True
+        # Nothing we're allowed to evict: only droppable messages are refused.
+        return priority not in DROP_AFTER
+
+    def _drop(self, item, reason: str):
+        priority, _, _, _, future = item
+        self.dropped[priority] += 1
+        if not future.done():
+            future.set_result(None)
+        logger.debug(f"Dropped {PRIORITY_NAMES[priority]} message ({reason}).")
+
+    async def _run(self, channel_id, queue):
+        try:
+            while queue.heap:
+                wait = queue.take_token()
+                if wait:
+                    await asyncio.sleep(wait)
+                if not queue.heap:
+                    break
+                item = heapq.heappop(queue.heap)
+                priority, _, enqueued_at, kwargs, future = item
+                waited = time.monotonic() - enqueued_at
+                if waited > DROP_AFTER.get(priority, float("inf")):
+                    queue.tokens += 1  # nothing was sent; give the token back
+                    self._drop(item, f"stale after {waited:.1f}s")
+                    continue
+                self._latency[priority].append(waited)
+                async with self._semaphore:
+                    try:
+                        message = await queue.channel.send(**kwargs)
+                    except Exception as e:
+                        self.failed[priority] += 1
+                        logger.warning(
+                            f"Failed to send {PRIORITY_NAMES[priority]} message to channel {channel_id}: {e}"
+                        )
+                        message = None
+                    else:
+                        self.sent[priority] += 1
+                if not future.done():
+                    future.set_result(message)
+        finally:
+            # keep the idle queue (and its token bucket) until the bucket is full again,
+            # so a channel that drains can't immediately send another full burst
+            if self._queues.get(channel_id) is queue and not queue.heap:
+                asyncio.get_running_loop().call_later(queue.full_in(), self._forget, channel_id, queue)
+
+    def _forget(self, channel_id, queue):
+        if self._queues.get(channel_id) is not queue or queue.heap or not queue.task.done():
+            return  # busy again; its run schedules the next check
+        wait = queue.full_in()
+        if wait:
+            asyncio.get_running_loop().call_later(wait, self._forget, channel_id, queue)
+        else:
+            del self._queues[channel_id]
+
+    async def drain(self, timeout: float = 10.0):
+        """Wait for queued messages to go out (used at shutdown), then cancel the rest."""
+        tasks = [q.task for q in self._queues.values() if q.task and not q.task.done()]
+        if not tasks:
+            return
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"Outbound queue not drained at shutdown: {self.depth()} message(s) discarded.")
+
+    def latency(self, priority: int) -> dict:
+        """Queue wait (seconds) over recent sends: p50 / p95 / max."""
+        samples = sorted(self._latency[priority])
+        if not samples:
+            return {"p50": 0.0, "p95": 0.0, "max": 0.0}
+        return {
+            "p50": samples[len(samples) // 2],
+            "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+            "max": samples[-1],
+        }
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth(),
+            "channels": len(self._queues),
+            "by_priority": {
+                name: {
+                    "enqueued": self.enqueued[p],
+                    "sent": self.sent[p],
+                    "dropped": self.dropped[p],
+                    "failed": self.failed[p],
+                    **self.latency(p),
+                }
+                for p, name in PRIORITY_NAMES.items()
+            },
+        }
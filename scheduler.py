@@ -0,0 +1,82 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+
+# =========================
+# DUE-TIME SCHEDULER
+# =========================
+
+class DueScheduler:
+    """Min-heap of ``(due_time, key)`` with one live entry per key.
+
+    ``wait()`` sleeps exactly until the earliest entry is due (or until an
+    earlier entry is scheduled), so nothing is polled. Rescheduling a key
+    leaves its old heap entry behind; stale entries are skipped when popped.
+    Times are unix timestamps so they can be persisted as-is.
+    """
+
+    def __init__(self):
+        self._heap = []     # [(due, seq, key)]
+        self._due = {}      # {key: due} -- the live entry for each key
+        self._seq = itertools.count()
+        self._changed = asyncio.Event()
+
+    def __len__(self):
+        return len(self._due)
+
+    def __contains__(self, key):
+        return key in self._due
+
+    def due_time(self, key):
+        return self._due.get(key)
+
+    def schedule(self, key, due: float):
+        earliest = self.next_due()
+        self._due[key] = due
+        heapq.heappush(self._heap, (due, next(self._seq), key))
+        if earliest is None or due < earliest:
+            self._changed.set()
+        if len(self._heap) > 2 * len(self._due) + 64:
+            self._compact()
+
+    def cancel(self, key):
+        self._due.pop(key, None)
+
+    def _compact(self):
+        self._heap = [entry for entry in self._heap if self._due.get(entry[2]) == entry[0]]
+        heapq.heapify(self._heap)
+
+    def _discard_stale(self):
+        heap = self._heap
+        while heap and self._due.get(heap[0][2]) != heap[0][0]:
+            heapq.heappop(heap)
+
+    def next_due(self):
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float = None):
+        """Remove and return every key due at ``now``, earliest first."""
+        now = time.time() if now is None else now
+        keys = []
+        while True:
+            self._discard_stale()
+            if not self._heap or self._heap[0][0] > now:
+                return keys
+            _, _, key = heapq.heappop(self._heap)
+            del self._due[key]
+            keys.append(key)
+
+    async def wait(self):
+        """Sleep until the earliest entry is due, or until the schedule moves earlier."""
+        self._changed.clear()
+        due = self.next_due()
+        timeout = None if due is None else max(0.0, due - time.time())
+        if timeout == 0.0:
+            return
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
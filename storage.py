@@ -0,0 +1,562 @@
+import asyncio
+import copy
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import time
+
+logger = logging.getLogger("CROBOT.storage")
+
+
+# =========================
+# SCHEMA
+# =========================
+
+SCHEMA = """
+-- legacy global XP records; kept read-only for per-guild seeding
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    xp INTEGER NOT NULL DEFAULT 0,
+    level INTEGER NOT NULL DEFAULT 1,
+    prestige INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS guild_users (
+    guild_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    xp INTEGER NOT NULL DEFAULT 0,
+    level INTEGER NOT NULL DEFAULT 1,
+    prestige INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (guild_id, user_id)
+);
+CREATE TABLE IF NOT EXISTS twitch_links (
+    discord_id TEXT PRIMARY KEY,
+    twitch_username TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS guild_config (
+    guild_id TEXT PRIMARY KEY,
+    config TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS birthdays (
+    user_id TEXT PRIMARY KEY,
+    date TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS warnings (
+    guild_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, user_id)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+UPSERT_USER = (
+    "INSERT INTO users (user_id, xp, level, prestige) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(user_id) DO UPDATE SET xp=excluded.xp, level=excluded.level, prestige=excluded.prestige"
+)
+UPSERT_GUILD_USER = (
+    "INSERT INTO guild_users (guild_id, user_id, xp, level, prestige) VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT(guild_id, user_id) DO UPDATE SET "
+    "xp=excluded.xp, level=excluded.level, prestige=excluded.prestige"
+)
+UPSERT_TWITCH = (
+    "INSERT INTO twitch_links (discord_id, twitch_username) VALUES (?, ?) "
+    "ON CONFLICT(discord_id) DO UPDATE SET twitch_username=excluded.twitch_username"
+)
+UPSERT_GUILD = (
+    "INSERT INTO guild_config (guild_id, config) VALUES (?, ?) "
+    "ON CONFLICT(guild_id) DO UPDATE SET config=excluded.config"
+)
+UPSERT_BIRTHDAY = (
+    "INSERT INTO birthdays (user_id, date) VALUES (?, ?) "
+    "ON CONFLICT(user_id) DO UPDATE SET date=excluded.date"
+)
+UPSERT_WARNING = (
+    "INSERT INTO warnings (guild_id, user_id, count) VALUES (?, ?, ?) "
+    "ON CONFLICT(guild_id, user_id) DO UPDATE SET count=excluded.count"
+)
+
+
+def _user_row(user_id, record):
+    return (str(user_id), int(record.get("xp", 0)), int(record.get("level", 1)), int(record.get("prestige", 0)))
+
+
+def _guild_user_row(key, record):
+    return (str(key[0]),) + _user_row(key[1], record)
+
+
+# store name -> table name
+_TABLES = {
+    "users": "guild_users",
+    "twitch_links": "twitch_links",
+    "guild_config": "guild_config",
+    "birthdays": "birthdays",
+    "warnings": "warnings",
+}
+
+# store -> (upsert statement, row builder, delete statement)
+# Stores keyed by (guild_id, user_id) tuples: users, warnings.
+_WRITERS = {
+    "users": (
+        UPSERT_GUILD_USER, _guild_user_row, "DELETE FROM guild_users WHERE guild_id = ? AND user_id = ?"
+    ),
+    "twitch_links": (
+        UPSERT_TWITCH, lambda did, name: (str(did), name), "DELETE FROM twitch_links WHERE discord_id = ?"
+    ),
+    "guild_config": (
+        UPSERT_GUILD, lambda gid, cfg: (str(gid), json.dumps(cfg)), "DELETE FROM guild_config WHERE guild_id = ?"
+    ),
+    "birthdays": (UPSERT_BIRTHDAY, lambda uid, date: (str(uid), date), "DELETE FROM birthdays WHERE user_id = ?"),
+    "warnings": (
+        UPSERT_WARNING,
+        lambda key, count: (str(key[0]), str(key[1]), int(count)),
+        "DELETE FROM warnings WHERE guild_id = ? AND user_id = ?",
+    ),
+}
+
+
+# =========================
+# STREAMING JSON / CORRUPTION
+# =========================
+
+class CorruptDataError(Exception):
+    """A data file failed to parse or an integrity check, and there was nothing good to fall back to."""
+
+
+_WS = " \t\r\n"
+_NUMBER_CHARS = frozenset("0123456789.eE+-")
+
+
+def iter_json_object(path: str, chunk_size: int = 1 << 20):
+    """Yield the ``(key, value)`` pairs of a top-level JSON object, reading ``chunk_size`` at a time.
+
+    Only one entry (plus one chunk) is held in memory, so a huge legacy file
+    is never parsed whole. Raises CorruptDataError if the file is not a
+    well-formed object.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf, pos, eof = "", 0, False
+        consumed = 0  # characters dropped from the front of buf, for error offsets
+
+        def fill():
+            nonlocal buf, pos, eof, consumed
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            consumed += pos
+            buf = buf[pos:] + chunk
+            pos = 0
+            return not eof
+
+        def skip_ws():
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in _WS:
+                    pos += 1
+                if pos < len(buf) or not fill():
+                    return
+
+        def expect(chars):
+            nonlocal pos
+            skip_ws()
+            if pos >= len(buf) or buf[pos] not in chars:
+                found = buf[pos:pos + 20] if pos < len(buf) else "end of file"
+                raise CorruptDataError(f"{path}: expected {chars!r} at char {consumed + pos}, found {found!r}")
+            pos += 1
+            return buf[pos - 1]
+
+        def value():
+            nonlocal pos
+            skip_ws()
+            while True:
+                try:
+                    obj, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError as e:
+                    if fill():
+                        continue  # probably cut off at the chunk boundary
+                    raise CorruptDataError(f"{path}: {e.msg} at char {consumed + e.pos}") from None
+                if isinstance(obj, (int, float)) and not isinstance(obj, bool):
+                    # raw_decode stops early on a number cut at the boundary ("12." -> 12,
+                    # "3e" -> 3); if its characters run to the end of buf, read on and retry
+                    run = end
+                    while run < len(buf) and buf[run] in _NUMBER_CHARS:
+                        run += 1
+                    if run == len(buf) and fill():
+                        continue
+                pos = end
+                return obj
+
+        expect("{")
+        skip_ws()
+        if pos < len(buf) and buf[pos] == "}":
+            pos += 1
+        else:
+            while True:
+                key = value()
+                if not isinstance(key, str):
+                    raise CorruptDataError(f"{path}: object key is not a string")
+                expect(":")
+                yield key, value()
+                if expect(",}") == "}":
+                    break
+        skip_ws()
+        if pos < len(buf):
+            raise CorruptDataError(f"{path}: unexpected data after the top-level object")
+
+
+def open_storage(path: str, backup_path: str):
+    """Open the database after a ``PRAGMA quick_check``.
+
+    A database that fails the check is moved aside (``*.corrupt-<time>``) and
+    replaced with the backup snapshot. Raises CorruptDataError if there is no
+    usable backup, rather than starting over with empty stores.
+    """
+    if not os.path.exists(path):
+        return Storage(path)
+    try:
+        store = Storage(path)
+        problem = store.quick_check()
+        if problem is None:
+            return store
+        store.conn.close()
+    except sqlite3.DatabaseError as e:
+        problem = str(e)
+
+    if not os.path.exists(backup_path):
+        raise CorruptDataError(f"{path} failed its integrity check ({problem}) and there is no {backup_path}")
+    aside = f"{path}.corrupt-{time.strftime('%Y%m%d-%H%M%S')}"
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.replace(path + suffix, aside + suffix)
+    shutil.copyfile(backup_path, path)
+    logger.error(f"{path} failed its integrity check ({problem}); moved it to {aside} and restored {backup_path}.")
+
+    store = Storage(path)
+    problem = store.quick_check()
+    if problem is not None:
+        store.conn.close()
+        raise CorruptDataError(f"backup {backup_path} is corrupt too ({problem})")
+    return store
+
+
+# =========================
+# STORAGE ENGINE
+# =========================
+
+class Storage:
+    """SQLite (WAL mode) backing store for all CROBOT data.
+
+    Writes are row-level upserts instead of whole-file rewrites, so the cost
+    of a save grows with the number of changed records, not the number of users.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # generous busy timeout: shard clusters in separate processes share this file
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def commit(self):
+        self.conn.commit()
+
+    def checkpoint(self, mode: str = "PASSIVE"):
+        """Commit and fold the WAL back into the main database file.
+
+        ``FULL`` waits for readers and syncs the database file, so everything
+        committed so far survives a power loss.
+        """
+        self.conn.commit()
+        self.conn.execute(f"PRAGMA wal_checkpoint({mode})")
+
+    def quick_check(self):
+        """None if ``PRAGMA quick_check`` passes, otherwise the first problems it reports."""
+        rows = [row[0] for row in self.conn.execute("PRAGMA quick_check(5)")]
+        return None if rows == ["ok"] else "; ".join(" ".join(row.split()) for row in rows)
+
+    def backup_to(self, path: str):
+        """Write a consistent copy of the database to ``path`` (temp file + atomic rename)."""
+        tmp_path = f"{path}.{os.getpid()}.tmp"  # unique per process when clusters share the data dir
+        target = sqlite3.connect(tmp_path)
+        try:
+            self.conn.backup(target)
+        finally:
+            target.close()
+        os.replace(tmp_path, path)
+
+    # ---- meta ----
+
+    def get_meta(self, key: str, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key: str, value):
+        self.conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+            (key, None if value is None else str(value))
+        )
+        self.conn.commit()
+
+    # ---- loaders (return the same shapes the bot used with JSON) ----
+
+    def load_legacy_users(self):
+        """Global pre-per-guild records: ``{user_id: record}``."""
+        rows = self.conn.execute("SELECT user_id, xp, level, prestige FROM users")
+        return {uid: {"xp": xp, "level": level, "prestige": prestige} for uid, xp, level, prestige in rows}
+
+    def iter_guild_users(self, guild_id=None):
+        """Cursor over ``(guild_id, user_id, xp, level, prestige)`` rows, optionally for one guild only."""
+        query = "SELECT guild_id, user_id, xp, level, prestige FROM guild_users"
+        params = ()
+        if guild_id is not None:
+            query += " WHERE guild_id = ?"
+            params = (str(guild_id),)
+        return self.conn.execute(query, params)
+
+    def load_twitch_links(self):
+        return dict(self.conn.execute("SELECT discord_id, twitch_username FROM twitch_links"))
+
+    def load_guild_config(self):
+        rows = self.conn.execute("SELECT guild_id, config FROM guild_config")
+        return {gid: json.loads(cfg) for gid, cfg in rows}
+
+    def load_birthdays(self):
+        return dict(self.conn.execute("SELECT user_id, date FROM birthdays"))
+
+    def load_warnings(self):
+        data = {}
+        for gid, uid, count in self.conn.execute("SELECT guild_id, user_id, count FROM warnings"):
+            data.setdefault(gid, {})[uid] = count
+        return data
+
+    # ---- batched writes ----
+
+    def write_changes(self, changes: dict, cleared=()):
+        """Apply one flush worth of row changes in a single transaction.
+
+        ``changes`` maps a store name to ``{key: value}``; a value of ``None``
+        deletes the row. ``cleared`` holds ``(store, guild_id)`` pairs that are
+        emptied first: the whole table, or one guild's rows when ``guild_id`` is
+        set (per-guild stores only). Returns the number of payload bytes written.
+        """
+        written = 0
+        with self.conn:
+            for store, guild_id in cleared:
+                if guild_id is None:
+                    self.conn.execute(f"DELETE FROM {_TABLES[store]}")
+                else:
+                    self.conn.execute(f"DELETE FROM {_TABLES[store]} WHERE guild_id = ?", (str(guild_id),))
+            for store, rows in changes.items():
+                upsert_sql, build_row, delete_sql = _WRITERS[store]
+                upserts = []
+                deletes = []
+                for key, value in rows.items():
+                    if value is None:
+                        deletes.append(tuple(map(str, key)) if isinstance(key, tuple) else (str(key),))
+                    else:
+                        row = build_row(key, value)
+                        written += sum(len(str(v)) for v in row)
+                        upserts.append(row)
+                if deletes:
+                    self.conn.executemany(delete_sql, deletes)
+                if upserts:
+                    self.conn.executemany(upsert_sql, upserts)
+        return written
+
+    # ---- one-time migration from data/*.json ----
+
+    def migrate_from_json(self, users_file, twitch_file, guild_file, birthdays_file, warnings_file):
+        """Import the legacy JSON stores once. Safe to call on every boot."""
+        if self.get_meta("json_migrated"):
+            return False
+
+        counts = {}
+
+        def _items(name, path):
+            # streamed, so a large legacy file is never held in memory at once
+            counts[name] = 0
+            if not os.path.exists(path):
+                return
+            for item in iter_json_object(path):
+                counts[name] += 1
+                yield item
+
+        # A corrupt file aborts the whole import (rolled back, retried next boot)
+        # instead of quietly importing it as empty.
+        with self.conn:
+            self.conn.executemany(UPSERT_USER, (_user_row(uid, rec) for uid, rec in _items("users", users_file)))
+            self.conn.executemany(UPSERT_TWITCH, _items("twitch", twitch_file))
+            self.conn.executemany(
+                UPSERT_GUILD, ((gid, json.dumps(cfg)) for gid, cfg in _items("guilds", guild_file))
+            )
+            self.conn.executemany(UPSERT_BIRTHDAY, _items("birthdays", birthdays_file))
+            self.conn.executemany(
+                UPSERT_WARNING,
+                (
+                    (gid, uid, count)
+                    for gid, per_guild in _items("warnings", warnings_file)
+                    for uid, count in per_guild.items()
+                )
+            )
+            self.conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('json_migrated', '1') "
+                "ON CONFLICT(key) DO UPDATE SET value=excluded.value"
+            )
+
+        logger.info(
+            f"Migrated JSON data into {self.path}: {counts['users']} users, {counts['twitch']} twitch links, "
+            f"{counts['guilds']} guild configs, {counts['birthdays']} birthdays, "
+            f"{counts['warnings']} guild warning sets"
+        )
+        return True
+
+
+# =========================
+# WRITE-BEHIND PERSISTENCE
+# =========================
+
+def drop_scope(keys, guild_id: str = None):
+    """Remove the keys a clear covers from a set (or dict) of keys: all of them, or one guild's."""
+    if guild_id is None:
+        keys.clear()
+        return
+    for key in [k for k in keys if k[0] == guild_id]:
+        if isinstance(keys, dict):
+            del keys[key]
+        else:
+            keys.discard(key)
+
+
+class WriteBehind:
+    """Dirty-key tracking on top of the in-memory stores.
+
+    Mutations call ``mark`` instead of writing; repeated updates to the same key
+    coalesce into one row write. ``flush`` persists only the dirty rows and is a
+    no-op when nothing changed. An optional ``journal`` (see journal.py) sees
+    every mark as well, for crash recovery between flushes.
+    """
+
+    def __init__(self, storage: Storage, stores: dict, journal=None):
+        self.storage = storage
+        self.stores = stores              # {store_name: live in-memory dict}
+        self.journal = journal
+        self.dirty = {name: set() for name in stores}
+        self.cleared = set()
+        self.flushes = 0
+        self.skipped = 0
+        self.total_records = 0
+        self.total_bytes = 0
+        self.last_flush = {"records": 0, "bytes": 0, "duration": 0.0}
+
+    @property
+    def is_dirty(self) -> bool:
+        return bool(self.cleared) or any(self.dirty.values())
+
+    def mark(self, store: str, key):
+        self.dirty[store].add(key)
+        if self.journal is not None:
+            self.journal.mark(store, key)
+
+    def mark_cleared(self, store: str, guild_id: str = None):
+        """Record that a whole store, or one guild of a per-guild store, was emptied.
+
+        The flush deletes those rows with one statement instead of one per key.
+        """
+        self.cleared.add((store, guild_id))
+        drop_scope(self.dirty[store], guild_id)
+        if self.journal is not None:
+            self.journal.mark_cleared(store, guild_id)
+
+    def current(self, store: str, key):
+        data = self.stores[store]
+        if isinstance(key, tuple):  # (guild_id, user_id) for per-guild stores
+            return data.get(key[0], {}).get(key[1])
+        return data.get(key)
+
+    def snapshot(self):
+        """Capture dirty rows and reset the dirty sets. Cheap; runs on the event loop.
+
+        Returns None when there is nothing to write.
+        """
+        if not self.is_dirty:
+            self.skipped += 1
+            return None
+        changes = {}
+        for store, keys in self.dirty.items():
+            if keys:
+                changes[store] = {key: copy.deepcopy(self.current(store, key)) for key in keys}
+                keys.clear()
+        cleared = tuple(self.cleared)
+        self.cleared.clear()
+        return changes, cleared
+
+    def restore(self, snap):
+        """Mark a snapshot's keys dirty again after a failed write (newer in-memory values win)."""
+        changes, cleared = snap
+        self.cleared.update(cleared)
+        for store, rows in changes.items():
+            self.dirty[store].update(rows)
+
+    def write(self, snap, durable: bool = False):
+        """Serialize and write a snapshot. Blocking; run it on the persistence thread."""
+        changes, cleared = snap
+        start = time.perf_counter()
+        written = self.storage.write_changes(changes, cleared)
+        if durable:
+            self.storage.checkpoint("FULL")
+
+        records = sum(len(rows) for rows in changes.values())
+        self.flushes += 1
+        self.total_records += records
+        self.total_bytes += written
+        self.last_flush = {"records": records, "bytes": written, "duration": time.perf_counter() - start}
+        return self.last_flush
+
+    def flush(self, durable: bool = False):
+        """Synchronous snapshot + write. Returns the cycle's counters, or None if it was skipped."""
+        snap = self.snapshot()
+        if snap is None:
+            return None
+        try:
+            return self.write(snap, durable)
+        except Exception:
+            self.restore(snap)
+            raise
+
+
+# =========================
+# READY GATES
+# =========================
+
+class StoreGates:
+    """One asyncio.Event per data store, set once that store has been loaded.
+
+    Handlers ``await gates.wait(...)`` for only the stores they touch, so a
+    command that needs guild config doesn't wait for the XP table to load.
+    """
+
+    def __init__(self, names):
+        self._events = {name: asyncio.Event() for name in names}
+
+    def set(self, name: str):
+        self._events[name].set()
+
+    def is_ready(self, *names) -> bool:
+        return all(self._events[name].is_set() for name in names or self._events)
+
+    async def wait(self, *names):
+        """Wait for the named stores (all of them if none are named)."""
+        for name in names or self._events:
+            event = self._events[name]
+            if not event.is_set():
+                await event.wait()
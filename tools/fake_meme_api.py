@@ -0,0 +1,90 @@
+"""Local stand-in for the meme API (meme-api.com) CROBOT uses.
+
+Serves ``/gimme`` (one meme) and ``/gimme/{count}`` (``{"count": n, "memes": [...]}``)
+from a fixed pool of fake posts, picked at random so repeats happen the way
+they do against the real API. A few posts are flagged NSFW or spoiler.
+
+    POST /_control/fail?count=N    fail the next N requests with HTTP 503
+    GET  /_control/state           request count, pool size, pending failures
+
+Run it and point CROBOT at it:
+
+    python -m tools.fake_meme_api --port 8766 --pool 200
+    MEME_API_URL=http://127.0.0.1:8766/gimme python crobot.py
+"""
+import argparse
+import random
+
+from aiohttp import web
+
+
+class FakeMemeAPI:
+    def __init__(self, pool=200, seed=None):
+        rng = random.Random(seed)
+        self.rng = rng
+        self.pool = [
+            {
+                "postLink": f"https://redd.it/fake{i:05d}",
+                "subreddit": rng.choice(("memes", "dankmemes", "gamingmemes")),
+                "title": f"Fake meme #{i}",
+                "url": f"https://i.example.invalid/fake{i:05d}.png",
+                "nsfw": i % 37 == 0,
+                "spoiler": i % 53 == 0,
+                "author": f"user{rng.randrange(1000)}",
+                "ups": rng.randrange(100, 50_000),
+                "preview": [],
+            }
+            for i in range(pool)
+        ]
+        self.requests = 0
+        self.fail_next = 0
+
+    def _unavailable(self):
+        if self.fail_next:
+            self.fail_next -= 1
+            return web.json_response({"code": 503, "message": "fake outage"}, status=503)
+        return None
+
+    async def gimme(self, request):
+        self.requests += 1
+        error = self._unavailable()
+        if error:
+            return error
+        count = request.match_info.get("count")
+        if count is None:
+            return web.json_response(self.rng.choice(self.pool))
+        count = max(1, min(int(count), 50))
+        memes = self.rng.sample(self.pool, min(count, len(self.pool)))
+        return web.json_response({"count": len(memes), "memes": memes})
+
+    async def control_fail(self, request):
+        self.fail_next += int(request.query.get("count", 1))
+        return web.json_response({"fail_next": self.fail_next})
+
+    async def control_state(self, request):
+        return web.json_response({"requests": self.requests, "pool": len(self.pool), "fail_next": self.fail_next})
+
+
+def make_app(fake=None):
+    fake = fake or FakeMemeAPI()
+    app = web.Application()
+    app["fake"] = fake
+    app.router.add_get("/gimme", fake.gimme)
+    app.router.add_get("/gimme/{count:\\d+}", fake.gimme)
+    app.router.add_post("/_control/fail", fake.control_fail)
+    app.router.add_get("/_control/state", fake.control_state)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--pool", type=int, default=200, help="number of distinct fake posts")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    web.run_app(make_app(FakeMemeAPI(pool=args.pool, seed=args.seed)), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
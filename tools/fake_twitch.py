@@ -0,0 +1,211 @@
+"""Local stand-in for the Twitch endpoints CROBOT uses.
+
+Emulates the OAuth token endpoint, Helix /streams, /users and
+/eventsub/subscriptions (create and delete), and the EventSub websocket (welcome, keepalive,
+notification and reconnect messages). Drive it through the control routes:
+
+    POST /_control/online?login=NAME    mark live (+ stream.online notification)
+    POST /_control/offline?login=NAME   mark offline (+ stream.offline notification)
+    POST /_control/reconnect            send session_reconnect to open sockets
+    GET  /_control/state                subscriptions, live set, request counts
+
+Run it and point CROBOT at it:
+
+    python -m tools.fake_twitch --port 8765
+    TWITCH_TOKEN_URL=http://127.0.0.1:8765/oauth2/token \\
+    TWITCH_HELIX_URL=http://127.0.0.1:8765/helix \\
+    TWITCH_EVENTSUB_WS_URL=ws://127.0.0.1:8765/ws python crobot.py
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import uuid
+from datetime import datetime, timezone
+
+from aiohttp import WSMsgType, web
+
+KEEPALIVE_SECONDS = 10
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _message(message_type, payload, subscription_type=None):
+    metadata = {"message_id": str(uuid.uuid4()), "message_type": message_type, "message_timestamp": _now()}
+    if subscription_type:
+        metadata.update(subscription_type=subscription_type, subscription_version="1")
+    return json.dumps({"metadata": metadata, "payload": payload})
+
+
+class FakeTwitch:
+    def __init__(self, keepalive=KEEPALIVE_SECONDS, max_subscriptions=300):
+        self.keepalive = keepalive
+        self.max_subscriptions = max_subscriptions
+        self.live = set()
+        self.users = {}                 # {login: id}
+        self.sessions = {}              # {session_id: websocket}
+        self.reconnecting = set()       # sessions whose subscriptions survive the socket closing
+        self.subscriptions = []         # dicts as returned by Helix
+        self.requests = {"token": 0, "streams": 0, "users": 0, "subscriptions": 0}
+        self._ids = itertools.count(1000)
+
+    def user_id(self, login):
+        login = login.lower()
+        if login not in self.users:
+            self.users[login] = str(next(self._ids))
+        return self.users[login]
+
+    # ---- OAuth / Helix ----
+
+    async def token(self, request):
+        self.requests["token"] += 1
+        return web.json_response({"access_token": "fake-app-token", "expires_in": 3600, "token_type": "bearer"})
+
+    async def streams(self, request):
+        self.requests["streams"] += 1
+        logins = [l.lower() for l in request.query.getall("user_login", [])]
+        data = [
+            {"user_id": self.user_id(l), "user_login": l, "type": "live", "title": f"{l} stream"}
+            for l in logins if l in self.live
+        ]
+        return web.json_response({"data": data}, headers={"Ratelimit-Remaining": "799", "Ratelimit-Reset": "0"})
+
+    async def helix_users(self, request):
+        self.requests["users"] += 1
+        logins = [l.lower() for l in request.query.getall("login", [])]
+        return web.json_response({"data": [{"id": self.user_id(l), "login": l} for l in logins]})
+
+    async def create_subscription(self, request):
+        self.requests["subscriptions"] += 1
+        body = await request.json()
+        session_id = body.get("transport", {}).get("session_id")
+        if session_id not in self.sessions:
+            return web.json_response({"error": "Bad Request", "message": "unknown session"}, status=400)
+        active = [s for s in self.subscriptions if s["transport"]["session_id"] == session_id]
+        if len(active) >= self.max_subscriptions:
+            return web.json_response({"error": "Too Many Requests"}, status=429)
+        for sub in active:
+            if sub["type"] == body["type"] and sub["condition"] == body["condition"]:
+                return web.json_response({"error": "Conflict"}, status=409)
+        sub = {
+            "id": str(uuid.uuid4()), "status": "enabled", "type": body["type"], "version": body["version"],
+            "condition": body["condition"], "transport": body["transport"], "created_at": _now(), "cost": 1,
+        }
+        self.subscriptions.append(sub)
+        return web.json_response({"data": [sub], "total": len(self.subscriptions)}, status=202)
+
+    async def delete_subscription(self, request):
+        self.requests["subscriptions"] += 1
+        sub_id = request.query.get("id")
+        remaining = [s for s in self.subscriptions if s["id"] != sub_id]
+        if len(remaining) == len(self.subscriptions):
+            return web.json_response({"error": "Not Found"}, status=404)
+        self.subscriptions = remaining
+        return web.Response(status=204)
+
+    # ---- EventSub websocket ----
+
+    async def websocket(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        session_id = request.query.get("session") or str(uuid.uuid4())
+        self.reconnecting.discard(session_id)
+        self.sessions[session_id] = ws
+        await ws.send_str(_message("session_welcome", {"session": {
+            "id": session_id, "status": "connected", "keepalive_timeout_seconds": self.keepalive,
+            "reconnect_url": None, "connected_at": _now(),
+        }}))
+        try:
+            while not ws.closed:
+                try:
+                    msg = await ws.receive(timeout=self.keepalive)
+                except asyncio.TimeoutError:
+                    await ws.send_str(_message("session_keepalive", {}))
+                    continue
+                if msg.type in (WSMsgType.CLOSE, WSMsgType.CLOSED, WSMsgType.ERROR):
+                    break
+        finally:
+            if self.sessions.get(session_id) is ws and session_id not in self.reconnecting:
+                del self.sessions[session_id]
+                self.subscriptions = [
+                    s for s in self.subscriptions if s["transport"]["session_id"] != session_id
+                ]
+        return ws
+
+    async def notify(self, login, sub_type):
+        broadcaster_id = self.user_id(login)
+        for sub in self.subscriptions:
+            if sub["type"] != sub_type or sub["condition"].get("broadcaster_user_id") != broadcaster_id:
+                continue
+            ws = self.sessions.get(sub["transport"]["session_id"])
+            if ws is None or ws.closed:
+                continue
+            event = {"broadcaster_user_id": broadcaster_id, "broadcaster_user_login": login,
+                     "broadcaster_user_name": login}
+            if sub_type == "stream.online":
+                event.update(id=str(uuid.uuid4()), type="live", started_at=_now())
+            await ws.send_str(_message("notification", {"subscription": sub, "event": event}, sub_type))
+
+    # ---- control routes ----
+
+    async def control_online(self, request):
+        login = request.query["login"].lower()
+        self.live.add(login)
+        await self.notify(login, "stream.online")
+        return web.json_response({"ok": True})
+
+    async def control_offline(self, request):
+        login = request.query["login"].lower()
+        self.live.discard(login)
+        await self.notify(login, "stream.offline")
+        return web.json_response({"ok": True})
+
+    async def control_reconnect(self, request):
+        base = f"ws://{request.host}/ws"
+        for session_id, ws in list(self.sessions.items()):
+            self.reconnecting.add(session_id)
+            await ws.send_str(_message("session_reconnect", {"session": {
+                "id": session_id, "status": "reconnecting", "keepalive_timeout_seconds": None,
+                "reconnect_url": f"{base}?session={session_id}", "connected_at": _now(),
+            }}))
+        return web.json_response({"ok": True})
+
+    async def control_state(self, request):
+        return web.json_response({
+            "live": sorted(self.live),
+            "sessions": list(self.sessions),
+            "subscriptions": len(self.subscriptions),
+            "requests": self.requests,
+        })
+
+
+def make_app(fake=None):
+    fake = fake or FakeTwitch()
+    app = web.Application()
+    app["fake"] = fake
+    app.router.add_post("/oauth2/token", fake.token)
+    app.router.add_get("/helix/streams", fake.streams)
+    app.router.add_get("/helix/users", fake.helix_users)
+    app.router.add_post("/helix/eventsub/subscriptions", fake.create_subscription)
+    app.router.add_delete("/helix/eventsub/subscriptions", fake.delete_subscription)
+    app.router.add_get("/ws", fake.websocket)
+    app.router.add_post("/_control/online", fake.control_online)
+    app.router.add_post("/_control/offline", fake.control_offline)
+    app.router.add_post("/_control/reconnect", fake.control_reconnect)
+    app.router.add_get("/_control/state", fake.control_state)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--keepalive", type=int, default=KEEPALIVE_SECONDS)
+    args = parser.parse_args()
+    web.run_app(make_app(FakeTwitch(keepalive=args.keepalive)), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
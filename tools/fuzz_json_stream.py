@@ -0,0 +1,86 @@
+"""Fuzz check for storage.iter_json_object against json.load.
+
+Writes random top-level objects (nested values, unicode, escapes, and
+numbers in every JSON form: ``-0``, ``12.5``, ``3e5``, ``1.25E-7``) and
+parses each one at every chunk size from 1 up to ``--max-chunk``, so each
+token gets cut at every possible offset. Exits non-zero on the first
+mismatch.
+
+    python -m tools.fuzz_json_stream --docs 200 --max-chunk 64
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+
+from storage import iter_json_object
+
+
+def random_number(rng):
+    form = rng.randrange(5)
+    if form == 0:
+        return str(rng.randint(-10 ** 12, 10 ** 12))
+    if form == 1:
+        return f"{rng.uniform(-1e6, 1e6):.{rng.randint(1, 9)}f}"
+    if form == 2:
+        return f"{rng.randint(-99, 99)}{rng.choice('eE')}{rng.choice(['', '+', '-'])}{rng.randint(0, 30)}"
+    if form == 3:
+        return f"{rng.randint(0, 9)}.{rng.randint(0, 99999)}{rng.choice('eE')}-{rng.randint(1, 12)}"
+    return rng.choice(["0", "-0", "0.0", "-0.5"])
+
+
+def random_value(rng, depth=0):
+    kind = rng.randrange(7 if depth < 3 else 5)
+    if kind == 0:
+        return random_number(rng)
+    if kind == 1:
+        return json.dumps("".join(rng.choice('ab "\\\n€😀') for _ in range(rng.randint(0, 12))))
+    if kind == 2:
+        return rng.choice(["true", "false", "null"])
+    if kind in (3, 4):
+        return random_number(rng)  # numbers are the tricky case, so weight them up
+    if kind == 5:
+        return "[" + ", ".join(random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))) + "]"
+    items = (f"{json.dumps(str(i))}: {random_value(rng, depth + 1)}" for i in range(rng.randint(0, 4)))
+    return "{" + ", ".join(items) + "}"
+
+
+def random_document(rng):
+    sep = rng.choice([",", ", ", " ,\n  "])
+    entries = (f"{json.dumps(f'k{i}')}{rng.choice([':', ': ', ' : '])}{random_value(rng)}"
+               for i in range(rng.randint(0, 8)))
+    return rng.choice(["", " ", "\n"]) + "{" + sep.join(entries) + "}" + rng.choice(["", "\n"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--max-chunk", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    seed = args.seed if args.seed is not None else random.randrange(1 << 30)
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "doc.json")
+        for n in range(args.docs):
+            text = random_document(rng)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+            expected = list(json.loads(text).items())
+            for chunk_size in range(1, args.max_chunk + 1):
+                try:
+                    got = list(iter_json_object(path, chunk_size=chunk_size))
+                except Exception as e:
+                    got = e
+                if got != expected:
+                    print(f"seed {seed}, doc {n}, chunk_size {chunk_size}: expected {expected!r}, got {got!r}")
+                    print(f"document: {text!r}")
+                    sys.exit(1)
+    print(f"OK: {args.docs} documents x chunk sizes 1-{args.max_chunk} (seed {seed})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,428 @@
+import asyncio
+import json
+import logging
+import time
+
+import aiohttp
+
+logger = logging.getLogger("CROBOT.twitch")
+
+HELIX_URL = "https://api.twitch.tv/helix"
+TOKEN_URL = "https://id.twitch.tv/oauth2/token"
+EVENTSUB_WS_URL = "wss://eventsub.wss.twitch.tv/ws"
+HELIX_BATCH_SIZE = 100  # max user_login params per /streams request
+EVENTSUB_TYPES = ("stream.online", "stream.offline")
+
+
+# =========================
+# HELIX CLIENT
+# =========================
+
+class TwitchClient:
+    """Twitch Helix client with one pooled session for the bot's lifetime.
+
+    Live checks are deduplicated, batched 100 logins per request and run
+    concurrently under a semaphore that also honours Helix's
+    ``Ratelimit-Remaining`` / ``Ratelimit-Reset`` headers.
+    """
+
+    def __init__(self, client_id: str, client_secret: str, max_concurrency: int = 4,
+                 helix_url: str = HELIX_URL, token_url: str = TOKEN_URL):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.helix_url = helix_url
+        self.token_url = token_url
+        self._session = None
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._token = None
+        self._token_expiry = 0  # unix time
+        self._token_lock = asyncio.Lock()
+        self._ratelimit_remaining = None
+        self._ratelimit_reset = 0.0
+        self.api_calls = 0
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=15),
+                connector=aiohttp.TCPConnector(limit=20),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def get_oauth_token(self):
+        """Get or refresh the app access token (cached until shortly before expiry)."""
+        if self._token and time.time() < self._token_expiry:
+            return self._token
+        async with self._token_lock:
+            if self._token and time.time() < self._token_expiry:
+                return self._token
+            params = {
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "grant_type": "client_credentials",
+            }
+            self.api_calls += 1
+            async with self.session.post(self.token_url, params=params) as resp:
+                data = await resp.json()
+            token = data.get("access_token")
+            if not token:
+                logger.error(f"Failed to fetch Twitch OAuth token: {data}")
+                return None
+            self._token = token
+            self._token_expiry = time.time() + data.get("expires_in", 3600) - 60
+            logger.info("Fetched new Twitch OAuth token")
+            return token
+
+    def _invalidate_token(self):
+        self._token = None
+        self._token_expiry = 0
+
+    async def _wait_for_ratelimit(self):
+        # Leave headroom for the other in-flight batches before the bucket refills.
+        if self._ratelimit_remaining is not None and self._ratelimit_remaining <= self.max_concurrency:
+            delay = self._ratelimit_reset - time.time()
+            if delay > 0:
+                logger.warning(f"Twitch rate limit nearly exhausted, waiting {delay:.1f}s")
+                await asyncio.sleep(delay)
+                self._ratelimit_remaining = None
+
+    def _record_ratelimit(self, resp):
+        remaining = resp.headers.get("Ratelimit-Remaining")
+        reset = resp.headers.get("Ratelimit-Reset")
+        if remaining is not None:
+            self._ratelimit_remaining = int(remaining)
+        if reset is not None:
+            self._ratelimit_reset = float(reset)
+
+    async def helix_request(self, method: str, path: str, *, params=None, body=None, token=None):
+        """One rate-limited Helix call with an optional JSON ``body``. Returns ``(status, data)``;
+        data is None unless JSON came back.
+
+        Uses the app token unless ``token`` is given (EventSub websockets need a user token).
+        """
+        async with self._semaphore:
+            for attempt in range(2):
+                await self._wait_for_ratelimit()
+                bearer = token or await self.get_oauth_token()
+                if not bearer:
+                    return 0, None
+                headers = {"Client-ID": self.client_id, "Authorization": f"Bearer {bearer}"}
+                self.api_calls += 1
+                async with self.session.request(
+                    method, f"{self.helix_url}{path}", headers=headers, params=params, json=body
+                ) as resp:
+                    self._record_ratelimit(resp)
+                    if resp.status == 401 and attempt == 0 and token is None:
+                        self._invalidate_token()
+                        continue
+                    if resp.status == 429 and attempt == 0:
+                        self._ratelimit_remaining = 0
+                        continue
+                    data = None
+                    if resp.content_type == "application/json":
+                        data = await resp.json()
+                    return resp.status, data
+        return 429, None
+
+    async def _fetch_streams(self, logins):
+        """One Helix /streams call for up to 100 logins. Returns {login: stream} or None on failure."""
+        status, body = await self.helix_request("GET", "/streams", params=[("user_login", l) for l in logins])
+        if status != 200 or body is None:
+            logger.warning(f"Twitch API returned status {status} for a batch of {len(logins)} users")
+            return None
+        return {s["user_login"].lower(): s for s in body.get("data", [])}
+
+    async def get_user_ids(self, logins):
+        """Resolve logins to broadcaster IDs, 100 per request. Unknown logins are omitted."""
+        logins = sorted({u.lower() for u in logins if u})
+        batches = [logins[i:i + HELIX_BATCH_SIZE] for i in range(0, len(logins), HELIX_BATCH_SIZE)]
+        results = await asyncio.gather(
+            *(self.helix_request("GET", "/users", params=[("login", l) for l in b]) for b in batches),
+            return_exceptions=True
+        )
+        ids = {}
+        for result in results:
+            if isinstance(result, Exception) or result[0] != 200 or result[1] is None:
+                continue
+            for user in result[1].get("data", []):
+                ids[user["login"].lower()] = user["id"]
+        return ids
+
+    async def get_live_streams(self, usernames):
+        """Check many logins at once.
+
+        Returns ``(live, checked)``: ``live`` maps each live login to its Helix
+        stream object, ``checked`` is the set of logins whose batch succeeded
+        (logins from failed batches are absent, so callers keep their old state).
+        """
+        logins = sorted({u.lower() for u in usernames if u})
+        batches = [logins[i:i + HELIX_BATCH_SIZE] for i in range(0, len(logins), HELIX_BATCH_SIZE)]
+        results = await asyncio.gather(*(self._fetch_streams(b) for b in batches), return_exceptions=True)
+
+        live = {}
+        checked = set()
+        for batch, result in zip(batches, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error checking live status for {len(batch)} users: {result}")
+                continue
+            if result is None:
+                continue
+            checked.update(batch)
+            live.update(result)
+        return live, checked
+
+
+# =========================
+# ANNOUNCEMENT INDEX
+# =========================
+
+class AnnouncementIndex:
+    """Reverse index of linked Discord user -> {guild_id: announcement channel_id}.
+
+    Kept current from member join/leave, guild join/leave and /settwitch, so a
+    go-live only touches the guilds the streamer is actually in.
+    """
+
+    def __init__(self):
+        self._by_user = {}    # {discord_id: {guild_id: channel_id}}
+        self._by_guild = {}   # {guild_id: {discord_id, ...}}
+
+    def __len__(self):
+        return len(self._by_user)
+
+    def add(self, discord_id: int, guild_id: int, channel_id):
+        self._by_user.setdefault(discord_id, {})[guild_id] = channel_id
+        self._by_guild.setdefault(guild_id, set()).add(discord_id)
+
+    def discard(self, discord_id: int, guild_id: int):
+        guilds = self._by_user.get(discord_id)
+        if guilds is not None:
+            guilds.pop(guild_id, None)
+            if not guilds:
+                del self._by_user[discord_id]
+        members = self._by_guild.get(guild_id)
+        if members is not None:
+            members.discard(discord_id)
+            if not members:
+                del self._by_guild[guild_id]
+
+    def discard_user(self, discord_id: int):
+        for guild_id in list(self._by_user.get(discord_id, ())):
+            self.discard(discord_id, guild_id)
+
+    def discard_guild(self, guild_id: int):
+        for discord_id in list(self._by_guild.get(guild_id, ())):
+            self.discard(discord_id, guild_id)
+
+    def set_guild_channel(self, guild_id: int, channel_id):
+        for discord_id in self._by_guild.get(guild_id, ()):
+            self._by_user[discord_id][guild_id] = channel_id
+
+    def targets(self, discord_id: int):
+        """Return ``{guild_id: channel_id}`` for every guild this user should be announced in."""
+        return dict(self._by_user.get(discord_id, {}))
+
+    def clear(self):
+        self._by_user.clear()
+        self._by_guild.clear()
+
+
+# =========================
+# EVENTSUB (WEBSOCKET TRANSPORT)
+# =========================
+
+class EventSubListener:
+    """Push-based live status via EventSub ``stream.online`` / ``stream.offline``.
+
+    Holds one websocket session and subscribes once per linked broadcaster.
+    ``covered`` is the set of logins with working subscriptions on the
+    current session; everything else (not yet subscribed, rejected, or all
+    logins while disconnected) stays on batched polling. Logins dropped from
+    ``update`` lose their coverage and their subscriptions are deleted.
+    """
+
+    def __init__(self, client: TwitchClient, user_token: str, on_change, ws_url: str = EVENTSUB_WS_URL):
+        self.client = client
+        self.user_token = user_token
+        self.on_change = on_change      # async (login, is_live) -> None
+        self.ws_url = ws_url
+        self.session_id = None
+        self.covered = {}               # {login: broadcaster_id}
+        self.wanted = set()
+        self.notifications = 0
+        self._ids = {}                  # {login: broadcaster_id} cache
+        self._sub_ids = {}              # {login: [subscription_id]} created on the current session
+        self._rejected = set()          # logins Twitch refused; polled until the next session
+        self._pending = set()
+        self._tasks = set()
+        self._closing = False
+        self._backoff = 1               # seconds before the next reconnect; reset by a welcome
+
+    @property
+    def connected(self) -> bool:
+        return self.session_id is not None
+
+    def update(self, logins):
+        """Set the logins we want pushed: subscribe new ones on the live session, unsubscribe dropped ones."""
+        self.wanted = {l.lower() for l in logins}
+        dropped = [login for login in self.covered if login not in self.wanted]
+        for login in dropped:
+            self.covered.pop(login)
+        self._rejected &= self.wanted
+        if self.connected:
+            if dropped:
+                self._spawn(self._unsubscribe(dropped))
+            self._spawn(self._subscribe_missing())
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _reset(self):
+        self.session_id = None
+        self.covered.clear()
+        self._sub_ids.clear()  # websocket subscriptions end with their session
+        self._rejected.clear()
+        self._pending.clear()
+
+    async def close(self):
+        self._closing = True
+        for task in list(self._tasks):
+            task.cancel()
+
+    async def run(self):
+        """Connect, follow session_reconnect, and back off on failures until close()."""
+        url = self.ws_url
+        while not self._closing:
+            try:
+                reconnect_url = await self._connect(url)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"EventSub connection lost ({e!r}); live checks fall back to polling")
+                reconnect_url = None
+            if reconnect_url:
+                # Subscriptions carry over to the new URL, so keep our coverage.
+                url = reconnect_url
+                continue
+            self._reset()
+            url = self.ws_url
+            if self._closing:
+                break
+            await asyncio.sleep(self._backoff)
+            self._backoff = min(self._backoff * 2, 300)
+
+    async def _connect(self, url: str):
+        async with self.client.session.ws_connect(url) as ws:
+            keepalive = 10
+            while True:
+                msg = await ws.receive(timeout=keepalive + 5)
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    raise ConnectionError(f"websocket closed ({msg.type.name})")
+                data = json.loads(msg.data)
+                message_type = data.get("metadata", {}).get("message_type")
+                payload = data.get("payload", {})
+
+                if message_type == "session_welcome":
+                    session = payload["session"]
+                    if self.session_id != session["id"]:
+                        self._reset()
+                    self.session_id = session["id"]
+                    keepalive = session.get("keepalive_timeout_seconds") or keepalive
+                    self._backoff = 1  # a working session: the next drop retries quickly again
+                    logger.info(f"EventSub session {self.session_id} established")
+                    # Twitch drops sessions that have no subscription shortly after the welcome.
+                    self._spawn(self._subscribe_missing())
+                elif message_type == "session_reconnect":
+                    return payload["session"]["reconnect_url"]
+                elif message_type == "notification":
+                    self._handle_notification(payload)
+                elif message_type == "revocation":
+                    broadcaster_id = payload.get("subscription", {}).get("condition", {}).get("broadcaster_user_id")
+                    for name, bid in list(self.covered.items()):
+                        if bid == broadcaster_id:
+                            self.covered.pop(name, None)
+                            self._sub_ids.pop(name, None)
+                            self._rejected.add(name)
+                    logger.warning(f"EventSub subscription revoked: {payload.get('subscription', {}).get('status')}")
+                # session_keepalive needs no action beyond resetting the receive timeout
+
+    def _handle_notification(self, payload):
+        sub_type = payload.get("subscription", {}).get("type")
+        login = payload.get("event", {}).get("broadcaster_user_login", "").lower()
+        if sub_type not in EVENTSUB_TYPES or not login:
+            return
+        self.notifications += 1
+        self._spawn(self.on_change(login, sub_type == "stream.online"))
+
+    async def _subscribe_missing(self):
+        session_id = self.session_id
+        missing = self.wanted - set(self.covered) - self._rejected - self._pending
+        if not session_id or not missing:
+            return
+        self._pending.update(missing)
+        try:
+            unknown = [l for l in missing if l not in self._ids]
+            if unknown:
+                self._ids.update(await self.client.get_user_ids(unknown))
+            results = await asyncio.gather(
+                *(self._subscribe(login, session_id) for login in missing), return_exceptions=True
+            )
+        finally:
+            self._pending.difference_update(missing)
+        if session_id != self.session_id:
+            return
+        subscribed = 0
+        unlinked = []
+        for login, ok in zip(missing, results):
+            if ok is True and login not in self.wanted:
+                unlinked.append(login)  # dropped by update() while the subscription was in flight
+            elif ok is True:
+                self.covered[login] = self._ids[login]
+                subscribed += 1
+            else:
+                self._rejected.add(login)
+        if unlinked:
+            await self._unsubscribe(unlinked)
+        logger.info(
+            f"EventSub: subscribed {subscribed} broadcasters ({len(self.covered)} covered, "
+            f"{len(self._rejected)} left on polling)"
+        )
+
+    async def _subscribe(self, login: str, session_id: str) -> bool:
+        broadcaster_id = self._ids.get(login)
+        if not broadcaster_id:
+            return False
+        for sub_type in EVENTSUB_TYPES:
+            body = {
+                "type": sub_type,
+                "version": "1",
+                "condition": {"broadcaster_user_id": broadcaster_id},
+                "transport": {"method": "websocket", "session_id": session_id},
+            }
+            status, data = await self.client.helix_request(
+                "POST", "/eventsub/subscriptions", body=body, token=self.user_token
+            )
+            if status not in (202, 409):  # 409: already subscribed on this session
+                logger.warning(f"EventSub {sub_type} subscription for {login} failed with status {status}")
+                return False
+            if status == 202 and data and data.get("data"):
+                self._sub_ids.setdefault(login, []).append(data["data"][0]["id"])
+        return True
+
+    async def _unsubscribe(self, logins):
+        """Delete the subscriptions of logins that are no longer linked."""
+        for login in logins:
+            for sub_id in self._sub_ids.pop(login, ()):
+                status, _ = await self.client.helix_request(
+                    "DELETE", "/eventsub/subscriptions", params={"id": sub_id}, token=self.user_token
+                )
+                if status not in (204, 404):  # 404: already gone
+                    logger.warning(f"EventSub unsubscribe for {login} failed with status {status}")
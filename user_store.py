@@ -0,0 +1,139 @@
+from array import array
+
+
+# =========================
+# COMPACT XP RECORDS
+# =========================
+
+class GuildUsers:
+    """One guild's XP records as parallel ``array`` columns plus a user_id -> row map.
+
+    A member costs one dict entry and 16 bytes of column space instead of a
+    three-key dict keyed by a string ID. Removed members leave a zeroed row
+    that the next new member reuses, so column sums stay correct. ``get``
+    returns a detached ``{"xp", "level", "prestige"}`` dict; writes go through
+    ``row``/``set`` and the columns. User IDs may be given as int or str.
+    """
+
+    __slots__ = ("xp", "level", "prestige", "_rows", "_free")
+
+    def __init__(self):
+        self.xp = array("q")
+        self.level = array("i")
+        self.prestige = array("i")
+        self._rows = {}   # {user_id: row}
+        self._free = []   # rows of removed members
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, user_id):
+        return int(user_id) in self._rows
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def find(self, user_id):
+        """The member's row, or None."""
+        return self._rows.get(int(user_id))
+
+    def row(self, user_id) -> int:
+        """The member's row, creating a fresh record (level 1, no XP) if needed."""
+        user_id = int(user_id)
+        row = self._rows.get(user_id)
+        if row is None:
+            if self._free:
+                row = self._free.pop()
+                self.level[row] = 1
+            else:
+                row = len(self.xp)
+                self.xp.append(0)
+                self.level.append(1)
+                self.prestige.append(0)
+            self._rows[user_id] = row
+        return row
+
+    def get(self, user_id, default=None):
+        row = self._rows.get(int(user_id))
+        if row is None:
+            return default
+        return {"xp": self.xp[row], "level": self.level[row], "prestige": self.prestige[row]}
+
+    def set(self, user_id, xp: int, level: int, prestige: int):
+        row = self.row(user_id)
+        self.xp[row] = xp
+        self.level[row] = level
+        self.prestige[row] = prestige
+
+    def pop(self, user_id, default=None):
+        row = self._rows.pop(int(user_id), None)
+        if row is None:
+            return default
+        record = {"xp": self.xp[row], "level": self.level[row], "prestige": self.prestige[row]}
+        self.xp[row] = self.level[row] = self.prestige[row] = 0
+        self._free.append(row)
+        return record
+
+    def total_xp(self) -> int:
+        return sum(self.xp)  # removed rows are zeroed
+
+    def clear(self):
+        self.xp = array("q")
+        self.level = array("i")
+        self.prestige = array("i")
+        self._rows = {}
+        self._free = []
+
+
+class UserStore:
+    """Per-guild XP records: ``{guild_id: GuildUsers}``. Guild IDs may be given as int or str."""
+
+    def __init__(self):
+        self._guilds = {}
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from ``(guild_id, user_id, xp, level, prestige)`` rows, e.g. straight off a cursor."""
+        store = cls()
+        for guild_id, user_id, xp, level, prestige in rows:
+            store.guild(guild_id).set(user_id, xp, level, prestige)
+        return store
+
+    def __len__(self):
+        return len(self._guilds)
+
+    def __contains__(self, guild_id):
+        return int(guild_id) in self._guilds
+
+    def __iter__(self):
+        return iter(self._guilds)
+
+    def items(self):
+        return self._guilds.items()
+
+    def guild(self, guild_id) -> GuildUsers:
+        guild_id = int(guild_id)
+        records = self._guilds.get(guild_id)
+        if records is None:
+            records = self._guilds[guild_id] = GuildUsers()
+        return records
+
+    def get(self, guild_id, default=None):
+        return self._guilds.get(int(guild_id), default)
+
+    def merge(self, other: "UserStore"):
+        """Add another store's records (e.g. one built off the event loop), keeping records already here."""
+        for guild_id, theirs in other._guilds.items():
+            mine = self._guilds.get(guild_id)
+            if mine is None:
+                self._guilds[guild_id] = theirs
+                continue
+            for user_id, row in theirs._rows.items():
+                if user_id not in mine._rows:
+                    mine.set(user_id, theirs.xp[row], theirs.level[row], theirs.prestige[row])
+
+    def pop(self, guild_id, default=None):
+        return self._guilds.pop(int(guild_id), default)
+
+    def user_count(self) -> int:
+        return sum(len(records) for records in self._guilds.values())
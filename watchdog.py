@@ -0,0 +1,161 @@
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import traceback
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger("CROBOT.watchdog")
+
+STALL_THRESHOLD = 0.25   # seconds the loop may go without a heartbeat before we dump its stack
+HEARTBEAT_INTERVAL = 0.05
+
+
+# =========================
+# EVENT LOOP WATCHDOG
+# =========================
+
+class LoopWatchdog:
+    """Detects a blocked event loop from a background thread.
+
+    A coroutine on the loop stamps a heartbeat every ``HEARTBEAT_INTERVAL``.
+    The watchdog thread checks the stamp; when it is older than ``threshold``
+    the loop is stuck in one callback, so the thread logs the running task's
+    coroutine name and the loop thread's current stack (once per stall), then
+    logs the total stall time when the loop recovers.
+    """
+
+    def __init__(self, threshold: float = STALL_THRESHOLD, interval: float = HEARTBEAT_INTERVAL):
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls = 0
+        self.longest_stall = 0.0
+        self.last_lag = 0.0
+        self._loop = None
+        self._loop_thread_id = None
+        self._last_beat = time.monotonic()
+        self._stall_reported = False
+        self._stop = threading.Event()
+        self._thread = None
+        self._beat_task = None
+
+    def start(self, loop: asyncio.AbstractEventLoop = None):
+        self._loop = loop or asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._beat_task = self._loop.create_task(self._beat())
+        self._thread = threading.Thread(target=self._watch, name="crobot-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"Event loop watchdog started (stall threshold {self.threshold * 1000:.0f}ms).")
+
+    def stop(self):
+        self._stop.set()
+        if self._beat_task:
+            self._beat_task.cancel()
+
+    async def _beat(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.last_lag = max(0.0, now - started - self.interval)
+            if self._stall_reported:
+                stalled = now - self._last_beat
+                self.longest_stall = max(self.longest_stall, stalled)
+                logger.warning(f"Event loop recovered after a {stalled * 1000:.0f}ms stall.")
+                self._stall_reported = False
+            self._last_beat = now
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            stalled = time.monotonic() - self._last_beat
+            if stalled > self.threshold and not self._stall_reported:
+                self._stall_reported = True
+                self.stalls += 1
+                self._report(stalled)
+
+    def _report(self, stalled: float):
+        task = asyncio.current_task(self._loop) if self._loop else None
+        coro = task.get_coro() if task else None
+        name = getattr(coro, "__qualname__", None) or (task.get_name() if task else "<callback>")
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame else "<no frame>"
+        logger.warning(
+            f"Event loop blocked for {stalled * 1000:.0f}ms+ in {name}. Loop thread stack:\n{stack}"
+        )
+
+
+# =========================
+# ON-DEMAND PROFILER
+# =========================
+
+class SlowPathProfiler:
+    """cProfile captures of slow handler runs, armed on demand (e.g. by an admin command).
+
+    ``arm(target)`` profiles the next runs of that target until one takes
+    longer than ``threshold`` seconds (or ``attempts`` runs pass). The slow
+    run's stats are written to ``profile_dir`` as a ``.prof`` file for
+    ``python -m pstats`` / snakeviz. Only one run is profiled at a time, and
+    because cProfile is per thread, anything else the loop runs while that
+    handler is suspended at an ``await`` shows up in the capture too.
+    """
+
+    def __init__(self, profile_dir: str, targets=()):
+        self.profile_dir = profile_dir
+        self.targets = tuple(targets)
+        self.armed = {}      # {target: {"threshold": float, "attempts": int}}
+        self.captures = []   # [(target, duration, path)], newest last
+        self._busy = False
+
+    def arm(self, target: str, threshold: float, attempts: int = 50):
+        if target not in self.targets:
+            raise ValueError(f"unknown profile target '{target}'")
+        self.armed[target] = {"threshold": threshold, "attempts": attempts}
+        logger.info(f"Profiler armed for {target}: next run slower than {threshold * 1000:.0f}ms "
+                    f"(up to {attempts} attempts).")
+
+    def disarm(self, target: str = None):
+        if target is None:
+            self.armed.clear()
+        else:
+            self.armed.pop(target, None)
+
+    @asynccontextmanager
+    async def profile(self, target: str):
+        spec = self.armed.get(target)
+        if spec is None or self._busy:
+            yield
+            return
+        self._busy = True
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            self._busy = False
+            self._finish(target, spec, profiler, time.perf_counter() - started)
+
+    def _finish(self, target, spec, profiler, duration: float):
+        spec["attempts"] -= 1
+        if duration < spec["threshold"]:
+            if spec["attempts"] <= 0:
+                self.armed.pop(target, None)
+                logger.info(f"Profiler for {target} disarmed: no run exceeded "
+                            f"{spec['threshold'] * 1000:.0f}ms.")
+            return
+        self.armed.pop(target, None)
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f"{target}-{time.strftime('%Y%m%d-%H%M%S')}.prof")
+        profiler.dump_stats(path)
+        self.captures.append((target, duration, path))
+        del self.captures[:-20]
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(15)
+        logger.warning(f"Captured slow {target} ({duration * 1000:.0f}ms) -> {path}\n{summary.getvalue()}")
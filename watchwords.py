@@ -0,0 +1,79 @@
+from collections import deque
+
+# Below this many phrases, per-phrase ``in`` checks (which run in C) beat walking
+# the automaton in Python; see benchmarks/bench_watchwords.py.
+SMALL_LIST_THRESHOLD = 80
+
+
+# =========================
+# WATCHWORD MATCHER (Aho-Corasick)
+# =========================
+
+class WatchwordMatcher:
+    """Multi-phrase matcher compiled once from a guild's watchword list.
+
+    Scanning a message costs O(len(message) + matches) no matter how many
+    phrases are configured, instead of one substring search per phrase.
+    Matching is case-insensitive (phrases and text are lowercased).
+    Short lists skip the automaton and use plain substring checks.
+    """
+
+    __slots__ = ("phrases", "_small", "_goto", "_fail", "_out")
+
+    def __init__(self, phrases, small_list_threshold: int = SMALL_LIST_THRESHOLD):
+        self.phrases = tuple(dict.fromkeys(p.lower() for p in phrases if p))
+        self._small = len(self.phrases) < small_list_threshold
+        goto = [{}]        # state -> {char: next_state}
+        out = [()]         # state -> phrases ending here (incl. via fail links)
+
+        for phrase in self.phrases:
+            state = 0
+            for ch in phrase:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append(())
+                state = nxt
+            out[state] = out[state] + (phrase,)
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                out[nxt] = out[nxt] + out[fail[nxt]]
+
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+
+    def __bool__(self):
+        return bool(self.phrases)
+
+    def find_all(self, text: str):
+        """Return every watchword found in ``text``, without duplicates.
+
+        Automaton results are ordered by where each match ends; short lists
+        keep their configured order.
+        """
+        if self._small:
+            text = text.lower()
+            return [p for p in self.phrases if p in text]
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        found = {}
+        for ch in text.lower():
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                for phrase in out[state]:
+                    found.setdefault(phrase, None)
+        return list(found)
@@ -0,0 +1,105 @@
+import time
+
+
+# =========================
+# MESSAGE XP BUFFER
+# =========================
+
+class XPBuffer:
+    """Cooldown gate plus aggregation buffer for message XP.
+
+    ``offer()`` is called from on_message and only does dict work: it drops
+    grants inside the member's cooldown window and adds the rest to a pending
+    total per ``(guild_id, user_id)``. A periodic tick calls ``drain()`` and
+    applies every pending total with one add_xp call each.
+    """
+
+    __slots__ = (
+        "cooldown", "_last_grant", "_pending", "_channels",
+        "offered", "accepted", "applied", "max_depth",
+        "_rate_count", "_rate_since", "grants_per_sec",
+    )
+
+    def __init__(self, cooldown: float = 60.0):
+        self.cooldown = cooldown
+        self._last_grant = {}  # {(guild_id, user_id): monotonic time of last accepted grant}
+        self._pending = {}     # {(guild_id, user_id): xp waiting to be applied}
+        self._channels = {}    # {(guild_id, user_id): channel_id of the latest accepted message}
+        self.offered = 0       # messages seen
+        self.accepted = 0      # grants that passed the cooldown
+        self.applied = 0       # buffered totals handed to add_xp
+        self.max_depth = 0
+        self._rate_count = 0
+        self._rate_since = time.monotonic()
+        self.grants_per_sec = 0.0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def offer(self, guild_id: int, user_id: int, channel_id: int, amount: int, now: float = None) -> bool:
+        """Queue ``amount`` XP unless the member is still cooling down."""
+        self.offered += 1
+        now = time.monotonic() if now is None else now
+        key = (guild_id, user_id)
+        last = self._last_grant.get(key)
+        if last is not None and now - last < self.cooldown:
+            return False
+        self._last_grant[key] = now
+        self._pending[key] = self._pending.get(key, 0) + amount
+        self._channels[key] = channel_id
+        self.accepted += 1
+        self._rate_count += 1
+        if len(self._pending) > self.max_depth:
+            self.max_depth = len(self._pending)
+        return True
+
+    def drain(self, hold=None):
+        """Return and clear pending grants as ``[(guild_id, user_id, channel_id, amount)]``.
+
+        Grants for guilds where ``hold(guild_id)`` is true stay buffered for a later drain.
+        """
+        pending, channels = self._pending, self._channels
+        self._pending, self._channels = {}, {}
+        if hold is not None:
+            for key in [key for key in pending if hold(key[0])]:
+                self._pending[key] = pending.pop(key)
+                self._channels[key] = channels[key]
+        self.applied += len(pending)
+        return [(gid, uid, channels[(gid, uid)], amount) for (gid, uid), amount in pending.items()]
+
+    def prune(self, now: float = None):
+        """Forget cooldown stamps that have expired, so the map only holds active chatters."""
+        now = time.monotonic() if now is None else now
+        expired = [key for key, last in self._last_grant.items() if now - last >= self.cooldown]
+        for key in expired:
+            del self._last_grant[key]
+        return len(expired)
+
+    def sample_rate(self, now: float = None) -> float:
+        """Accepted grants per second since the previous sample."""
+        now = time.monotonic() if now is None else now
+        elapsed = now - self._rate_since
+        if elapsed > 0:
+            self.grants_per_sec = self._rate_count / elapsed
+        self._rate_count = 0
+        self._rate_since = now
+        return self.grants_per_sec
+
+    def stats(self) -> dict:
+        return {
+            "offered": self.offered,
+            "accepted": self.accepted,
+            "applied": self.applied,
+            "depth": len(self._pending),
+            "max_depth": self.max_depth,
+            "cooldowns": len(self._last_grant),
+            "grants_per_sec": self.grants_per_sec,
+        }
+
+
+def coalesce_level_ups(level_ups):
+    """Group ``(channel_id, user_id, level)`` tuples into ``{channel_id: [(user_id, level), ...]}``."""
+    by_channel = {}
+    for channel_id, user_id, level in level_ups:
+        by_channel.setdefault(channel_id, []).append((user_id, level))
+    return by_channel